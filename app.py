@@ -1,15 +1,37 @@
 import os
 import re
 import time
-from flask import Flask, render_template, request, jsonify, send_from_directory, abort # url_for는 현재 미사용
+import json
+from flask import Flask, render_template, request, jsonify, abort, Response, stream_with_context, g # url_for는 현재 미사용
 from celery.result import AsyncResult
+from celery.utils import uuid
+from celery.states import READY_STATES
 import configparser
-import yt_dlp
 from datetime import datetime
 import logging # Flask 기본 로거 사용 또는 logging 모듈 직접 사용
 
-# tasks.py에서 Celery 앱 인스턴스 및 작업 가져오기
-from tasks import celery_app, download_video_task, TEMP_DOWNLOAD_BASE_DIR
+# Celery 앱과 작업 시그니처 (작업은 이름으로 발행하므로 tasks.py와 워커 전용 모듈(yt_dlp 등)은 웹 프로세스에 로드하지 않음)
+from task_app import (celery_app, task_signature, should_fan_out, request_cancel, storage_janitor, TEMP_DOWNLOAD_BASE_DIR,
+                      AUDIO_OUTPUT_MODES, DOWNLOAD_VIDEO_TASK, DOWNLOAD_PLAYLIST_TASK, DOWNLOAD_BATCH_TASK, FETCH_INFO_TASK)
+import metrics
+import startup
+from redis_store import get_redis
+from metadata import (admit_metadata_job, release_metadata_job, playlist_entries_page, FETCH_INFO_WAIT_SECONDS,
+                      FETCH_INFO_POLL_INTERVAL_SECONDS, PLAYLIST_PAGE_SIZE, PLAYLIST_PAGE_MAX_SIZE)
+from info_cache import info_cache
+from bandwidth import parse_rate
+from job_queues import estimate_job_cost, choose_queue, format_height, item_cost, queue_stats
+from batch_jobs import build_batch_items
+from progress import read_progress_entries, read_progress_batch, ProgressSnapshotCache, PROGRESS_SNAPSHOT_TTL_MS
+from file_serving import send_file_with_ranges, stream_zip, content_disposition
+from werkzeug.security import safe_join
+from progress_stream import (ProgressEventHub, drain_latest, format_sse,
+                             PROGRESS_STREAM_HEARTBEAT_SECONDS, PROGRESS_STREAM_MAX_SECONDS)
+
+download_video_task = task_signature(DOWNLOAD_VIDEO_TASK)
+download_playlist_task = task_signature(DOWNLOAD_PLAYLIST_TASK)
+download_batch_task = task_signature(DOWNLOAD_BATCH_TASK)
+fetch_info_task = task_signature(FETCH_INFO_TASK)
 
 app = Flask(__name__)
 # Flask 앱 로거 설정 (필요에 따라 레벨 등 조정)
@@ -23,21 +45,50 @@ if os.path.exists(CONFIG_FILE):
     config.read(CONFIG_FILE)
     # 여기서 Flask 앱 레벨의 설정을 읽어올 수 있습니다.
 
-DEFAULT_VIDEO_FORMATS_PREF = ["616", "22", "18"] # 사용자가 선호하는 비디오 포맷 ID (선호도 순)
-DEFAULT_AUDIO_FORMATS_PREF = ["140", "251", "250", "249", "139"] # 선호하는 오디오 포맷 ID
+progress_hub = ProgressEventHub() # 프로세스당 하나의 pub/sub 연결로 SSE 클라이언트에 진행 이벤트 분배
+progress_snapshots = ProgressSnapshotCache(PROGRESS_SNAPSHOT_TTL_MS) # 같은 작업을 여러 탭이 조회할 때 짧게 응답 재사용
+PROGRESS_BATCH_MAX_TASKS = 200 # /progress 일괄 조회 한 번에 받을 수 있는 최대 작업 수
+# 요청 처리 시간을 http_request_duration_seconds 히스토그램으로 기록하는 엔드포인트 (폴링/파일 전송 등 주요 경로)
+TIMED_ENDPOINTS = {'fetch_info_route', 'fetch_info_job_route', 'progress_status', 'progress_batch',
+                   'serve_task_file', 'serve_task_files_zip'}
 
 # --- Helper Functions ---
-def get_best_format_id(formats_list, preferred_ids, is_video=False):
-    """주어진 포맷 리스트에서 가장 적합한 포맷 ID를 반환합니다."""
-    if not formats_list: return None
-    for pref_id in preferred_ids:
-        for f_dict in formats_list: # formats_list는 이제 dict의 리스트
-            if f_dict.get('format_id') == pref_id:
-                return pref_id
-    # 선호하는 ID가 없는 경우, (이미 정렬된) 목록의 첫 번째 항목을 기본값으로 사용
-    if formats_list:
-        return formats_list[0].get('format_id')
-    return None
+def _client_id():
+    """요청 클라이언트 식별자 (프록시 뒤에서는 X-Forwarded-For의 첫 주소)."""
+    forwarded_for = request.headers.get('X-Forwarded-For', '')
+    return forwarded_for.split(',')[0].strip() or request.remote_addr or 'unknown'
+
+def _fetch_info_job_response(job_id, wait_seconds):
+    """정보 추출 작업 결과를 최대 wait_seconds 동안 기다려 응답합니다. 끝나지 않았으면 202와 job_id를 반환합니다.
+
+    기다리는 동안 sleep으로 양보하므로 eventlet 워커의 다른 요청(/progress, 파일 전송 등)을 막지 않습니다.
+    """
+    job_result = AsyncResult(job_id, app=celery_app)
+    deadline = time.monotonic() + wait_seconds
+    while not job_result.ready() and time.monotonic() < deadline:
+        time.sleep(FETCH_INFO_POLL_INTERVAL_SECONDS)
+    if not job_result.ready():
+        return jsonify({"job_id": job_id, "state": job_result.state}), 202
+    if job_result.failed():
+        return jsonify({"job_id": job_id, "error": f"서버 오류 발생: {job_result.result}"}), 500
+    info = job_result.result or {}
+    if info.get("error"):
+        return jsonify(dict(info, job_id=job_id)), 500
+    return jsonify(info)
+
+@app.before_request
+def _start_request_timer():
+    if request.endpoint in TIMED_ENDPOINTS:
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_request_latency(response):
+    # 파일/ZIP 스트리밍 응답은 본문 전송 전까지(첫 바이트까지)의 시간
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                        endpoint=request.endpoint, status=str(response.status_code))
+    return response
 
 # --- Routes ---
 @app.route('/')
@@ -51,103 +102,58 @@ def index():
 
 @app.route('/fetch_info', methods=['POST'])
 def fetch_info_route():
+    """정보 추출을 전용 큐에 넣고, 최대 FETCH_INFO_WAIT_SECONDS 동안 결과를 기다려 반환합니다.
+
+    async가 true이거나 시간 안에 끝나지 않으면 202와 job_id를 반환하며, /fetch_info/<job_id>로 결과를 조회합니다.
+    대기 중인 추출이 전체/클라이언트별 한도를 넘으면 503과 Retry-After를 반환합니다.
+    """
     data = request.get_json()
     url = data.get('url')
     if not url:
         return jsonify({"error": "URL이 제공되지 않았습니다."}), 400
+
+    client_id = _client_id()
+    job_id = uuid()
+    retry_after = admit_metadata_job(job_id, client_id)
+    if retry_after is not None:
+        metrics.inc('fetch_info_requests_total', result='rejected')
+        app.logger.warning(f"정보 가져오기 요청 거절 (대기 작업 한도 초과): {client_id}")
+        response = jsonify({"error": "정보 가져오기 요청이 많습니다. 잠시 후 다시 시도해주세요."})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 503
     try:
-        # 플레이리스트 정보 우선 가져오기 (항목 목록 등)
-        ydl_opts_playlist = {
-            'quiet': True, 'no_warnings': True, 'skip_download': True,
-            'extract_flat': 'in_playlist', 'noplaylist': False # 플레이리스트 허용
-        }
-        with yt_dlp.YoutubeDL(ydl_opts_playlist) as ydl:
-            playlist_info_dict = ydl.extract_info(url, download=False)
-
-        processed_info = {
-            "title": playlist_info_dict.get("title", "제목 없음"),
-            "thumbnail_url": playlist_info_dict.get("thumbnail"), # 플레이리스트 썸네일 또는 첫 항목 썸네일
-            "original_url": url, # Celery 작업에 전달할 원본 URL
-            "video_formats": [], "audio_formats": [],
-            "default_video_format_id": None, "default_audio_format_id": None,
-            "playlist_entries": []
-        }
-
-        # 포맷 정보는 첫 번째 유효한 항목에서 가져옴
-        first_entry_for_formats_url = None
-        if 'entries' in playlist_info_dict and playlist_info_dict['entries']:
-            # 플레이리스트 항목 처리
-            processed_info["playlist_entries"] = [
-                {"id": entry.get("id"), 
-                 "url": entry.get("url") or f"https://www.youtube.com/watch?v={entry.get('id')}", 
-                 "title": entry.get("title", f"항목 {idx+1}")}
-                for idx, entry in enumerate(playlist_info_dict['entries']) if entry # None인 entry 필터링
-            ]
-            if processed_info["playlist_entries"]: # 유효한 항목이 있다면 첫 번째 항목 URL 사용
-                first_entry_for_formats_url = processed_info["playlist_entries"][0]['url']
-        else: # 단일 영상인 경우
-            first_entry_for_formats_url = url # 원본 URL 사용
-
-        formats_info_dict_for_ui = None # UI 포맷 표시에 사용할 정보
-        if first_entry_for_formats_url:
-            ydl_opts_single = {'quiet': True, 'no_warnings': True, 'skip_download': True, 'noplaylist': True}
-            with yt_dlp.YoutubeDL(ydl_opts_single) as ydl_single:
-                formats_info_dict_for_ui = ydl_single.extract_info(first_entry_for_formats_url, download=False)
-                # 단일 영상의 경우, 가져온 정보로 썸네일 업데이트 (플레이리스트 썸네일보다 우선)
-                if not ('entries' in playlist_info_dict and playlist_info_dict['entries']):
-                    processed_info["thumbnail_url"] = formats_info_dict_for_ui.get("thumbnail", processed_info["thumbnail_url"])
-
-        if formats_info_dict_for_ui and 'formats' in formats_info_dict_for_ui:
-            all_formats = formats_info_dict_for_ui.get("formats", [])
-            
-            # 비디오 포맷 정렬 (None 값 처리, mp4 선호)
-            video_formats_raw = [f for f in all_formats if f.get('vcodec') != 'none' and f.get('acodec') == 'none'] # 영상만
-            if not video_formats_raw : # 영상+음성도 포함 (영상만 없을 시)
-                video_formats_raw = [f for f in all_formats if f.get('vcodec') != 'none']
-            
-            video_formats_raw.sort(key=lambda x: (
-                x.get('height') if x.get('height') is not None else -1, 
-                x.get('fps') if x.get('fps') is not None else -1,
-                x.get('tbr') if x.get('tbr') is not None else -1,
-                1 if x.get('ext') == 'mp4' else (2 if x.get('ext') == 'webm' else 3) # mp4, webm 순으로 선호
-            ), reverse=True)
-            processed_info["video_formats"] = [
-                {"format_id": f.get("format_id"), "format_note": f.get("format_note"), 
-                 "ext": f.get("ext"), 
-                 "filesize_approx": f.get("filesize_approx") or f.get("filesize"), 
-                 "resolution": f.get("resolution") or (f"{f.get('width')}x{f.get('height')}" if f.get('width') and f.get('height') else "N/A")} 
-                for f in video_formats_raw
-            ]
-
-            # 오디오 포맷 정렬 (None 값 처리, m4a/opus 선호)
-            audio_formats_raw = [f for f in all_formats if f.get('acodec') != 'none' and f.get('vcodec') == 'none'] # 음성만
-            audio_formats_raw.sort(key=lambda x: (
-                x.get('abr') if x.get('abr') is not None else -1, # Audio Bitrate
-                1 if x.get('ext') == 'm4a' else (2 if x.get('ext') == 'opus' else (3 if x.get('ext') == 'webm' else 4))
-            ), reverse=True)
-            processed_info["audio_formats"] = [
-                {"format_id": f.get("format_id"), 
-                 "format_note": f.get("format_note") or (f"{f.get('abr')}k" if f.get('abr') else "N/A"), 
-                 "ext": f.get("ext"), 
-                 "filesize_approx": f.get("filesize_approx") or f.get("filesize"), 
-                 "abr": f.get('abr')} 
-                for f in audio_formats_raw
-            ]
-            
-            processed_info["default_video_format_id"] = get_best_format_id(processed_info["video_formats"], DEFAULT_VIDEO_FORMATS_PREF, is_video=True)
-            processed_info["default_audio_format_id"] = get_best_format_id(processed_info["audio_formats"], DEFAULT_AUDIO_FORMATS_PREF)
-
-        return jsonify(processed_info)
-
-    except yt_dlp.utils.DownloadError as e:
-        app.logger.error(f"yt-dlp 정보 가져오기 오류: {e}")
-        return jsonify({"error": f"정보 가져오기 실패: {str(e)}"}), 500
-    except TypeError as te:
-        app.logger.error(f"fetch_info 중 TypeError 발생: {te}", exc_info=True) # 스택 트레이스 포함 로깅
-        return jsonify({"error": f"서버 데이터 처리 오류: {str(te)}"}), 500
-    except Exception as e:
-        app.logger.error(f"fetch_info 중 일반 예외 발생: {e}", exc_info=True)
-        return jsonify({"error": f"서버 오류 발생: {str(e)}"}), 500
+        fetch_info_task.apply_async(args=[url, client_id], task_id=job_id)
+    except Exception:
+        release_metadata_job(job_id, client_id)
+        raise
+    metrics.inc('fetch_info_requests_total', result='queued')
+    return _fetch_info_job_response(job_id, 0 if data.get('async') else FETCH_INFO_WAIT_SECONDS)
+
+@app.route('/fetch_info/<job_id>')
+def fetch_info_job_route(job_id):
+    """비동기 정보 추출 결과 조회. wait(초)를 주면 최대 FETCH_INFO_WAIT_SECONDS까지 기다립니다."""
+    try:
+        wait_seconds = min(max(float(request.args.get('wait', 0)), 0), FETCH_INFO_WAIT_SECONDS)
+    except ValueError:
+        wait_seconds = 0
+    return _fetch_info_job_response(job_id, wait_seconds)
+
+@app.route('/playlist_entries')
+def playlist_entries_route():
+    """플레이리스트 항목 페이지 조회 (?url=...&offset=0&limit=100). /fetch_info가 캐시한 flat 추출 결과를 사용합니다."""
+    url = request.args.get('url')
+    if not url:
+        return jsonify({"error": "URL이 제공되지 않았습니다."}), 400
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = min(int(request.args.get('limit', PLAYLIST_PAGE_SIZE)), PLAYLIST_PAGE_MAX_SIZE)
+    except ValueError:
+        return jsonify({"error": "offset/limit은 정수여야 합니다."}), 400
+    # 웹 워커에서 추출하지 않도록 캐시에 있는 결과만 사용 (만료되었으면 정보를 다시 가져와야 함)
+    playlist_info_dict = info_cache.peek(url, 'flat')
+    if not playlist_info_dict:
+        return jsonify({"error": "플레이리스트 정보가 만료되었습니다. 정보를 다시 가져와주세요."}), 404
+    return jsonify(playlist_entries_page(playlist_info_dict, offset, limit))
 
 @app.route('/download', methods=['POST'])
 def download_route():
@@ -160,25 +166,104 @@ def download_route():
     use_thumbnail_as_cover = data.get('use_thumbnail_as_cover', False)
     title_override = data.get('title_override') # 플레이리스트 전체 제목 (항목별 제목은 Celery 작업 내에서 다시 조회)
     thumbnail_url_override = data.get('thumbnail_url_override') # 플레이리스트 대표 썸네일
+    parallel = data.get('parallel', False) # 플레이리스트 항목을 여러 워커에서 병렬로 처리
+    max_concurrency = data.get('max_concurrency') # 병렬 처리 시 동시에 처리할 항목 수 (서버 최대값으로 제한)
+    audio_output_mode = data.get('audio_output_mode') # 음성만 다운로드 시 auto(스트림 복사 우선) / transcode / native
+    rate_limit = data.get('rate_limit') # 작업별 최대 다운로드 속도 (예: "2M", 초당 바이트 수. 서버 최대값으로 제한)
 
     if not url:
         return jsonify({"error": "URL이 제공되지 않았습니다."}), 400
+    if audio_output_mode and audio_output_mode not in AUDIO_OUTPUT_MODES:
+        return jsonify({"error": f"지원하지 않는 음성 출력 방식입니다: {audio_output_mode}"}), 400
+    try:
+        parse_rate(rate_limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # 예상 비용(항목 수 x 해상도/음성 여부)으로 큐를 선택: 짧은 작업이 큰 플레이리스트 뒤에서 기다리지 않도록 분리
+    client_id = _client_id()
+    requested_height = None if audio_only else format_height(info_cache.peek(url, 'single'), video_format_id)
+    job_cost = estimate_job_cost(len(playlist_items or []), audio_only, requested_height)
+    job_queue = choose_queue(job_cost)
+
+    if should_fan_out(playlist_items, parallel):
+        # 항목별 하위 작업으로 분배 (이 작업 ID로 전체 진행 상태 조회)
+        task = download_playlist_task.apply_async(args=[
+            url, video_format_id, audio_format_id, audio_only,
+            playlist_items, use_thumbnail_as_cover,
+            title_override, thumbnail_url_override, max_concurrency, audio_output_mode, rate_limit
+        ], kwargs={'client_id': client_id}, queue=job_queue)
+        app.logger.info(f"Celery 병렬 작업 생성됨: {task.id} ({len(playlist_items)}개 항목, 큐: {job_queue}, 요청 URL: {url[:50]}...)")
+        return jsonify({"success": True, "message": "다운로드 작업이 요청되었습니다.", "task_id": task.id, "parallel": True,
+                        "queue": job_queue})
 
     # Celery 작업 호출
     task = download_video_task.apply_async(args=[
         None, # 첫 번째 arg는 task_id지만, Celery가 자동 생성 (bind=True 사용 시 self.request.id로 접근)
         url, video_format_id, audio_format_id, audio_only,
         playlist_items, use_thumbnail_as_cover,
-        title_override, thumbnail_url_override
-    ])
+        title_override, thumbnail_url_override, audio_output_mode, rate_limit
+    ], kwargs={'client_id': client_id}, queue=job_queue)
     
-    app.logger.info(f"Celery 작업 생성됨: {task.id} (요청 URL: {url[:50]}...)")
-    return jsonify({"success": True, "message": "다운로드 작업이 요청되었습니다.", "task_id": task.id})
+    app.logger.info(f"Celery 작업 생성됨: {task.id} (큐: {job_queue}, 비용: {job_cost}, 요청 URL: {url[:50]}...)")
+    return jsonify({"success": True, "message": "다운로드 작업이 요청되었습니다.", "task_id": task.id, "queue": job_queue})
 
-@app.route('/progress/<task_id>', methods=['GET'])
-def progress_status(task_id):
+@app.route('/download/batch', methods=['POST'])
+def download_batch_route():
+    """여러 영상 URL을 한 번에 요청합니다. 영상 ID로 중복을 제거하고 작업 하나(batch ID)로 큐에 넣습니다.
+
+    요청: {"items": ["URL", {"url": "URL", "audio_only": true, ...}, ...], (항목 옵션 기본값), "max_concurrency", "rate_limit"}
+    항목 옵션: video_format_id, audio_format_id, audio_only, use_thumbnail_as_cover, audio_output_mode, title_override
+    진행 상태는 /progress/<batch_id>로 전체 항목을 합쳐서 조회합니다.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        batch_items, duplicates = build_batch_items(data.get('items'), data, AUDIO_OUTPUT_MODES)
+        parse_rate(data.get('rate_limit'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    client_id = _client_id()
+    job_cost = sum(item_cost(batch_item['item_options']['audio_only']) for batch_item in batch_items)
+    job_queue = choose_queue(job_cost)
+    # 항목별 하위 작업은 워커에서 분배하므로 브로커에는 메시지 하나만 보냄
+    task = download_batch_task.apply_async(args=[
+        [{'url': batch_item['url'], 'item_options': batch_item['item_options']} for batch_item in batch_items],
+        data.get('max_concurrency'), data.get('rate_limit')
+    ], kwargs={'client_id': client_id}, queue=job_queue)
+    metrics.inc('batch_requests_total')
+    metrics.inc('batch_items_total', len(batch_items))
+    metrics.inc('batch_duplicates_total', len(duplicates))
+    app.logger.info(f"Celery 일괄 작업 생성됨: {task.id} ({len(batch_items)}개 항목, 중복 {len(duplicates)}개 제외, 큐: {job_queue})")
+    return jsonify({
+        "success": True, "message": "일괄 다운로드 작업이 요청되었습니다.",
+        "batch_id": task.id, "task_id": task.id, "parallel": True, "queue": job_queue,
+        "total_items": len(batch_items),
+        "items": [{"index": i, "request_index": batch_item['request_index'], "url": batch_item['url']}
+                  for i, batch_item in enumerate(batch_items)],
+        "duplicates": duplicates,
+    })
+
+@app.route('/cancel/<task_id>', methods=['POST'])
+def cancel_task_route(task_id):
+    """실행 중이거나 대기 중인 다운로드 작업을 취소합니다.
+
+    작업은 진행 hook/항목 사이에서 취소 플래그를 확인해 다운로드와 ffmpeg를 중단하고, 부분 파일을 지운 뒤
+    완료된 파일은 남긴 채 REVOKED 상태로 끝납니다. 대기열에 있는 작업은 시작하자마자 종료됩니다.
+    """
     task_result = AsyncResult(task_id, app=celery_app)
-    
+    if task_result.state in READY_STATES:
+        return jsonify({"error": "이미 끝난 작업입니다.", "task_id": task_id, "state": task_result.state}), 409
+    request_cancel(task_id)
+    app.logger.info(f"작업 취소 요청됨: {task_id} (상태: {task_result.state})")
+    return jsonify({"success": True, "message": "작업 취소가 요청되었습니다.", "task_id": task_id}), 202
+
+def _build_progress_response(task_id, task_state, task_info_meta, progress_entries=None):
+    """Celery 작업 상태와 meta(info)로 클라이언트에 전달할 진행 상태 응답(dict)을 만듭니다.
+
+    progress_entries는 read_progress_entries()의 반환값으로, 주어지면 로그/완료 파일은
+    작업별 Redis 리스트에서 읽은 커서 이후 항목(delta)으로 채우고 다음 커서를 함께 반환합니다.
+    """
     # 클라이언트에 전달할 기본 응답 구조
     response_data = {
         "task_id": task_id, 
@@ -186,17 +271,17 @@ def progress_status(task_id):
         "progress": 0,
         "files": [], # 최종 완료 시 전체 파일 목록 (SUCCESS 상태에서만 유효)
         "logs": [], 
-        "state": task_result.state,
+        "state": task_state,
         "newly_completed_file": None, # 방금 완료된 단일 파일 정보 (PROGRESS 상태에서 유효)
         "all_completed_files": [] # 현재까지 완료된 모든 파일 목록 (PROGRESS 상태에서 유효)
     }
 
-    task_info_meta = task_result.info      # PROGRESS, STARTED, FAILURE 등의 상태에서 Celery meta (dict)
-    task_final_output = task_result.result # SUCCESS 상태에서 Celery 작업의 return 값
+    # PROGRESS, STARTED, FAILURE 등의 상태에서는 Celery meta (dict), SUCCESS 상태에서는 작업의 return 값
+    task_final_output = task_info_meta
 
-    if task_result.state == 'PENDING':
+    if task_state == 'PENDING':
         response_data['status_text'] = '작업 대기 중...'
-    elif task_result.state == 'STARTED':
+    elif task_state == 'STARTED':
         response_data['status_text'] = '작업 시작됨...'
         if isinstance(task_info_meta, dict):
             # STARTED 상태에서도 초기 meta 정보가 있을 수 있음 (예: 초기 로그)
@@ -206,18 +291,22 @@ def progress_status(task_id):
             response_data['logs'] = task_info_meta.get('logs', [])
             response_data['newly_completed_file'] = task_info_meta.get('newly_completed_file')
             response_data['all_completed_files'] = task_info_meta.get('all_completed_files', [])
-    elif task_result.state == 'PROGRESS':
+    elif task_state == 'PROGRESS':
         if isinstance(task_info_meta, dict):
-            # tasks.py에서 _update_task_meta를 통해 설정한 모든 키를 가져옴
+            # tasks.py의 TaskProgressPublisher가 설정한 키를 가져옴 (로그/파일 목록은 별도 리스트)
             response_data['status_text'] = task_info_meta.get('status', '진행 중...')
             response_data['progress'] = task_info_meta.get('progress', 0)
             response_data['logs'] = task_info_meta.get('logs', [])
             response_data['newly_completed_file'] = task_info_meta.get('newly_completed_file')
             response_data['all_completed_files'] = task_info_meta.get('all_completed_files', [])
+            # 작업의 실제 다운로드 속도와 대역폭 예산에서 허용된 속도 (초당 바이트, 제한 없으면 rate_limit_bps는 null)
+            if 'throughput_bps' in task_info_meta:
+                response_data['throughput_bps'] = task_info_meta['throughput_bps']
+                response_data['rate_limit_bps'] = task_info_meta.get('rate_limit_bps')
         elif isinstance(task_info_meta, (int, float)): # 단순 진행률만 올 경우 (드묾)
             response_data['progress'] = task_info_meta
             response_data['status_text'] = f"진행률: {task_info_meta}%"
-    elif task_result.state == 'SUCCESS':
+    elif task_state == 'SUCCESS':
         if isinstance(task_final_output, dict):
             response_data['status_text'] = task_final_output.get('status', '작업 완료!')
             response_data['progress'] = task_final_output.get('progress', 100)
@@ -229,7 +318,7 @@ def progress_status(task_id):
             response_data['status_text'] = '작업 완료 (결과 형식 불일치)'
             response_data['progress'] = 100
             app.logger.warning(f"Task {task_id} SUCCESS, but result is not dict: {task_final_output}")
-    elif task_result.state == 'FAILURE':
+    elif task_state == 'FAILURE':
         response_data['status_text'] = '작업 실패'
         response_data['progress'] = 100 
         error_log_detail = str(task_info_meta) if task_info_meta else "알 수 없는 오류"
@@ -241,13 +330,31 @@ def progress_status(task_id):
         else:
             response_data['logs'].append(f"오류: {error_log_detail}")
         app.logger.error(f"Task {task_id} FAILED: {task_info_meta}")
-    else: # REVOKED, RETRY 등 기타 상태
-        response_data['status_text'] = f"작업 상태: {task_result.state}"
+    elif task_state == 'REVOKED':
+        # /cancel로 취소된 작업: 결과는 TaskRevokedError(취소 메시지), 이미 완료된 파일은 파일 리스트로 전달
+        response_data['status_text'] = str(task_info_meta) if task_info_meta else '작업 취소됨'
+        response_data['progress'] = 100
+    elif task_state == 'RETRY':
+        # 클라이언트별 동시 실행 한도로 잠시 뒤 다시 큐에 들어간 작업
+        response_data['status_text'] = '대기 중 (동시에 실행할 수 있는 작업 수 초과, 앞선 작업이 끝나면 시작)'
+    else: # 기타 상태
+        response_data['status_text'] = f"작업 상태: {task_state}"
         if isinstance(task_info_meta, dict) and 'logs' in task_info_meta:
             response_data['logs'] = task_info_meta['logs']
         elif task_info_meta:
             response_data['logs'] = [str(task_info_meta)]
 
+    if progress_entries is not None:
+        new_logs, next_log_cursor, new_files, next_file_cursor = progress_entries
+        # 리스트가 비어 있으면 (리스트 도입 이전 작업 등) meta에서 가져온 값을 그대로 사용
+        if next_log_cursor:
+            error_logs = [log for log in response_data['logs'] if log.startswith("오류:")] if task_state == 'FAILURE' else []
+            response_data['logs'] = new_logs + error_logs
+        if next_file_cursor:
+            response_data['all_completed_files'] = new_files
+        response_data['log_cursor'] = next_log_cursor
+        response_data['file_cursor'] = next_file_cursor
+
     # 파일 URL 생성 (newly_completed_file 및 all_completed_files에 대해)
     def add_url_to_file_info(file_info_obj):
         if file_info_obj and isinstance(file_info_obj, dict) and 'name' in file_info_obj and 'task_id' in file_info_obj:
@@ -265,17 +372,190 @@ def progress_status(task_id):
     if response_data['state'] == 'SUCCESS':
         response_data['files'] = response_data['all_completed_files']
 
-    return jsonify(response_data)
+    return response_data
+
+@app.route('/progress/<task_id>', methods=['GET'])
+def progress_status(task_id):
+    """진행 상태 조회. ?log_cursor=&file_cursor=를 주면 해당 위치 이후의 로그/완료 파일만 반환합니다."""
+    progress_request = (task_id, request.args.get('log_cursor', type=int), request.args.get('file_cursor', type=int))
+    return jsonify(_progress_responses([progress_request])[progress_request])
+
+@app.route('/progress', methods=['GET', 'POST'])
+def progress_batch():
+    """여러 작업의 진행 상태를 한 번에 조회합니다 (대시보드 등).
+
+    GET ?task_ids=a,b,c 또는 POST {"tasks": [{"task_id": "a", "log_cursor": 10, "file_cursor": 2}, ...]}
+    (POST에서는 {"task_ids": [...]}도 가능). 응답: {"tasks": {task_id: /progress/<task_id>와 같은 응답},
+    "snapshot_cache": 이 웹 프로세스의 스냅샷 캐시 적중률}
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        task_specs = data.get('tasks') or [{'task_id': task_id} for task_id in data.get('task_ids') or []]
+    else:
+        task_specs = [{'task_id': task_id} for task_id in request.args.get('task_ids', '').split(',')]
+    try:
+        progress_requests = list(dict.fromkeys( # 중복 제거 (순서 유지)
+            (str(spec['task_id']), _optional_int(spec.get('log_cursor')), _optional_int(spec.get('file_cursor')))
+            for spec in task_specs if isinstance(spec, dict) and spec.get('task_id')))
+    except (TypeError, ValueError):
+        return jsonify({"error": "log_cursor/file_cursor는 정수여야 합니다."}), 400
+    if not progress_requests:
+        return jsonify({"error": "task_ids가 제공되지 않았습니다."}), 400
+    if len(progress_requests) > PROGRESS_BATCH_MAX_TASKS:
+        return jsonify({"error": f"한 번에 조회할 수 있는 작업은 최대 {PROGRESS_BATCH_MAX_TASKS}개입니다."}), 400
+    metrics.inc('progress_batch_requests_total')
+    metrics.inc('progress_batch_tasks_total', len(progress_requests))
+    responses = _progress_responses(progress_requests)
+    # 같은 작업을 커서만 다르게 여러 번 요청하면 마지막 요청 기준 응답을 돌려줌
+    return jsonify({"tasks": {progress_request[0]: responses[progress_request] for progress_request in progress_requests},
+                    "snapshot_cache": progress_snapshots.stats()})
+
+def _optional_int(value):
+    return None if value is None else int(value)
+
+def _progress_responses(progress_requests):
+    """(task_id, log_cursor, file_cursor) 목록의 진행 상태 응답을 반환합니다.
+
+    짧은 시간 안에 같은 조회가 반복되면 프로세스 메모리의 스냅샷을 그대로 사용하고,
+    나머지는 Celery 결과 MGET과 로그/파일 리스트 조회를 파이프라인 한 번으로 처리합니다.
+    """
+    responses = {}
+    missing_requests = []
+    for progress_request in progress_requests:
+        cached_response = progress_snapshots.get(progress_request)
+        if cached_response is not None:
+            responses[progress_request] = cached_response
+        else:
+            missing_requests.append(progress_request)
+    if missing_requests:
+        snapshots = read_progress_batch(get_redis(), celery_app.backend, missing_requests)
+        for progress_request, (task_state, task_info_meta, progress_entries) in zip(missing_requests, snapshots):
+            response_data = _build_progress_response(progress_request[0], task_state, task_info_meta, progress_entries)
+            progress_snapshots.put(progress_request, response_data)
+            responses[progress_request] = response_data
+    return responses
+
+@app.route('/progress/<task_id>/stream', methods=['GET'])
+def progress_stream(task_id):
+    """진행 상태를 Server-Sent Events로 전달합니다. 상태가 바뀔 때만 이벤트를 보냅니다.
+
+    워커의 update_state는 Celery Redis 백엔드가 결과 키와 같은 이름의 채널로 PUBLISH하므로,
+    프로세스 공용 ProgressEventHub가 해당 채널을 구독해 연결된 클라이언트들에게 분배합니다.
+    """
+    channel = celery_app.backend.get_key_for_task(task_id).decode()
+    # 커서: 브라우저 자동 재연결 시에는 마지막 이벤트 id("로그커서:파일커서")가 Last-Event-ID로 전달됨
+    cursors = {'log': request.args.get('log_cursor', type=int), 'file': request.args.get('file_cursor', type=int)}
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if re.fullmatch(r'\d+:\d+', last_event_id):
+        cursors['log'], cursors['file'] = (int(v) for v in last_event_id.split(':'))
+
+    def build_with_entries(task_state, task_info_meta, read_entries=True):
+        if read_entries:
+            progress_entries = read_progress_entries(get_redis(), task_id, cursors['log'], cursors['file'])
+        else:
+            progress_entries = ([], cursors['log'], [], cursors['file'])
+        response_data = _build_progress_response(task_id, task_state, task_info_meta, progress_entries)
+        cursors['log'], cursors['file'] = response_data['log_cursor'], response_data['file_cursor']
+        return response_data
+
+    def read_current_response():
+        task_result = AsyncResult(task_id, app=celery_app)
+        return build_with_entries(task_result.state, task_result.info)
+
+    def status_key(response_data):
+        return (response_data['state'], response_data['status_text'], response_data['progress'])
+
+    def sse_event(response_json):
+        return f"id: {cursors['log']}:{cursors['file']}\n" + format_sse(response_json)
+
+    def generate():
+        subscriber_queue = progress_hub.subscribe(channel)
+        metrics.inc('progress_stream_connections_total')
+        try:
+            # 클라이언트가 재연결하면 자동으로 다시 요청하도록 재시도 간격 지정
+            yield "retry: 3000\n\n"
+            # 구독 후 현재 상태를 먼저 전달 (구독 이전의 변경 사항 보정)
+            response_data = read_current_response()
+            last_status_key = status_key(response_data)
+            yield sse_event(json.dumps(response_data, ensure_ascii=False))
+            if response_data['state'] in READY_STATES:
+                return
+
+            deadline = time.monotonic() + PROGRESS_STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                raw_payload = drain_latest(subscriber_queue, PROGRESS_STREAM_HEARTBEAT_SECONDS)
+                if raw_payload is None:
+                    # 이벤트가 없으면 한 번 직접 확인 (놓친 이벤트 보정), 변화가 없으면 keep-alive 주석만 전송
+                    response_data = read_current_response()
+                else:
+                    decoded = celery_app.backend.decode(raw_payload)
+                    task_state = decoded.get('status')
+                    if task_state in READY_STATES:
+                        # 최종 상태는 예외 객체 변환 등을 위해 AsyncResult로 다시 읽음
+                        response_data = read_current_response()
+                    else:
+                        # meta의 리스트 길이가 커서보다 클 때만 새 로그/파일을 읽음
+                        task_info_meta = decoded.get('result')
+                        has_new_entries = (not isinstance(task_info_meta, dict)
+                                           or cursors['log'] is None or cursors['file'] is None
+                                           or task_info_meta.get('log_count', 0) > cursors['log']
+                                           or task_info_meta.get('file_count', 0) > cursors['file'])
+                        response_data = build_with_entries(task_state, task_info_meta, read_entries=has_new_entries)
+
+                # 상태/진행률이 바뀌었거나 새 로그/파일이 있을 때만 이벤트 전송
+                if (status_key(response_data) != last_status_key
+                        or response_data['logs'] or response_data['all_completed_files']):
+                    last_status_key = status_key(response_data)
+                    metrics.inc('progress_stream_events_sent_total')
+                    yield sse_event(json.dumps(response_data, ensure_ascii=False))
+                elif raw_payload is None:
+                    yield ": keep-alive\n\n"
+                if response_data['state'] in READY_STATES:
+                    return
+        finally:
+            progress_hub.unsubscribe(channel, subscriber_queue)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # nginx 등 프록시 버퍼링 비활성화
+    return response
+
+@app.route('/task_files/<task_id>/all.zip')
+def serve_task_files_zip(task_id):
+    """작업에서 지금까지 완료된 파일 전체를 무압축 ZIP으로 스트리밍합니다 (진행 중인 작업도 가능)."""
+    if ".." in task_id or task_id.startswith('.'):
+        abort(400)
+    directory = os.path.join(TEMP_DOWNLOAD_BASE_DIR, str(task_id))
+    if not os.path.isdir(directory):
+        abort(404)
+
+    # 폴더를 훑는 대신 완료 파일 목록을 사용 (다운로드 중인 .part 등 미완성 파일 제외)
+    _, _, completed_files, _ = read_progress_entries(get_redis(), task_id, log_cursor=None, file_cursor=0)
+    entries = []
+    for file_info in completed_files:
+        name = file_info.get('name') if isinstance(file_info, dict) else None
+        filepath = safe_join(directory, name) if name else None
+        if filepath and os.path.isfile(filepath):
+            entries.append((name, filepath))
+    if not entries:
+        abort(404)
+
+    storage_janitor.touch(task_id)
+    app.logger.info(f"ZIP 스트리밍 시작: {task_id} ({len(entries)}개 파일)")
+    response = Response(stream_zip(entries), mimetype='application/zip')
+    response.headers['Content-Disposition'] = content_disposition(f"{task_id}.zip")
+    response.headers['X-Accel-Buffering'] = 'no' # 프록시가 전체를 버퍼링하지 않도록
+    return response
 
 @app.route('/task_files/<task_id>/<path:filename>')
 def serve_task_file(task_id, filename):
     # filename 디코딩 (웹 브라우저는 %23 등을 자동으로 원래 문자로 변환해서 서버에 요청할 수 있음)
     # Flask는 기본적으로 URL 경로를 디코딩하지만, 이중 확인 또는 명시적 처리가 필요할 수 있음.
-    # 여기서는 send_from_directory가 처리한다고 가정.
+    # 여기서는 Flask가 디코딩한 filename을 그대로 safe_join으로 검사한 뒤 file_serving.send_file_with_ranges로 전송.
 
     directory = os.path.join(TEMP_DOWNLOAD_BASE_DIR, str(task_id))
     # 기본적인 경로 조작 시도 방어
-    if ".." in task_id or ".." in filename:
+    if ".." in task_id or ".." in filename or task_id.startswith('.'): # '.'으로 시작하는 폴더는 다운로드 캐시 등 내부용
         app.logger.warning(f"Potentially malicious path detected: task_id={task_id}, filename={filename}")
         abort(400) # 잘못된 요청
         
@@ -283,22 +563,49 @@ def serve_task_file(task_id, filename):
         app.logger.error(f"Task directory not found for serving file: {directory}")
         abort(404)
     
-    # send_from_directory는 directory를 기준으로 filename을 찾음.
-    # filename에 슬래시가 포함된 하위 경로 접근은 기본적으로 차단됨 (보안 기능).
-    # 정규화된 경로를 얻어 비교하는 것이 더 안전할 수 있음:
-    # safe_path = os.path.abspath(os.path.join(directory, filename)))
-    # if not safe_path.startswith(os.path.abspath(directory)): abort(403)
+    # safe_join은 directory 밖을 가리키는 경로(절대 경로, .. 등)면 None을 반환
+    filepath = safe_join(directory, filename)
+    if filepath is None or not os.path.isfile(filepath):
+        app.logger.error(f"File not found: {filename} in {directory}")
+        abort(404)
     
     app.logger.info(f"Attempting to serve file: {filename} from task directory: {directory}")
+    storage_janitor.touch(task_id) # 최근에 받은 작업 폴더는 LRU 정리에서 나중에 삭제되도록
     try:
-        return send_from_directory(directory, filename, as_attachment=True)
+        # Range(이어받기)/ETag 지원, 설정에 따라 프록시(X-Accel-Redirect/X-Sendfile) 또는 sendfile로 전송
+        return send_file_with_ranges(filepath, os.path.basename(filepath), accel_path=f"{task_id}/{filename}")
     except FileNotFoundError:
-        app.logger.error(f"File not found by send_from_directory: {filename} in {directory}")
+        app.logger.error(f"File not found while serving: {filename} in {directory}")
         abort(404)
     except Exception as e: # 기타 예외 (권한 문제 등)
         app.logger.error(f"Error serving task file {filename} from {task_id}: {e}")
         abort(500)
 
+@app.route('/storage', methods=['GET'])
+def storage_status():
+    """작업 폴더 디스크 사용량, 실행 중 작업 수, 누적 정리(삭제) 통계."""
+    try:
+        return jsonify(storage_janitor.usage())
+    except Exception as e:
+        app.logger.error(f"저장 공간 상태 조회 오류: {e}")
+        return jsonify({"error": "저장 공간 상태를 조회할 수 없습니다."}), 500
+
+@app.route('/queues', methods=['GET'])
+def queues_status():
+    """다운로드 큐(interactive/bulk)별 대기 중/실행 중 작업 수와 최근 큐 대기 시간."""
+    try:
+        return jsonify(queue_stats())
+    except Exception as e:
+        app.logger.error(f"큐 상태 조회 오류: {e}")
+        return jsonify({"error": "큐 상태를 조회할 수 없습니다."}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """이 웹 프로세스의 카운터/히스토그램(Prometheus 텍스트 형식). 워커는 WORKER_METRICS_PORT에서 따로 제공합니다."""
+    return Response(metrics.render_prometheus(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+startup.log_startup_profile('web')
+
 if __name__ == '__main__':
     # Docker 환경에서는 이 부분이 직접 실행되지 않고, docker-compose.yml의 command가 실행됩니다.
     # 로컬 개발/테스트 시: python app.py
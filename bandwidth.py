@@ -0,0 +1,261 @@
+import os
+import time
+import re
+import threading
+import logging
+from collections import deque
+
+import metrics
+from redis_store import get_redis, KEY_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# yt-dlp parse_bytes와 같은 형식 (웹 계층에서 yt_dlp를 import하지 않도록 직접 해석): 숫자 + 선택적 K/M/G.. (1024 배수)
+_RATE_RE = re.compile(r'(\d+(?:\.\d+)?)\s*([KMGTPEZY]?)')
+_RATE_UNITS = 'KMGTPEZY'
+
+
+def parse_rate(value):
+    """'2M', '500K', 1048576 같은 값을 초당 바이트 수(int)로 변환합니다. 비어 있거나 0이면 None(제한 없음).
+
+    해석할 수 없는 값이면 ValueError를 발생시킵니다.
+    """
+    if value in (None, '', 0, '0'):
+        return None
+    if isinstance(value, (int, float)):
+        rate = int(value)
+    else:
+        match = _RATE_RE.fullmatch(str(value).strip().upper())
+        if match is None:
+            raise ValueError(f"속도 제한 값을 해석할 수 없습니다: {value}")
+        rate = round(float(match.group(1)) * 1024 ** (_RATE_UNITS.index(match.group(2)) + 1 if match.group(2) else 0))
+    if rate < 0:
+        raise ValueError(f"속도 제한 값은 0 이상이어야 합니다: {value}")
+    return rate or None
+
+
+DOWNLOAD_CONCURRENT_FRAGMENTS = int(os.environ.get('DOWNLOAD_CONCURRENT_FRAGMENTS', '4')) # DASH/HLS 형식에서 동시에 받는 조각 수 (단일 파일 형식에는 영향 없음)
+BANDWIDTH_TOTAL_LIMIT = parse_rate(os.environ.get('BANDWIDTH_TOTAL_LIMIT', '0')) # 모든 워커 노드가 나눠 쓰는 전체 다운로드 속도 (예: 50M, 0: 제한 없음)
+BANDWIDTH_TASK_MAX_LIMIT = parse_rate(os.environ.get('BANDWIDTH_TASK_MAX_LIMIT', '0')) # 작업 하나의 최대 속도 (요청의 rate_limit도 이 값 이하로 제한)
+BANDWIDTH_BURST_SECONDS = 1.0 # 버킷 용량: 예산 몇 초분까지 몰아서 받을 수 있는지
+BANDWIDTH_REBALANCE_INTERVAL_SECONDS = 1.0 # 활성 작업 목록을 다시 읽어 공정 몫을 계산하는 간격
+BANDWIDTH_ACTIVE_WINDOW_SECONDS = 5 # 최근 이 시간 안에 데이터를 받은 작업만 예산을 나눠 가짐
+THROUGHPUT_WINDOW_SECONDS = 5 # 작업 처리량(throughput_bps) 계산 구간
+_THROTTLE_MIN_CHUNK_BYTES = 256 * 1024 # Redis 왕복을 줄이기 위해 이만큼(또는 _THROTTLE_MAX_DELAY_SECONDS) 모아서 예산 차감
+_THROTTLE_MAX_DELAY_SECONDS = 0.25
+
+_ACTIVE_KEY = f"{KEY_PREFIX}bandwidth:active" # ZSET: 작업 ID -> 마지막으로 데이터를 받은 시각
+_CAPS_KEY = f"{KEY_PREFIX}bandwidth:caps" # HASH: 작업 ID -> 작업별 최대 속도 (0: 제한 없음)
+_GLOBAL_BUCKET_KEY = f"{KEY_PREFIX}bandwidth:bucket:global"
+
+# 토큰 버킷(여러 개)에서 requested 바이트를 차감하고, 가장 부족한 버킷 기준으로 기다릴 시간(초)을 반환합니다.
+# 토큰이 음수(빚)가 될 수 있어 요청은 항상 기록되고, 호출한 쪽이 반환된 시간만큼 쉬어 평균 속도를 맞춥니다.
+# 노드 간 시계 차이가 없도록 Redis 서버 시간을 사용합니다.
+_TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local requested = tonumber(ARGV[1])
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local capacity = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - requested
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', key, 60)
+    if tokens < 0 then
+        wait = math.max(wait, -tokens / rate)
+    end
+end
+return tostring(wait)
+"""
+
+
+def fair_shares(total_limit, caps):
+    """전체 예산을 작업들에 max-min 공정 분배합니다. caps는 {작업 ID: 작업별 최대 속도 또는 None}.
+
+    자기 몫보다 낮은 최대 속도를 가진 작업은 그 속도만 받고, 남은 예산은 나머지 작업이 똑같이 나눕니다.
+    """
+    shares = {}
+    remaining_budget = float(total_limit)
+    pending = dict(caps)
+    while pending:
+        equal_share = remaining_budget / len(pending)
+        capped = {task_id: cap for task_id, cap in pending.items() if cap and cap <= equal_share}
+        if not capped:
+            shares.update({task_id: equal_share for task_id in pending})
+            break
+        for task_id, cap in capped.items():
+            shares[task_id] = float(cap)
+            remaining_budget -= cap
+            del pending[task_id]
+    return shares
+
+
+class BandwidthScheduler:
+    """워커 전체의 다운로드 대역폭 예산을 Redis 토큰 버킷으로 관리합니다 (여러 노드가 같은 예산을 공유).
+
+    - 전체 버킷(BANDWIDTH_TOTAL_LIMIT): 모든 작업이 함께 차감
+    - 작업 버킷: 활성 작업 사이의 공정 몫(작업별 최대 속도 반영)으로 채워져 한 작업이 예산을 독차지하지 않음
+    병렬(fan-out) 작업의 하위 작업들은 job ID로 등록되어 한 작업의 몫을 나눠 씁니다.
+    """
+
+    def __init__(self, total_limit=BANDWIDTH_TOTAL_LIMIT, task_max_limit=BANDWIDTH_TASK_MAX_LIMIT, redis_client=None):
+        self.total_limit = total_limit
+        self.task_max_limit = task_max_limit
+        self._redis = redis_client
+        self._script = None
+
+    @property
+    def redis(self):
+        return self._redis or get_redis()
+
+    def task_cap(self, requested_limit=None):
+        """요청된 작업별 속도 제한을 서버 최대값(BANDWIDTH_TASK_MAX_LIMIT)으로 제한합니다. None이면 제한 없음."""
+        limits = [limit for limit in (requested_limit, self.task_max_limit) if limit]
+        return min(limits) if limits else None
+
+    def task_throttle(self, task_id, requested_limit=None):
+        return TaskThrottle(self, task_id, self.task_cap(requested_limit))
+
+    def rebalance(self, task_id, cap):
+        """이 작업을 활성으로 표시하고, 현재 활성 작업들 사이에서 이 작업의 몫(초당 바이트, None: 제한 없음)을 계산합니다."""
+        if not self.total_limit:
+            return cap
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(_ACTIVE_KEY, {str(task_id): now})
+        pipe.hset(_CAPS_KEY, str(task_id), int(cap or 0))
+        pipe.expire(_CAPS_KEY, 3600)
+        pipe.zremrangebyscore(_ACTIVE_KEY, '-inf', now - BANDWIDTH_ACTIVE_WINDOW_SECONDS)
+        pipe.zrange(_ACTIVE_KEY, 0, -1)
+        pipe.hgetall(_CAPS_KEY)
+        active_ids, all_caps = pipe.execute()[-2:]
+        caps = {active_id.decode(): int(all_caps.get(active_id, 0)) or None for active_id in active_ids}
+        caps[str(task_id)] = cap
+        share = fair_shares(self.total_limit, caps)[str(task_id)]
+        metrics.inc('bandwidth_rebalances_total')
+        return share
+
+    def consume(self, task_id, task_rate, nbytes):
+        """nbytes를 전체/작업 버킷에서 차감하고 기다려야 할 시간(초)을 반환합니다."""
+        buckets = []
+        if self.total_limit:
+            buckets.append((_GLOBAL_BUCKET_KEY, self.total_limit))
+        if task_rate:
+            buckets.append((f"{KEY_PREFIX}bandwidth:bucket:task:{task_id}", task_rate))
+        if not buckets:
+            return 0.0
+        if self._script is None:
+            self._script = self.redis.register_script(_TOKEN_BUCKET_LUA)
+        args = [nbytes]
+        for _, rate in buckets:
+            args.extend([rate, rate * BANDWIDTH_BURST_SECONDS])
+        return float(self._script(keys=[key for key, _ in buckets], args=args))
+
+    def release(self, task_id):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zrem(_ACTIVE_KEY, str(task_id))
+        pipe.hdel(_CAPS_KEY, str(task_id))
+        pipe.execute()
+
+
+class TaskThrottle:
+    """작업 하나의 다운로드 속도 제어와 처리량 측정. yt-dlp 진행 hook에서 on_progress(d)를 호출합니다.
+
+    hook에서 받은 바이트만큼 예산을 차감하고 필요한 시간만큼 hook 안에서 쉬어 다운로드 속도를 맞춥니다.
+    제한이 없으면 Redis를 사용하지 않고 처리량만 측정합니다. 여러 다운로드 스레드가 함께 사용할 수 있습니다.
+    """
+
+    def __init__(self, scheduler, task_id, cap=None):
+        self.scheduler = scheduler
+        self.task_id = task_id
+        self.cap = cap
+        self.limited = bool(scheduler.total_limit or cap)
+        self.rate_limit = cap # 현재 이 작업에 허용된 속도 (공정 몫, None: 제한 없음)
+        self._lock = threading.Lock()
+        self._file_bytes = {} # 파일 -> 마지막으로 본 downloaded_bytes
+        self._resumed_bytes = {} # 이어받을 .part 파일 -> 다운로드 전 크기 (expect_resumed)
+        self._samples = deque() # (시각, 바이트) 처리량 계산용
+        self._unpaid_bytes = 0
+        self._unpaid_since = time.monotonic()
+        self._last_rebalance = 0.0
+
+    def expect_resumed(self, part_sizes):
+        """다운로드 전에 남아 있던 .part 파일 크기({경로: 바이트})를 알려 이어받은 부분은 세지 않도록 합니다."""
+        with self._lock:
+            for part_path, size in part_sizes.items():
+                self._resumed_bytes[os.path.abspath(part_path)] = size
+
+    def on_progress(self, d):
+        if d.get('status') not in ('downloading', 'finished'):
+            return
+        file_key = d.get('tmpfilename') or d.get('filename')
+        downloaded_bytes = d.get('downloaded_bytes') or 0
+        now = time.monotonic()
+        with self._lock:
+            if file_key not in self._file_bytes and f"{file_key}.part" in self._file_bytes:
+                file_key = f"{file_key}.part" # 'finished' hook에는 tmpfilename 없이 최종 파일명만 옴
+            if file_key not in self._file_bytes:
+                # 처음 본 파일: 이어받은 다운로드면 이전 실행의 .part 크기를 기준값으로, 아니면 처음부터 셈
+                if d.get('resumed'):
+                    self._file_bytes[file_key] = downloaded_bytes
+                else:
+                    part_path = os.path.abspath(file_key) if file_key else None
+                    if part_path not in self._resumed_bytes:
+                        part_path = f"{part_path}.part"
+                    self._file_bytes[file_key] = self._resumed_bytes.pop(part_path, 0)
+            delta = max(0, downloaded_bytes - self._file_bytes[file_key])
+            self._file_bytes[file_key] = max(downloaded_bytes, self._file_bytes[file_key])
+            if d.get('status') == 'finished':
+                self._file_bytes.pop(file_key, None)
+            if not delta:
+                return
+            self._samples.append((now, delta))
+            metrics.inc('download_bytes_total', delta)
+            if not self.limited:
+                return
+            self._unpaid_bytes += delta
+            if self._unpaid_bytes < _THROTTLE_MIN_CHUNK_BYTES and now - self._unpaid_since < _THROTTLE_MAX_DELAY_SECONDS:
+                return
+            nbytes, self._unpaid_bytes, self._unpaid_since = self._unpaid_bytes, 0, now
+            rebalance_due = now - self._last_rebalance >= BANDWIDTH_REBALANCE_INTERVAL_SECONDS
+            if rebalance_due:
+                self._last_rebalance = now
+        try:
+            if rebalance_due:
+                self.rate_limit = self.scheduler.rebalance(self.task_id, self.cap)
+            wait_seconds = self.scheduler.consume(self.task_id, self.rate_limit, nbytes)
+        except Exception as e:
+            logger.warning(f"Task {self.task_id}: 대역폭 예산 확인 실패, 제한 없이 진행: {e}")
+            return
+        if wait_seconds > 0:
+            metrics.inc('bandwidth_throttle_wait_seconds_total', wait_seconds)
+            time.sleep(wait_seconds)
+
+    def throughput(self):
+        """최근 THROUGHPUT_WINDOW_SECONDS 동안의 실제 다운로드 속도 (초당 바이트)."""
+        now = time.monotonic()
+        with self._lock:
+            while self._samples and now - self._samples[0][0] > THROUGHPUT_WINDOW_SECONDS:
+                self._samples.popleft()
+            if not self._samples:
+                return 0
+            elapsed = max(now - self._samples[0][0], 1.0)
+            return int(sum(nbytes for _, nbytes in self._samples) / elapsed)
+
+    def stats(self):
+        rate_limit = self.rate_limit
+        return {'throughput_bps': self.throughput(), 'rate_limit_bps': int(rate_limit) if rate_limit else None}
+
+    def close(self):
+        if self.limited and self.scheduler.total_limit:
+            try:
+                self.scheduler.release(self.task_id)
+            except Exception as e:
+                logger.warning(f"Task {self.task_id}: 대역폭 예산 해제 실패: {e}")
+
+
+bandwidth_scheduler = BandwidthScheduler() # 프로세스 공용 인스턴스
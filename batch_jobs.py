@@ -0,0 +1,66 @@
+import os
+import logging
+from urllib.parse import urlparse, urlunparse
+
+from info_cache import youtube_video_id
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '500')) # /download/batch 한 번에 받을 수 있는 최대 URL 수
+# 항목별로 지정할 수 있는 옵션 (지정하지 않으면 요청 최상위의 값을 기본값으로 사용)
+BATCH_ITEM_OPTION_KEYS = ('video_format_id', 'audio_format_id', 'audio_only', 'use_thumbnail_as_cover',
+                          'audio_output_mode', 'title_override')
+
+def normalize_video_url(url):
+    """(중복 판별 키, 다운로드할 URL)을 반환합니다.
+
+    YouTube 영상은 영상 ID를 키로 하고 재생목록/시작 시간 등의 파라미터를 뺀 watch URL로 정규화합니다.
+    그 외 사이트는 앞뒤 공백과 #fragment만 제거한 URL 자체를 키로 사용합니다.
+    """
+    video_id = youtube_video_id(url)
+    if video_id:
+        return f"youtube:{video_id}", f"https://www.youtube.com/watch?v={video_id}"
+    parsed = urlparse(url.strip())
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        raise ValueError(f"지원하지 않는 URL입니다: {url}")
+    canonical_url = urlunparse(parsed._replace(fragment='', netloc=parsed.netloc.lower()))
+    return canonical_url, canonical_url
+
+
+def build_batch_items(raw_items, defaults, audio_output_modes):
+    """/download/batch 요청의 항목 목록을 정규화/중복 제거해 하위 작업에 넘길 항목 목록을 만듭니다.
+
+    raw_items: URL 문자열 또는 {"url": ..., (BATCH_ITEM_OPTION_KEYS 중 일부)} 목록
+    반환값: (items, duplicates)
+      items: [{'url', 'key', 'item_options', 'request_index'}] (처음 나온 순서)
+      duplicates: [{'request_index', 'url', 'duplicate_of'}] (duplicate_of는 같은 영상을 처음 요청한 request_index)
+    잘못된 항목이 있거나 같은 영상을 다른 옵션으로 다시 요청하면 ValueError (메시지는 클라이언트에 그대로 전달).
+    항목 파일은 job 폴더 하나에 영상 제목으로 저장되므로, 같은 영상의 다른 형식은 별도 요청으로 받아야 합니다.
+    """
+    if not isinstance(raw_items, list) or not raw_items:
+        raise ValueError("items(URL 목록)가 제공되지 않았습니다.")
+    if len(raw_items) > BATCH_MAX_ITEMS:
+        raise ValueError(f"한 번에 요청할 수 있는 URL은 최대 {BATCH_MAX_ITEMS}개입니다.")
+
+    items, duplicates = [], []
+    first_item_by_key = {}
+    for request_index, raw_item in enumerate(raw_items):
+        item_spec = {'url': raw_item} if isinstance(raw_item, str) else raw_item
+        if not isinstance(item_spec, dict) or not isinstance(item_spec.get('url'), str) or not item_spec['url'].strip():
+            raise ValueError(f"{request_index + 1}번째 항목에 URL이 없습니다.")
+        key, url = normalize_video_url(item_spec['url'])
+        item_options = {option: item_spec.get(option, defaults.get(option)) for option in BATCH_ITEM_OPTION_KEYS}
+        item_options['audio_only'] = bool(item_options['audio_only'])
+        item_options['use_thumbnail_as_cover'] = bool(item_options['use_thumbnail_as_cover'])
+        if item_options['audio_output_mode'] and item_options['audio_output_mode'] not in audio_output_modes:
+            raise ValueError(f"{request_index + 1}번째 항목: 지원하지 않는 음성 출력 방식입니다: {item_options['audio_output_mode']}")
+        first_item = first_item_by_key.get(key)
+        if first_item:
+            if first_item['item_options'] != item_options:
+                raise ValueError(f"{request_index + 1}번째 항목: {first_item['request_index'] + 1}번째 항목과 같은 영상을 "
+                                 f"다른 옵션으로 요청했습니다. 같은 영상의 다른 형식은 별도 요청으로 다운로드하세요.")
+            duplicates.append({'request_index': request_index, 'url': item_spec['url'], 'duplicate_of': first_item['request_index']})
+            continue
+        first_item_by_key[key] = {'url': url, 'key': key, 'item_options': item_options, 'request_index': request_index}
+        items.append(first_item_by_key[key])
+    return items, duplicates
@@ -0,0 +1,250 @@
+"""오프라인 서비스 벤치마크: 로컬 미디어 서버 + BenchStubIE + Redis 대용 서버로 실제 작업/웹 코드를 실행합니다.
+
+시나리오
+- single: 영상 1개 (progressive mp4)
+- single_dash: 영상 1개 (조각 단위 DASH, 조각 병렬 다운로드 경로)
+- playlist100 / playlist1000: 음성만(native) 100 / 1,000개 항목 플레이리스트 (단계별 파이프라인)
+- audio_art: 음성만 + 앨범 커버 (썸네일 다운로드/커버 변환 캐시, mutagen 태그)
+- progress_poll: 플레이리스트 작업 실행 중 클라이언트 N개가 /progress를 폴링
+
+지표: 처리량(항목/s, MB/s), 항목당 지연(다운로드 시작~후처리 완료 p50/p95), 항목(또는 요청)당 Redis 명령 수, 최대 RSS.
+시나리오마다 별도 프로세스에서 실행하므로 RSS는 시나리오별 최대값입니다.
+
+사용법:
+  python -m benchmarks.bench_service --scenario all --save bench.json
+  python -m benchmarks.bench_service --scenario all --compare bench.json --tolerance 0.25   # 회귀 시 종료 코드 1
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+import subprocess
+
+from benchmarks import offline_env
+
+SCENARIOS = ('single', 'single_dash', 'playlist100', 'playlist1000', 'audio_art', 'progress_poll')
+# 비교 시 값이 작아지면 회귀인 지표 / 커지면 회귀인 지표
+HIGHER_IS_BETTER = ('items_per_second', 'requests_per_second')
+LOWER_IS_BETTER = ('item_p95_ms', 'request_p95_ms', 'redis_ops_per_item', 'redis_ops_per_request', 'peak_rss_mb')
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class ItemTimer:
+    """항목별 다운로드 시작 ~ 후처리 완료 시간을 기록하도록 tasks의 단계 함수를 감쌉니다."""
+
+    def __init__(self, tasks_module):
+        self._started = {}
+        self.latencies_ms = []
+        self._lock = threading.Lock()
+        download_item_stage, postprocess_item_stage = tasks_module.download_item_stage, tasks_module.postprocess_item_stage
+
+        def timed_download(publisher, task_id, task_dir, item_index, *args, **kwargs):
+            with self._lock:
+                self._started[(task_id, item_index)] = time.perf_counter()
+            return download_item_stage(publisher, task_id, task_dir, item_index, *args, **kwargs)
+
+        def timed_postprocess(publisher, downloaded):
+            try:
+                return postprocess_item_stage(publisher, downloaded)
+            finally:
+                with self._lock:
+                    started = self._started.pop((downloaded['task_id'], downloaded['item_index']), None)
+                    if started is not None:
+                        self.latencies_ms.append((time.perf_counter() - started) * 1000)
+
+        tasks_module.download_item_stage = timed_download
+        tasks_module.postprocess_item_stage = timed_postprocess
+
+
+def _run_download_task(tasks_module, task_id, urls, audio_only, video_format_id=None, use_thumbnail_as_cover=False):
+    return tasks_module.download_video_task.apply(
+        args=(None, urls[0], video_format_id, None, audio_only, urls if len(urls) > 1 else None, use_thumbnail_as_cover),
+        kwargs={'audio_output_mode': 'native' if audio_only else None}, task_id=task_id)
+
+
+def run_scenario(name, args):
+    """현재 프로세스에서 시나리오 하나를 실행하고 결과 dict를 반환합니다."""
+    offline_env.prepare_environment(args.redis_url)
+    redis_counter = offline_env.RedisCommandCounter().install()
+    from benchmarks.stub_media import MediaServer
+    import tasks
+    offline_env.install_stub_extractor()
+    offline_env.use_eager_celery()
+    item_timer = ItemTimer(tasks)
+
+    item_count = {'single': 1, 'single_dash': 1, 'playlist100': 100, 'playlist1000': 1000,
+                  'audio_art': args.art_items, 'progress_poll': args.poll_items}[name]
+    audio_only = name in ('playlist100', 'playlist1000', 'audio_art', 'progress_poll')
+    task_id = f"bench-{name}-{os.getpid()}"
+    result = {'scenario': name, 'items': item_count}
+    with MediaServer(args.extract_latency_ms, args.media_size) as server:
+        urls = [server.video_url(f"{name}{n:05d}") for n in range(item_count)]
+        redis_counter.take()
+        started = time.perf_counter()
+        if name == 'progress_poll':
+            result.update(_run_progress_poll(tasks, task_id, urls, args, redis_counter))
+        else:
+            # 영상은 ffmpeg 병합이 필요 없는 형식을 직접 선택 (progressive 18 / 조각 단위 DASH 영상)
+            _run_download_task(tasks, task_id, urls, audio_only, video_format_id={'single': '18', 'single_dash': 'dash-360'}.get(name),
+                               use_thumbnail_as_cover=(name == 'audio_art'))
+        elapsed = time.perf_counter() - started
+        task_dir = os.path.join(tasks.TEMP_DOWNLOAD_BASE_DIR, task_id)
+        task_result = tasks.celery_app.AsyncResult(task_id).result
+        completed_files = [f['name'] for f in (task_result or {}).get('files', [])] if isinstance(task_result, dict) else []
+        downloaded_bytes = sum(os.path.getsize(os.path.join(task_dir, f)) for f in completed_files if os.path.exists(os.path.join(task_dir, f)))
+        shutil.rmtree(task_dir, ignore_errors=True)
+        media_requests = server.counts()
+
+    redis_ops = redis_counter.take()
+    result.update({
+        'completed': len(completed_files),
+        'seconds': round(elapsed, 3),
+        'items_per_second': round(len(completed_files) / elapsed, 2) if elapsed else None,
+        'mb_per_second': round(downloaded_bytes / 1024 / 1024 / elapsed, 2) if elapsed else None,
+        'item_p50_ms': round(_percentile(item_timer.latencies_ms, 0.5) or 0, 1),
+        'item_p95_ms': round(_percentile(item_timer.latencies_ms, 0.95) or 0, 1),
+        'redis_ops_per_item': round(redis_ops / max(item_count, 1), 1),
+        'media_requests': media_requests,
+        'peak_rss_mb': round(offline_env.peak_rss_mb(), 1),
+    })
+    return result
+
+
+def _run_progress_poll(tasks_module, task_id, urls, args, redis_counter):
+    """작업을 백그라운드 스레드에서 실행하고 클라이언트 N개가 브라우저처럼 커서를 이어가며 /progress를 폴링합니다."""
+    import app as web_app
+    from celery.states import READY_STATES
+
+    worker = threading.Thread(target=_run_download_task, args=(tasks_module, task_id, urls, True), daemon=True)
+    latencies_ms = []
+    request_redis_ops = []
+    latencies_lock = threading.Lock()
+    done = threading.Event()
+
+    def client():
+        test_client = web_app.app.test_client()
+        cursors = {}
+        while not done.is_set():
+            request_started, commands_before = time.perf_counter(), redis_counter.thread_commands()
+            response = test_client.get(f"/progress/{task_id}", query_string=cursors).get_json()
+            with latencies_lock:
+                latencies_ms.append((time.perf_counter() - request_started) * 1000)
+                request_redis_ops.append(redis_counter.thread_commands() - commands_before)
+            cursors = {'log_cursor': response.get('log_cursor'), 'file_cursor': response.get('file_cursor')}
+            cursors = {k: v for k, v in cursors.items() if v is not None}
+            if response['state'] in READY_STATES:
+                done.set()
+            time.sleep(args.poll_interval_ms / 1000.0)
+
+    started = time.perf_counter()
+    worker.start()
+    clients = [threading.Thread(target=client, daemon=True) for _ in range(args.clients)]
+    for client_thread in clients:
+        client_thread.start()
+    worker.join()
+    done.set()
+    for client_thread in clients:
+        client_thread.join()
+    elapsed = time.perf_counter() - started
+    cache_stats = web_app.progress_snapshots.stats()
+    return {
+        'clients': args.clients,
+        'requests': len(latencies_ms),
+        'requests_per_second': round(len(latencies_ms) / elapsed, 1) if elapsed else None,
+        'request_p50_ms': round(_percentile(latencies_ms, 0.5) or 0, 2),
+        'request_p95_ms': round(_percentile(latencies_ms, 0.95) or 0, 2),
+        'snapshot_cache_hit_rate': cache_stats['hit_rate'],
+        'redis_ops_per_request': round(sum(request_redis_ops) / max(len(request_redis_ops), 1), 2),
+    }
+
+
+def _run_in_subprocess(name, argv):
+    completed = subprocess.run([sys.executable, '-m', 'benchmarks.bench_service', '--scenario', name, '--emit-json'] + argv,
+                               capture_output=True, text=True)
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+    raise RuntimeError(f"시나리오 {name} 실행 실패:\n{completed.stderr[-2000:]}")
+
+
+def _print_table(results):
+    print(f"{'scenario':<15}{'items':>7}{'done':>6}{'sec':>9}{'items/s':>9}{'MB/s':>8}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'redis/item':>11}{'RSS MB':>8}")
+    for r in results:
+        print(f"{r['scenario']:<15}{r['items']:>7}{r['completed']:>6}{r['seconds']:>9.2f}{r['items_per_second'] or 0:>9.2f}"
+              f"{r['mb_per_second'] or 0:>8.2f}{r['item_p50_ms']:>9.1f}{r['item_p95_ms']:>9.1f}{r['redis_ops_per_item']:>11.1f}"
+              f"{r['peak_rss_mb']:>8.1f}")
+        if r['scenario'] == 'progress_poll':
+            print(f"{'':<15}clients={r['clients']} requests={r['requests']} req/s={r['requests_per_second']} "
+                  f"p50={r['request_p50_ms']}ms p95={r['request_p95_ms']}ms cache_hit_rate={r['snapshot_cache_hit_rate']} "
+                  f"redis/request={r['redis_ops_per_request']}")
+
+
+def compare_results(results, baseline, tolerance):
+    """기준 결과 대비 tolerance(비율) 이상 나빠진 지표 목록을 반환합니다."""
+    baseline_by_scenario = {r['scenario']: r for r in baseline}
+    regressions = []
+    for result in results:
+        base = baseline_by_scenario.get(result['scenario'])
+        if not base:
+            continue
+        for metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            current, previous = result.get(metric), base.get(metric)
+            if not current or not previous:
+                continue
+            worse = current < previous * (1 - tolerance) if metric in HIGHER_IS_BETTER else current > previous * (1 + tolerance)
+            if worse:
+                regressions.append(f"{result['scenario']}.{metric}: {previous} -> {current}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', default='all', choices=SCENARIOS + ('all',))
+    parser.add_argument('--media-size', type=int, default=256 * 1024)
+    parser.add_argument('--extract-latency-ms', type=int, default=0)
+    parser.add_argument('--art-items', type=int, default=20)
+    parser.add_argument('--poll-items', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=20, help="progress_poll 시나리오의 동시 폴링 클라이언트 수")
+    parser.add_argument('--poll-interval-ms', type=int, default=100)
+    parser.add_argument('--redis-url', default=None, help="지정하지 않으면 fakeredis Redis 대용 서버 사용")
+    parser.add_argument('--save', help="결과를 JSON으로 저장 (이후 --compare 기준)")
+    parser.add_argument('--compare', help="기준 결과 JSON과 비교해 회귀가 있으면 종료 코드 1")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--emit-json', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.emit_json:
+        print(json.dumps(run_scenario(args.scenario, args), ensure_ascii=False))
+        return
+
+    passthrough = ['--media-size', str(args.media_size), '--extract-latency-ms', str(args.extract_latency_ms),
+                   '--art-items', str(args.art_items), '--poll-items', str(args.poll_items), '--clients', str(args.clients),
+                   '--poll-interval-ms', str(args.poll_interval_ms)] + (['--redis-url', args.redis_url] if args.redis_url else [])
+    scenario_names = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+    results = [_run_in_subprocess(name, passthrough) for name in scenario_names]
+    _print_table(results)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"회귀: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
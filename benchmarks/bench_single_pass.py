@@ -0,0 +1,84 @@
+"""항목당 처리 시간 비교: 기존 2회 추출 경로 vs 단일 추출(process_ie_result) 경로.
+
+- legacy: 정보 전용 YoutubeDL로 extract_info(download=False) 후, 새 YoutubeDL로 extract_info(download=True)
+- single_pass: 한 번 추출한 info dict로 process_ie_result(download=True)
+- single_pass_cached: /fetch_info가 이미 정보를 캐시해 둔 경우 (작업에서는 추출 없음)
+
+사용법: python -m benchmarks.bench_single_pass --items 10 --extract-latency-ms 300
+"""
+import os
+import copy
+import time
+import argparse
+import tempfile
+import statistics
+
+import yt_dlp
+
+from benchmarks.stub_media import MediaServer, BenchStubIE
+
+INFO_OPTS = {'quiet': True, 'no_warnings': True, 'skip_download': True, 'noplaylist': True}
+
+
+def _download_opts(output_dir, title):
+    return {'quiet': True, 'no_warnings': True, 'noprogress': True, 'noplaylist': True, 'ignoreerrors': True, 'format': 'best',
+            'outtmpl': os.path.join(output_dir, f"{title}.%(ext)s")}
+
+
+def _new_ydl(opts):
+    ydl = yt_dlp.YoutubeDL(opts)
+    ydl.add_info_extractor(BenchStubIE())
+    return ydl
+
+
+def _extract(url):
+    with _new_ydl(INFO_OPTS) as ydl:
+        return ydl.sanitize_info(ydl.extract_info(url, download=False, ie_key='BenchStub'))
+
+
+def run_legacy(url, output_dir):
+    title = _extract(url).get('title')
+    with _new_ydl(_download_opts(output_dir, title)) as ydl:
+        ydl.extract_info(url, download=True, ie_key='BenchStub')
+
+
+def run_single_pass(url, output_dir, cached_info=None):
+    info = copy.deepcopy(cached_info) if cached_info is not None else _extract(url)
+    with _new_ydl(_download_opts(output_dir, info.get('title'))) as ydl:
+        ydl.process_ie_result(info, download=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=10)
+    parser.add_argument('--extract-latency-ms', type=int, default=300, help="추출 1회당 재현할 지연 (YouTube 페이지 요청 대용)")
+    parser.add_argument('--media-size', type=int, default=2 * 1024 * 1024)
+    args = parser.parse_args()
+
+    with MediaServer(args.extract_latency_ms, args.media_size) as server:
+        video_urls = [server.video_url(f"vid{n:05d}") for n in range(args.items)]
+        prefetched = {url: _extract(url) for url in video_urls} # /fetch_info 단계에서 채워지는 캐시 대용
+        server.reset_counts()
+
+        modes = {
+            'legacy': lambda url, out: run_legacy(url, out),
+            'single_pass': lambda url, out: run_single_pass(url, out),
+            'single_pass_cached': lambda url, out: run_single_pass(url, out, prefetched[url]),
+        }
+        print(f"items={args.items} extract_latency={args.extract_latency_ms}ms media_size={args.media_size}B")
+        print(f"{'mode':<20}{'mean(ms)':>10}{'p50(ms)':>10}{'max(ms)':>10}{'extracts/item':>15}")
+        for mode_name, runner in modes.items():
+            durations = []
+            with tempfile.TemporaryDirectory() as output_dir:
+                for url in video_urls:
+                    start = time.perf_counter()
+                    runner(url, output_dir)
+                    durations.append((time.perf_counter() - start) * 1000)
+            api_requests = server.counts().get('api', 0)
+            server.reset_counts()
+            print(f"{mode_name:<20}{statistics.mean(durations):>10.1f}{statistics.median(durations):>10.1f}"
+                  f"{max(durations):>10.1f}{api_requests / args.items:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
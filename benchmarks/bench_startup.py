@@ -0,0 +1,255 @@
+"""웹/워커 프로세스 시작 비용 벤치마크: import 시간, 첫 요청/첫 작업까지의 시간, 프로세스당 메모리.
+
+시나리오 (각각 새 프로세스에서 실행, Redis/네트워크 연결 없음)
+- web: app import → 첫 요청(/) 처리
+- worker: tasks import → worker_init(워커 본 프로세스 초기화, 사전 로드) → 첫 작업 준비
+  (YoutubeDL 생성 + URL에 맞는 추출기 찾기 + 앨범 커버용 mutagen/Pillow)
+- web_fork / web_fork_preload: gunicorn처럼 자식 프로세스 N개를 fork해 각각 첫 요청 처리
+  (preload: 부모가 app을 import한 뒤 fork = gunicorn --preload, 아니면 자식마다 import)
+- worker_fork: Celery prefork 풀처럼 부모가 tasks import + worker_init 후 자식 N개를 fork해 각각 첫 작업 준비
+
+지표: 시작~준비 완료 시간, RSS, 자식 프로세스의 고유 메모리(USS = Private_Clean + Private_Dirty)/PSS,
+로드된 모듈 수와 웹 계층에 불필요한 무거운 모듈(yt_dlp, mutagen, PIL 등) 로드 여부, import 시간 상위 모듈(-X importtime).
+
+사용법:
+  python -m benchmarks.bench_startup --scenario all --save startup.json
+  python -m benchmarks.bench_startup --scenario all --compare startup.json --tolerance 0.25   # 회귀 시 종료 코드 1
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import importlib
+import subprocess
+
+SCENARIOS = ('web', 'worker', 'web_fork', 'web_fork_preload', 'worker_fork')
+WORKER_ONLY_MODULES = ('yt_dlp', 'mutagen', 'PIL', 'requests', 'sqlite3')
+# 비교 시 값이 커지면 회귀인 지표
+LOWER_IS_BETTER = ('ready_seconds', 'rss_mb', 'child_uss_mb', 'child_ready_seconds')
+FIRST_TASK_URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+
+
+def _memory_mb():
+    """(RSS, USS, PSS) MB. /proc/self/smaps_rollup이 없으면 USS/PSS는 None."""
+    rss = uss = pss = None
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1]) / 1024
+    try:
+        fields = {}
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+        uss = (fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)) / 1024
+        pss = fields.get('Pss', 0) / 1024
+    except OSError:
+        pass
+    return rss, uss, pss
+
+
+def _loaded_worker_only_modules():
+    return [name for name in WORKER_ONLY_MODULES if name in sys.modules]
+
+
+def _import_web():
+    import app
+    return app
+
+
+def _first_request(app_module):
+    with app_module.app.test_client() as client:
+        client.get('/')
+
+
+def _import_worker():
+    import tasks
+    from celery.signals import worker_init
+    worker_init.send(sender=None) # celery worker 본 프로세스가 풀을 시작하기 전에 보내는 신호 (사전 로드 연결 지점)
+    return tasks
+
+
+def _first_task():
+    """작업 하나가 처음 실행될 때 필요한 준비: 풀에서 YoutubeDL을 얻어 URL에 맞는 추출기를 찾고, 커버 처리 모듈을 로드."""
+    from session_pool import ydl_pool
+    with ydl_pool.acquire({'quiet': True, 'no_warnings': True, 'skip_download': True, 'noplaylist': True}) as ydl:
+        next(ie_key for ie_key, ie in ydl._ies.items() if ie.suitable(FIRST_TASK_URL))
+    for module_name in ('mutagen.mp4', 'mutagen.id3'): # import 비용만 측정
+        importlib.import_module(module_name)
+    from PIL import Image
+    Image.init()
+
+
+def _run_children(child_count, child_body):
+    """자식 프로세스를 fork해 child_body()를 실행하고 각 자식의 준비 시간/메모리를 모읍니다."""
+    results = []
+    pipes = []
+    for _ in range(child_count):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            started = time.perf_counter()
+            child_body()
+            ready_seconds = time.perf_counter() - started
+            import gc
+            gc.collect() # 자식에서 GC가 돌면 부모에게서 물려받은 객체 페이지도 복사됨 (gc.freeze 효과 포함해 측정)
+            rss, uss, pss = _memory_mb()
+            os.write(write_fd, json.dumps({'ready_seconds': ready_seconds, 'rss_mb': rss, 'uss_mb': uss, 'pss_mb': pss}).encode())
+            os._exit(0)
+        os.close(write_fd)
+        pipes.append((pid, read_fd))
+    for pid, read_fd in pipes:
+        chunks = []
+        while True:
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+        results.append(json.loads(b''.join(chunks)))
+    return results
+
+
+def _child_summary(children):
+    average = lambda key: round(sum(c[key] for c in children) / len(children), 3) if children and children[0][key] is not None else None
+    return {'children': len(children), 'child_ready_seconds': average('ready_seconds'), 'child_rss_mb': average('rss_mb'),
+            'child_uss_mb': average('uss_mb'), 'child_pss_mb': average('pss_mb')}
+
+
+def run_scenario(name, args):
+    started = time.perf_counter()
+    result = {'scenario': name}
+    if name == 'web':
+        app_module = _import_web()
+        result['import_seconds'] = time.perf_counter() - started
+        _first_request(app_module)
+    elif name == 'worker':
+        _import_worker()
+        result['import_seconds'] = time.perf_counter() - started
+        _first_task()
+    elif name in ('web_fork', 'web_fork_preload'):
+        if name == 'web_fork_preload':
+            app_module = _import_web()
+            import gc
+            gc.freeze() # gunicorn.conf.py의 preload 처리와 동일
+            result.update(_child_summary(_run_children(args.children, lambda: _first_request(app_module))))
+        else:
+            result.update(_child_summary(_run_children(args.children, lambda: _first_request(_import_web()))))
+    elif name == 'worker_fork':
+        _import_worker()
+        result['import_seconds'] = time.perf_counter() - started
+        result.update(_child_summary(_run_children(args.children, _first_task)))
+    result['ready_seconds'] = time.perf_counter() - started
+    result['rss_mb'], _, _ = _memory_mb()
+    result['modules'] = len(sys.modules)
+    result['worker_only_modules'] = _loaded_worker_only_modules()
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in result.items()}
+
+
+def top_imports(module_name, limit):
+    """python -X importtime 결과에서 누적 import 시간이 큰 최상위(2단계 이내) 모듈 목록 [(모듈, ms)]."""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module_name}"],
+                               capture_output=True, text=True, env=_subprocess_env())
+    entries = []
+    for line in completed.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)', line)
+        if match and len(match.group(2)) <= 3:
+            entries.append((match.group(3), round(int(match.group(1)) / 1000, 1)))
+    return sorted(entries, key=lambda entry: -entry[1])[:limit]
+
+
+def _subprocess_env():
+    env = dict(os.environ)
+    env.setdefault('REDIS_URL', 'redis://127.0.0.1:1/0') # import만 하므로 연결하지 않음
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.getcwd(), env.get('PYTHONPATH')]))
+    return env
+
+
+def _run_in_subprocess(name, argv):
+    completed = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--scenario', name, '--emit-json'] + argv,
+                               capture_output=True, text=True, env=_subprocess_env())
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+    raise RuntimeError(f"시나리오 {name} 실행 실패:\n{completed.stderr[-2000:]}")
+
+
+def _median_result(runs):
+    """반복 실행 결과에서 수치 지표는 중앙값을 사용합니다 (디스크 캐시 등 첫 실행 편차 완화)."""
+    merged = dict(runs[0])
+    for key, value in runs[0].items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            values = sorted(run[key] for run in runs if run.get(key) is not None)
+            merged[key] = values[len(values) // 2] if values else None
+    return merged
+
+
+def _print_table(results):
+    print(f"{'scenario':<18}{'ready s':>9}{'import s':>10}{'RSS MB':>8}{'modules':>9}{'child s':>9}{'child USS':>11}{'child PSS':>11}"
+          f"  worker-only modules")
+    for r in results:
+        fmt = lambda key, width, spec: f"{r[key]:>{width}{spec}}" if r.get(key) is not None else f"{'-':>{width}}"
+        print(f"{r['scenario']:<18}{fmt('ready_seconds', 9, '.3f')}{fmt('import_seconds', 10, '.3f')}{fmt('rss_mb', 8, '.1f')}"
+              f"{r['modules']:>9}{fmt('child_ready_seconds', 9, '.3f')}{fmt('child_uss_mb', 11, '.1f')}{fmt('child_pss_mb', 11, '.1f')}"
+              f"  {','.join(r['worker_only_modules']) or '-'}")
+
+
+def compare_results(results, baseline, tolerance):
+    """기준 결과 대비 tolerance(비율) 이상 나빠진 지표 목록을 반환합니다."""
+    baseline_by_scenario = {r['scenario']: r for r in baseline}
+    regressions = []
+    for result in results:
+        base = baseline_by_scenario.get(result['scenario'])
+        if not base:
+            continue
+        for metric in LOWER_IS_BETTER:
+            current, previous = result.get(metric), base.get(metric)
+            if current and previous and current > previous * (1 + tolerance):
+                regressions.append(f"{result['scenario']}.{metric}: {previous} -> {current}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', default='all', choices=SCENARIOS + ('all',))
+    parser.add_argument('--children', type=int, default=4, help="fork 시나리오의 자식 프로세스 수")
+    parser.add_argument('--repeat', type=int, default=3, help="시나리오별 반복 횟수 (중앙값 사용)")
+    parser.add_argument('--top-imports', type=int, default=8, help="import 시간 상위 모듈 표시 개수 (0: 생략)")
+    parser.add_argument('--save', help="결과를 JSON으로 저장 (이후 --compare 기준)")
+    parser.add_argument('--compare', help="기준 결과 JSON과 비교해 회귀가 있으면 종료 코드 1")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--emit-json', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.emit_json:
+        print(json.dumps(run_scenario(args.scenario, args), ensure_ascii=False))
+        return
+
+    scenario_names = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+    results = [_median_result([_run_in_subprocess(name, ['--children', str(args.children)]) for _ in range(args.repeat)])
+               for name in scenario_names]
+    _print_table(results)
+    if args.top_imports:
+        for module_name in ('app', 'tasks'):
+            print(f"\nimport {module_name}: " + ", ".join(f"{name} {ms}ms" for name, ms in top_imports(module_name, args.top_imports)))
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"회귀: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
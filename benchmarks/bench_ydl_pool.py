@@ -0,0 +1,86 @@
+"""항목당 YoutubeDL 준비 비용 비교: 매번 새 인스턴스 생성 vs 프로세스 풀(session_pool.YoutubeDLPool) 재사용.
+
+- setup: 인스턴스 준비 + 정리만 (항목당 작업이 만드는 인스턴스 수만큼 반복)
+- item: 준비 + 캐시된 info dict로 process_ie_result(download=True) (CDN 연결 재사용 효과 포함)
+
+사용법: python -m benchmarks.bench_ydl_pool --items 50 --media-size 262144
+"""
+import os
+import copy
+import time
+import argparse
+import tempfile
+import statistics
+
+import yt_dlp
+
+from benchmarks.stub_media import MediaServer, BenchStubIE
+from session_pool import YoutubeDLPool
+
+INFO_OPTS = {'quiet': True, 'no_warnings': True, 'skip_download': True, 'noplaylist': True}
+DOWNLOAD_OPTS = {'quiet': True, 'no_warnings': True, 'noprogress': True, 'noplaylist': True, 'ignoreerrors': True, 'format': 'best'}
+INSTANCES_PER_ITEM = 3 # 작업의 항목당 사용: 캐시 키 포맷 해석, 다운로드, 음성 추출
+
+
+def _new_ydl(opts):
+    ydl = yt_dlp.YoutubeDL(opts)
+    ydl.add_info_extractor(BenchStubIE())
+    return ydl
+
+
+class _Fresh:
+    """기존 방식: 사용할 때마다 새 YoutubeDL 생성 후 닫음."""
+
+    def acquire(self, options):
+        return _new_ydl(options)
+
+
+def _download_opts(output_dir, title):
+    return dict(DOWNLOAD_OPTS, outtmpl=os.path.join(output_dir, f"{title}.%(ext)s"), progress_hooks=[lambda d: None])
+
+
+def _measure(label, provider, video_urls, infos, output_dir, media_counts):
+    setup_ms, item_ms = [], []
+    for url in video_urls:
+        start = time.perf_counter()
+        for _ in range(INSTANCES_PER_ITEM):
+            with provider.acquire(_download_opts(output_dir, 'setup')):
+                pass
+        setup_ms.append((time.perf_counter() - start) * 1000 / INSTANCES_PER_ITEM)
+
+        start = time.perf_counter()
+        with provider.acquire(_download_opts(output_dir, infos[url]['id'])) as ydl:
+            ydl.process_ie_result(copy.deepcopy(infos[url]), download=True)
+        item_ms.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<10}{statistics.mean(setup_ms):>14.2f}{statistics.median(setup_ms):>12.2f}"
+          f"{statistics.mean(item_ms):>14.2f}{statistics.median(item_ms):>12.2f}{media_counts():>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=50)
+    parser.add_argument('--media-size', type=int, default=256 * 1024)
+    args = parser.parse_args()
+
+    with MediaServer(0, args.media_size) as server:
+        video_urls = [server.video_url(f"pool{n:05d}") for n in range(args.items)]
+        with _new_ydl(INFO_OPTS) as ydl:
+            infos = {url: ydl.sanitize_info(ydl.extract_info(url, download=False, ie_key='BenchStub')) for url in video_urls}
+
+        def media_requests():
+            count = server.counts().get('media', 0)
+            server.reset_counts()
+            return count
+
+        print(f"items={args.items} media_size={args.media_size}B instances_per_item={INSTANCES_PER_ITEM + 1}")
+        print(f"{'mode':<10}{'setup mean':>14}{'setup p50':>12}{'item mean':>14}{'item p50':>12}{'media':>10}  (ms)")
+        server.reset_counts()
+        for label, provider in (('fresh', _Fresh()), ('pooled', YoutubeDLPool(factory=_new_ydl))):
+            with tempfile.TemporaryDirectory() as output_dir:
+                _measure(label, provider, video_urls, infos, output_dir, media_requests)
+            if isinstance(provider, YoutubeDLPool):
+                provider.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""YouTube/Redis 없이 웹 앱과 Celery 작업 코드를 그대로 실행하기 위한 벤치마크 환경.
+
+- start_redis_standin: fakeredis(개발용 선택 의존성)의 프로세스 내 Redis 대용 서버 사용 (--redis-url로 실제 Redis 사용 가능)
+- RedisCommandCounter: 이 프로세스의 redis-py 클라이언트가 보낸 명령 수 (파이프라인은 명령 개수만큼)
+- install_stub_extractor: 작업 코드의 YoutubeDL 풀/URL 해석이 BenchStubIE를 사용하도록 연결
+- use_eager_celery: 브로커/워커 없이 작업을 호출한 스레드에서 실행 (진행 상태/결과는 결과 백엔드에 그대로 기록)
+
+redis_store/tasks/app은 import 시 REDIS_URL을 읽으므로, 이 환경을 준비한 뒤에 import해야 합니다.
+"""
+import os
+import atexit
+import shutil
+import tempfile
+import resource
+import threading
+
+import redis
+
+
+STANDIN_REDIS_URL = "redis://bench-standin:6379/0"
+
+
+def start_redis_standin():
+    """이후 생성되는 모든 redis-py 연결 풀(앱 코드, Celery 결과 백엔드)이 프로세스 내 fakeredis 서버 하나를 쓰도록 합니다.
+
+    TCP 대용 서버는 명령마다 수 ms의 폴링 지연이 있어 Redis 왕복 시간이 결과를 지배하므로 사용하지 않습니다.
+    Lua 스크립트(대역폭 토큰 버킷)를 위해 lupa도 필요합니다.
+    """
+    try:
+        from fakeredis import FakeServer, FakeConnection
+    except ImportError:
+        raise SystemExit("fakeredis가 필요합니다 (pip install fakeredis lupa) - 또는 --redis-url로 로컬 Redis를 지정하세요.")
+    server = FakeServer()
+    original_pool_init = redis.ConnectionPool.__init__
+
+    def pool_init(pool, connection_class=redis.Connection, max_connections=None, **connection_kwargs):
+        connection_kwargs['server'] = server
+        original_pool_init(pool, connection_class=FakeConnection, max_connections=max_connections, **connection_kwargs)
+
+    redis.ConnectionPool.__init__ = pool_init
+    return STANDIN_REDIS_URL
+
+
+def prepare_environment(redis_url=None):
+    """REDIS_URL과 벤치마크용 기본 설정을 환경 변수로 지정합니다 (앱/작업 모듈 import 전에 호출)."""
+    os.environ['REDIS_URL'] = redis_url or start_redis_standin()
+    os.environ.setdefault('DOWNLOAD_CACHE_MAX_BYTES', '0') # 같은 항목 재사용 없이 매번 실제 다운로드 경로 측정
+    os.environ.setdefault('CLIENT_MAX_RUNNING_SLOTS', '0')
+    if 'THUMBNAIL_CACHE_DIR' not in os.environ:
+        # 실행마다 빈 썸네일 캐시로 시작 (이전 실행의 변환 결과를 재사용하지 않도록)
+        thumbnail_cache_dir = tempfile.mkdtemp(prefix='bench-thumbnails-')
+        atexit.register(shutil.rmtree, thumbnail_cache_dir, True)
+        os.environ['THUMBNAIL_CACHE_DIR'] = thumbnail_cache_dir
+    return os.environ['REDIS_URL']
+
+
+class RedisCommandCounter:
+    """redis-py 클라이언트(앱 코드, Celery 결과 백엔드 모두)가 보낸 명령 수를 셉니다. pub/sub 수신은 제외."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.commands = 0
+
+    def _add(self, amount):
+        with self._lock:
+            self.commands += amount
+        self._local.commands = self.thread_commands() + amount
+
+    def thread_commands(self):
+        """현재 스레드가 보낸 누적 명령 수 (요청 하나의 명령 수를 잴 때 전후 차이로 사용)."""
+        return getattr(self._local, 'commands', 0)
+
+    def install(self):
+        counter = self
+        original_execute_command = redis.Redis.execute_command
+        original_pipeline_execute = redis.client.Pipeline.execute
+
+        def execute_command(client, *args, **options):
+            counter._add(1)
+            return original_execute_command(client, *args, **options)
+
+        def pipeline_execute(pipe, *args, **kwargs):
+            counter._add(len(pipe.command_stack))
+            return original_pipeline_execute(pipe, *args, **kwargs)
+
+        redis.Redis.execute_command = execute_command
+        redis.client.Pipeline.execute = pipeline_execute
+        return self
+
+    def take(self):
+        """지금까지의 명령 수를 반환하고 0으로 되돌립니다."""
+        with self._lock:
+            commands, self.commands = self.commands, 0
+        return commands
+
+
+def install_stub_extractor():
+    """작업 코드가 만드는 YoutubeDL이 'benchstub:' URL을 BenchStubIE로 추출하도록 연결합니다."""
+    import yt_dlp
+    import tasks
+    from session_pool import ydl_pool
+    from benchmarks.stub_media import BenchStubIE
+
+    def factory(options):
+        ydl = yt_dlp.YoutubeDL(options)
+        ydl.add_info_extractor(BenchStubIE())
+        # generic 추출기보다 먼저 확인되도록 맨 앞으로 이동
+        ydl._ies = {'BenchStub': ydl._ies.pop('BenchStub'), **ydl._ies}
+        return ydl
+
+    ydl_pool.clear()
+    ydl_pool.factory = factory
+    resolve_item_urls = tasks.resolve_item_urls
+    tasks.resolve_item_urls = lambda base_url, items: (
+        list(items) if items and all(str(item).startswith('benchstub:') for item in items) else resolve_item_urls(base_url, items))
+
+
+def use_eager_celery():
+    """Celery 작업을 호출 스레드에서 바로 실행하고, 결과도 백엔드에 저장합니다 (/progress 조회 가능)."""
+    from tasks import celery_app
+    celery_app.conf.task_always_eager = True
+    celery_app.conf.task_store_eager_result = True
+    return celery_app
+
+
+def peak_rss_mb():
+    """프로세스 최대 상주 메모리 (Linux ru_maxrss는 KB 단위)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,196 @@
+"""벤치마크용 로컬 미디어 서버와 yt-dlp 대체 추출기.
+
+YouTube에 접속하지 않고 추출/다운로드 경로를 측정하기 위해 사용합니다.
+- MediaServer: /api/<id> (추출 지연 재현용 메타데이터), /media/<id>.<ext> (합성 미디어, mp4/m4a는 태그를 쓸 수 있는 최소 MP4 구조),
+  /media/<id>-seg<n>.m4s (DASH 조각), /thumb/<id>.webp (1280x720 WebP 썸네일)
+- BenchStubIE: 'benchstub:<서버 주소>/<id>' URL을 위 서버의 메타데이터로 해석하는 InfoExtractor
+  (progressive 18(mp4), 음성 140(m4a), 조각 단위 DASH 영상 dash-360)
+"""
+import io
+import re
+import json
+import struct
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from yt_dlp.extractor.common import InfoExtractor
+
+THUMBNAIL_SIZE = (1280, 720) # YouTube maxresdefault와 같은 크기의 썸네일 (앨범 커버 변환 비용 측정용)
+
+
+DASH_SEGMENT_COUNT = 8 # DASH 영상 형식의 조각 수
+
+
+def _mp4_box(box_type, payload):
+    return struct.pack('>I', 8 + len(payload)) + box_type + payload
+
+
+def _mp4_header():
+    """ftyp + moov(mvhd)만 있는 최소 MP4 헤더 (mutagen으로 앨범 커버 태그를 쓸 수 있는 구조)."""
+    mvhd = _mp4_box(b'mvhd', b'\x00' * 12 + struct.pack('>II', 1000, 60000) + b'\x00' * 80)
+    return _mp4_box(b'ftyp', b'M4A \x00\x00\x02\x00M4A isommp42') + _mp4_box(b'moov', mvhd)
+
+
+class _MediaRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass # 벤치마크 출력에 접근 로그가 섞이지 않도록 비활성화
+
+    def _send(self, status, body, content_type, extra_headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        media_server = self.server.media_server
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+
+        api_match = re.fullmatch(r'/api/([\w-]+)', parsed.path)
+        if api_match:
+            media_server.count('api')
+            # 실제 추출기의 웹페이지/API 요청 지연을 재현
+            time.sleep(media_server.extract_latency_ms / 1000.0)
+            video_id = api_match.group(1)
+            body = json.dumps({'id': video_id, 'title': f"Bench video {video_id}", 'duration': 60,
+                               'size': media_server.media_size}).encode('utf-8')
+            return self._send(200, body, 'application/json')
+
+        media_match = re.fullmatch(r'/media/([\w-]+)\.(\w+)', parsed.path)
+        if media_match:
+            media_server.count('media')
+            size = int(query.get('size', [media_server.media_size])[0])
+            payload = media_server.payload(size, media_match.group(2))
+            range_match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+            if range_match:
+                start = int(range_match.group(1))
+                end = int(range_match.group(2)) if range_match.group(2) else size - 1
+                end = min(end, size - 1)
+                return self._send(206, payload[start:end + 1], 'application/octet-stream',
+                                  {'Content-Range': f"bytes {start}-{end}/{size}", 'Accept-Ranges': 'bytes'})
+            return self._send(200, payload, 'application/octet-stream', {'Accept-Ranges': 'bytes'})
+
+        if re.fullmatch(r'/thumb/([\w-]+)\.webp', parsed.path):
+            media_server.count('thumb')
+            return self._send(200, media_server.thumbnail(), 'image/webp')
+
+        self._send(404, b'not found', 'text/plain')
+
+
+class MediaServer:
+    """합성 미디어를 제공하는 로컬 HTTP 서버 (별도 스레드에서 실행)."""
+
+    def __init__(self, extract_latency_ms=300, media_size=2 * 1024 * 1024, host='127.0.0.1', port=0):
+        self.extract_latency_ms = extract_latency_ms
+        self.media_size = media_size
+        self._payload_cache = {}
+        self._counts = {}
+        self._counts_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _MediaRequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.media_server = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def video_url(self, video_id):
+        """BenchStubIE가 처리하는 영상 URL."""
+        return f"benchstub:{self.base_url}/{video_id}"
+
+    def payload(self, size, ext=None):
+        """size 바이트의 합성 미디어. mp4/m4a는 MP4 헤더 뒤에 mdat으로 채웁니다 (전체 크기는 size 그대로)."""
+        container = 'mp4' if ext in ('mp4', 'm4a') else 'raw'
+        if (size, container) not in self._payload_cache:
+            block = bytes(range(256)) * 4096
+            header = _mp4_header() if container == 'mp4' else b''
+            if header:
+                header += struct.pack('>I', max(size - len(header), 8)) + b'mdat'
+            body_size = max(size - len(header), 0)
+            self._payload_cache[(size, container)] = header + (block * (body_size // len(block) + 1))[:body_size]
+        return self._payload_cache[(size, container)]
+
+    def thumbnail(self):
+        """그라데이션 WebP 썸네일 (Pillow로 한 번만 생성). 모든 영상이 같은 이미지를 사용합니다 (앨범 커버 공유)."""
+        if 'thumbnail' not in self._payload_cache:
+            from PIL import Image
+            img = Image.merge('RGB', (Image.linear_gradient('L').resize(THUMBNAIL_SIZE),
+                                      Image.radial_gradient('L').resize(THUMBNAIL_SIZE),
+                                      Image.linear_gradient('L').rotate(90).resize(THUMBNAIL_SIZE)))
+            output = io.BytesIO()
+            img.save(output, format='WEBP', quality=80)
+            self._payload_cache['thumbnail'] = output.getvalue()
+        return self._payload_cache['thumbnail']
+
+    def count(self, kind):
+        with self._counts_lock:
+            self._counts[kind] = self._counts.get(kind, 0) + 1
+
+    def counts(self):
+        with self._counts_lock:
+            return dict(self._counts)
+
+    def reset_counts(self):
+        with self._counts_lock:
+            self._counts.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='bench-media-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class BenchStubIE(InfoExtractor):
+    """MediaServer의 메타데이터로 영상 정보를 만드는 추출기 (ie_key: 'BenchStub')."""
+    IE_NAME = 'benchstub'
+    _VALID_URL = r'benchstub:(?P<base>https?://[^/]+)/(?P<id>[\w-]+)'
+
+    def _real_extract(self, url):
+        base_url, video_id = self._match_valid_url(url).group('base', 'id')
+        meta = self._download_json(f"{base_url}/api/{video_id}", video_id, note=False)
+        size = meta['size']
+        segment_size = max(size // DASH_SEGMENT_COUNT, 1)
+        return {
+            'id': video_id,
+            'title': meta['title'],
+            'duration': meta['duration'],
+            'thumbnail': f"{base_url}/thumb/{video_id}.webp",
+            'webpage_url': url,
+            'formats': [{
+                'format_id': '18', 'url': f"{base_url}/media/{video_id}.mp4?size={size}", 'ext': 'mp4',
+                'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2', 'width': 640, 'height': 360, 'filesize': size,
+            }, {
+                'format_id': '140', 'url': f"{base_url}/media/{video_id}.m4a?size={size // 4}", 'ext': 'm4a',
+                'vcodec': 'none', 'acodec': 'mp4a.40.2', 'abr': 128, 'filesize': size // 4,
+            }, {
+                # 조각 단위로 받는 DASH 영상 (concurrent_fragment_downloads 경로, 명시적으로 선택할 때만 사용)
+                'format_id': 'dash-360', 'url': f"{base_url}/media/{video_id}.mpd", 'ext': 'mp4', 'protocol': 'http_dash_segments',
+                'vcodec': 'avc1.42001E', 'acodec': 'none', 'width': 640, 'height': 360, 'preference': -10,
+                'filesize': segment_size * DASH_SEGMENT_COUNT,
+                'fragments': [{'url': f"{base_url}/media/{video_id}-seg{n}.m4s?size={segment_size}", 'duration': 60 / DASH_SEGMENT_COUNT}
+                              for n in range(DASH_SEGMENT_COUNT)],
+            }],
+        }
@@ -0,0 +1,130 @@
+import os
+import signal
+import time
+import threading
+import logging
+from contextlib import contextmanager
+
+import yt_dlp
+
+from redis_store import get_redis, task_cancel_key
+
+logger = logging.getLogger(__name__)
+
+CANCEL_CHECK_INTERVAL_SECONDS = 0.5 # 진행 hook 등에서 취소 플래그를 Redis에서 다시 읽는 최소 간격
+
+
+class TaskCancelled(yt_dlp.utils.DownloadCancelled):
+    """작업 취소 요청으로 중단됨. DownloadCancelled이므로 yt-dlp가 ignoreerrors여도 삼키지 않고 그대로 전파합니다."""
+
+
+def is_cancel_requested(task_id, redis_client=None):
+    """취소 요청 플래그(task_app.request_cancel이 설정)가 있는지 확인합니다."""
+    return bool((redis_client or get_redis()).exists(task_cancel_key(task_id)))
+
+
+class CancelToken:
+    """작업 하나의 취소 여부를 확인합니다. Redis 조회는 CANCEL_CHECK_INTERVAL_SECONDS 간격으로만 하며, 한 번 취소되면 계속 취소 상태입니다."""
+
+    def __init__(self, task_id, redis_client=None, check_interval=CANCEL_CHECK_INTERVAL_SECONDS):
+        self.task_id = task_id
+        self._redis = redis_client
+        self.check_interval = check_interval
+        self._cancelled = False
+        self._last_checked = 0.0
+        self._lock = threading.Lock()
+
+    def is_cancelled(self):
+        if self._cancelled:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_checked < self.check_interval:
+                return self._cancelled
+            self._last_checked = now
+        try:
+            cancelled = is_cancel_requested(self.task_id, self._redis)
+        except Exception as e:
+            logger.warning(f"Task {self.task_id}: 취소 플래그 확인 실패: {e}")
+            return False
+        if cancelled:
+            self._cancelled = True
+        return cancelled
+
+    def raise_if_cancelled(self):
+        if self.is_cancelled():
+            raise TaskCancelled("작업이 취소되었습니다.")
+
+    @contextmanager
+    def kill_children_on_cancel(self, match):
+        """블록 실행 중 취소되면 명령줄에 match가 들어간 자식 프로세스(ffmpeg 등)를 바로 종료합니다."""
+        stop = threading.Event()
+
+        def watch():
+            while not stop.wait(self.check_interval):
+                if self.is_cancelled():
+                    kill_child_processes(match)
+                    return
+
+        watcher = threading.Thread(target=watch, name=f"cancel-watch-{self.task_id}", daemon=True)
+        watcher.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            watcher.join()
+
+
+def kill_child_processes(match):
+    """이 프로세스의 자식 중 명령줄에 match(작업 폴더 경로 등)가 들어간 프로세스를 종료하고 종료한 수를 반환합니다.
+
+    eventlet 워커는 한 프로세스에서 여러 작업을 실행하므로 자식 전체가 아니라 해당 작업의 파일을 다루는 프로세스만 찾습니다.
+    /proc이 없는 환경에서는 아무것도 하지 않습니다.
+    """
+    if not os.path.isdir('/proc'):
+        return 0
+    parent_pid = os.getpid()
+    match_bytes = match.encode('utf-8')
+    killed = 0
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'rb') as stat_file:
+                stat = stat_file.read()
+            if int(stat[stat.rindex(b')') + 2:].split()[1]) != parent_pid: # "pid (comm) state ppid ..."
+                continue
+            with open(f"/proc/{entry}/cmdline", 'rb') as cmdline_file:
+                cmdline = cmdline_file.read()
+        except (OSError, ValueError, IndexError):
+            continue
+        if match_bytes not in cmdline:
+            continue
+        try:
+            os.kill(int(entry), signal.SIGKILL)
+            killed += 1
+        except ProcessLookupError:
+            pass
+    if killed:
+        logger.info(f"취소된 작업의 자식 프로세스 {killed}개 종료 ({match})")
+    return killed
+
+
+def remove_partial_files(task_specific_temp_dir, keep_filenames):
+    """취소된 작업 폴더에서 완료된 파일(keep_filenames)을 제외한 부분 다운로드/변환 중 파일을 삭제하고 삭제한 수를 반환합니다."""
+    removed = 0
+    try:
+        filenames = os.listdir(task_specific_temp_dir)
+    except FileNotFoundError:
+        return 0
+    for filename in filenames:
+        if filename in keep_filenames:
+            continue
+        path = os.path.join(task_specific_temp_dir, filename)
+        try:
+            if os.path.isfile(path):
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            logger.warning(f"부분 파일 삭제 실패 ({path}): {e}")
+    return removed
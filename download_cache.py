@@ -0,0 +1,252 @@
+import os
+import copy
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import logging
+from contextlib import contextmanager
+
+import metrics
+from redis_store import get_redis, KEY_PREFIX
+from session_pool import ydl_pool
+
+logger = logging.getLogger(__name__)
+
+# 작업 폴더와 같은 볼륨(파일 시스템)에 있어야 하드링크로 복사 없이 가져올 수 있음
+DOWNLOAD_CACHE_DIR = os.environ.get('DOWNLOAD_CACHE_DIR', os.path.join('task_temp_downloads', '.download_cache'))
+DOWNLOAD_CACHE_MAX_BYTES = int(os.environ.get('DOWNLOAD_CACHE_MAX_BYTES', str(20 * 1024 ** 3))) # 0이면 캐시 사용 안 함
+DOWNLOAD_CACHE_LOCK_TIMEOUT_SECONDS = int(os.environ.get('DOWNLOAD_CACHE_LOCK_TIMEOUT_SECONDS', '1800')) # 동일 항목 다운로드 대기 최대 시간
+
+_INDEX_FILENAME = 'index.sqlite3'
+_OBJECTS_DIRNAME = 'objects'
+
+
+def is_enabled():
+    return DOWNLOAD_CACHE_MAX_BYTES > 0
+
+
+def build_cache_key(info_dict, ydl_opts, audio_only=False, cover_art=False):
+    """(영상 ID, 실제 선택되는 포맷, 음성 전용 여부, 후처리 옵션)으로 캐시 키를 만듭니다.
+
+    포맷 선택자 문자열이 달라도 같은 포맷이 선택되면 같은 키가 되도록, info dict로 포맷 선택만 수행해
+    실제 format_id를 사용합니다 (다운로드/네트워크 없음). 포맷을 결정할 수 없으면 None을 반환합니다.
+    """
+    if not is_enabled() or not info_dict or not info_dict.get('id'):
+        return None
+    resolve_opts = {'quiet': True, 'no_warnings': True, 'noplaylist': True, 'simulate': True,
+                    'format': ydl_opts.get('format'), 'merge_output_format': ydl_opts.get('merge_output_format')}
+    try:
+        with ydl_pool.acquire(resolve_opts) as ydl:
+            resolved = ydl.process_ie_result(copy.deepcopy(info_dict), download=False)
+    except Exception as e:
+        logger.info(f"다운로드 캐시 키 생성 실패 ({info_dict.get('id')}): {e}")
+        return None
+    if not resolved or not resolved.get('format_id'):
+        return None
+    key_material = {
+        'extractor': info_dict.get('extractor_key') or info_dict.get('extractor'),
+        'id': info_dict['id'],
+        'format_id': resolved['format_id'],
+        'merge_output_format': ydl_opts.get('merge_output_format'),
+        'audio_only': bool(audio_only),
+        'postprocessors': ydl_opts.get('postprocessors') or [],
+        'cover_art': bool(cover_art),
+    }
+    return hashlib.sha256(json.dumps(key_material, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def materialize(source_path, dest_path):
+    """캐시 파일을 작업 폴더에 하드링크로 만듭니다 (다른 파일 시스템 등으로 실패하면 복사)."""
+    if os.path.lexists(dest_path):
+        os.remove(dest_path)
+    try:
+        os.link(source_path, dest_path)
+        return 'link'
+    except OSError:
+        shutil.copyfile(source_path, dest_path)
+        return 'copy'
+
+
+class DownloadCache:
+    """다운로드 완료 파일의 내용 주소(content-addressed) 캐시.
+
+    파일은 objects/<키 앞 2자리>/<키><확장자>에 저장되고, 크기/마지막 사용 시각은 SQLite 인덱스에 기록되어
+    재시작 후에도 유지됩니다. 총 크기가 max_bytes를 넘으면 가장 오래 사용되지 않은 항목부터 삭제합니다.
+    같은 키를 동시에 요청하면 Redis SET NX 잠금으로 하나만 다운로드하고 나머지는 그 결과를 기다립니다.
+    캐시 파일은 작업 폴더에 하드링크되므로, 캐시에 넣은 뒤에는 파일 내용을 수정하면 안 됩니다.
+    """
+
+    def __init__(self, cache_dir=DOWNLOAD_CACHE_DIR, max_bytes=DOWNLOAD_CACHE_MAX_BYTES, redis_client=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._redis = redis_client
+        self._initialized = False
+
+    @property
+    def redis(self):
+        return self._redis or get_redis()
+
+    # --- 인덱스 ---
+    @contextmanager
+    def _connect(self):
+        """인덱스 연결을 열고, 블록이 끝나면 커밋(예외 시 롤백) 후 닫습니다."""
+        if not self._initialized:
+            os.makedirs(os.path.join(self.cache_dir, _OBJECTS_DIRNAME), exist_ok=True)
+        conn = sqlite3.connect(os.path.join(self.cache_dir, _INDEX_FILENAME), timeout=30)
+        try:
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode=WAL") # 여러 워커 프로세스의 동시 읽기/쓰기
+                conn.execute("CREATE TABLE IF NOT EXISTS entries (cache_key TEXT PRIMARY KEY, relpath TEXT NOT NULL, "
+                             "size INTEGER NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+                conn.commit()
+                self._initialized = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, cache_key):
+        """캐시된 파일 경로를 반환하고 마지막 사용 시각을 갱신합니다 (없으면 None)."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT relpath FROM entries WHERE cache_key = ?", (cache_key,)).fetchone()
+            if row is None:
+                return None
+            path = os.path.join(self.cache_dir, row[0])
+            if not os.path.exists(path):
+                # 인덱스와 파일이 어긋난 경우 (수동 삭제 등): 항목 제거 후 미스로 처리
+                conn.execute("DELETE FROM entries WHERE cache_key = ?", (cache_key,))
+                return None
+            conn.execute("UPDATE entries SET last_access = ? WHERE cache_key = ?", (time.time(), cache_key))
+            return path
+
+    def store(self, cache_key, source_path):
+        """작업 폴더의 완료 파일을 캐시에 넣습니다 (하드링크 우선). 필요하면 LRU 삭제를 수행합니다."""
+        ext = os.path.splitext(source_path)[1]
+        relpath = os.path.join(_OBJECTS_DIRNAME, cache_key[:2], f"{cache_key}{ext}")
+        dest_path = os.path.join(self.cache_dir, relpath)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        tmp_path = f"{dest_path}.tmp{os.getpid()}"
+        materialize(source_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+        size = os.path.getsize(dest_path)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO entries (cache_key, relpath, size, created_at, last_access) "
+                         "VALUES (?, ?, ?, ?, ?)", (cache_key, relpath, size, now, now))
+        self.evict()
+        return dest_path
+
+    def usage(self):
+        with self._connect() as conn:
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {'entries': count, 'bytes': total, 'max_bytes': self.max_bytes}
+
+    def evict(self, max_bytes=None):
+        """총 크기가 max_bytes(기본: 설정값) 이하가 될 때까지 가장 오래 사용되지 않은 항목을 삭제합니다.
+
+        디스크 부족 시 작업 폴더 정리(StorageJanitor)가 설정값보다 낮은 목표로 호출합니다.
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        evicted = 0
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= max_bytes:
+                return 0
+            for cache_key, relpath, size in conn.execute(
+                    "SELECT cache_key, relpath, size FROM entries ORDER BY last_access").fetchall():
+                if total <= max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, relpath)) # 작업 폴더의 하드링크는 그대로 남음
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"다운로드 캐시 파일 삭제 실패 ({relpath}): {e}")
+                    continue
+                conn.execute("DELETE FROM entries WHERE cache_key = ?", (cache_key,))
+                total -= size
+                evicted += 1
+        if evicted:
+            metrics.inc('download_cache_evictions_total', evicted)
+            logger.info(f"다운로드 캐시 LRU 정리: {evicted}개 삭제, 현재 {total} bytes")
+        return evicted
+
+    # --- 동일 키 다운로드 병합 ---
+    def claim(self, cache_key, on_wait=None, owner=None):
+        """캐시 키에 대한 다운로드 권한을 얻습니다. 반환된 claim의 cached_path가 있으면 캐시 적중입니다.
+
+        다른 작업이 같은 키를 다운로드 중이면 (on_wait 호출 후) 그 결과가 캐시에 들어오거나
+        잠금이 풀릴 때까지 기다립니다. claim은 사용 후 반드시 release()해야 합니다.
+        owner(작업 ID/항목)가 같은 잠금은 이전 실행이 비정상 종료로 남긴 것이므로 기다리지 않고 이어받습니다.
+        """
+        if not cache_key:
+            return DownloadCacheClaim(self, None)
+        cached_path = self.lookup(cache_key)
+        if cached_path:
+            metrics.inc('download_cache_requests_total', result='hit')
+            return DownloadCacheClaim(self, cache_key, cached_path=cached_path)
+
+        lock_key = f"{KEY_PREFIX}dlcache:{cache_key}:lock"
+        lock_value = owner.encode('utf-8') if owner else b"1"
+        waited = False
+        deadline = time.monotonic() + DOWNLOAD_CACHE_LOCK_TIMEOUT_SECONDS
+        while True:
+            try:
+                lock_acquired = bool(self.redis.set(lock_key, lock_value, nx=True, ex=DOWNLOAD_CACHE_LOCK_TIMEOUT_SECONDS))
+                if not lock_acquired and owner and self.redis.get(lock_key) == lock_value:
+                    lock_acquired = True # 같은 작업의 이전 실행이 남긴 잠금
+            except Exception as e:
+                logger.warning(f"다운로드 캐시 잠금 실패, 직접 다운로드 ({cache_key}): {e}")
+                lock_acquired = None
+            if lock_acquired is not False or time.monotonic() >= deadline:
+                break
+            if not waited:
+                waited = True
+                if on_wait: on_wait()
+            time.sleep(1)
+            cached_path = self.lookup(cache_key)
+            if cached_path:
+                metrics.inc('download_cache_requests_total', result='coalesced')
+                return DownloadCacheClaim(self, cache_key, cached_path=cached_path)
+
+        # 잠금을 얻는 사이에 다른 작업이 저장했을 수 있음
+        cached_path = self.lookup(cache_key)
+        if cached_path:
+            metrics.inc('download_cache_requests_total', result='coalesced' if waited else 'hit')
+            claim = DownloadCacheClaim(self, cache_key, cached_path=cached_path, lock_key=lock_key if lock_acquired else None)
+            claim.release()
+            return claim
+        metrics.inc('download_cache_requests_total', result='miss')
+        return DownloadCacheClaim(self, cache_key, lock_key=lock_key if lock_acquired else None)
+
+
+class DownloadCacheClaim:
+    """DownloadCache.claim()의 결과. 미스인 경우 다운로드 후 store()로 결과를 캐시에 넣습니다."""
+
+    def __init__(self, cache, cache_key, cached_path=None, lock_key=None):
+        self.cache = cache
+        self.cache_key = cache_key
+        self.cached_path = cached_path
+        self.lock_key = lock_key
+
+    def store(self, filepath):
+        if not self.cache_key or self.cached_path:
+            return None
+        try:
+            return self.cache.store(self.cache_key, filepath)
+        except Exception as e:
+            logger.warning(f"다운로드 캐시 저장 실패 ({self.cache_key}): {e}")
+            return None
+
+    def release(self):
+        if self.lock_key:
+            try: self.cache.redis.delete(self.lock_key)
+            except Exception: pass
+            self.lock_key = None
+
+
+download_cache = DownloadCache() # 프로세스 공용 인스턴스
@@ -0,0 +1,197 @@
+import os
+import time
+import zipfile
+import mimetypes
+import unicodedata
+from urllib.parse import quote
+import logging
+
+from flask import request, Response
+from werkzeug.http import http_date, parse_etags, parse_date, quote_etag
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# 파일 전송 방식
+# - direct: 앱이 직접 전송 (gunicorn의 wsgi.file_wrapper가 있으면 sendfile로 커널에서 바로 전송)
+# - x-accel-redirect: nginx 등 앞단 프록시가 X-Accel-Redirect 경로의 파일을 전송
+# - x-sendfile: Apache(mod_xsendfile)/lighttpd 등이 X-Sendfile의 절대 경로 파일을 전송
+FILE_SERVE_MODE = os.environ.get('FILE_SERVE_MODE', 'direct').lower()
+FILE_SERVE_ACCEL_PREFIX = os.environ.get('FILE_SERVE_ACCEL_PREFIX', '/_protected_task_files/') # nginx internal location 경로
+FILE_SERVE_BLOCK_SIZE = 1024 * 1024 # sendfile을 쓸 수 없을 때 한 번에 읽는 크기
+
+
+def file_etag(stat_result):
+    """파일 inode/크기/수정 시각으로 만든 강한 ETag (내용이 바뀌면 값이 바뀜)."""
+    return f"{stat_result.st_ino:x}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"
+
+
+def content_disposition(filename):
+    """한글 등 비ASCII 파일명도 브라우저가 올바르게 저장하도록 filename*(RFC 5987)을 함께 지정합니다."""
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        ascii_fallback = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii') or 'download'
+        return f"attachment; filename=\"{ascii_fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+def _iter_file_range(file_obj, length):
+    try:
+        remaining = length
+        while remaining > 0:
+            chunk = file_obj.read(min(FILE_SERVE_BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file_obj.close()
+
+
+def _is_not_modified(etag, last_modified):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return parse_etags(if_none_match).contains_weak(etag) # If-None-Match는 약한 비교
+    if_modified_since = parse_date(request.headers.get('If-Modified-Since'))
+    return bool(if_modified_since and int(last_modified) <= int(if_modified_since.timestamp()))
+
+
+def _if_range_matches(etag, last_modified):
+    """If-Range가 없거나 현재 파일과 일치하면 True (일치하지 않으면 Range를 무시하고 전체 전송)."""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == quote_etag(etag) # If-Range는 강한 비교
+    if_range_date = parse_date(if_range)
+    return bool(if_range_date and int(last_modified) == int(if_range_date.timestamp()))
+
+
+def send_file_with_ranges(filepath, download_name=None, accel_path=None):
+    """파일을 Range/ETag/조건부 요청을 지원하며 전송하는 응답을 만듭니다.
+
+    - If-None-Match/If-Modified-Since가 일치하면 304
+    - 단일 Range 요청은 206 (If-Range 불일치 시 전체 200, 범위 밖이면 416). 여러 범위 요청은 전체 전송
+    - FILE_SERVE_MODE가 프록시 모드면 본문 없이 X-Accel-Redirect/X-Sendfile 헤더만 반환 (Range는 프록시가 처리)
+    - direct 모드에서는 파일 위치를 시작 오프셋으로 옮기고 Content-Length를 지정해 wsgi.file_wrapper로 넘기므로
+      gunicorn이 sendfile로 해당 범위만 전송합니다 (Python에서 바이트를 읽지 않음)
+    accel_path는 X-Accel-Redirect에 쓸 FILE_SERVE_ACCEL_PREFIX 이후의 상대 경로입니다.
+    """
+    stat_result = os.stat(filepath)
+    file_size = stat_result.st_size
+    etag = file_etag(stat_result)
+    last_modified = stat_result.st_mtime
+    download_name = download_name or os.path.basename(filepath)
+    mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+
+    headers = {
+        'ETag': quote_etag(etag),
+        'Last-Modified': http_date(last_modified),
+        'Accept-Ranges': 'bytes',
+        'Content-Disposition': content_disposition(download_name),
+        'Cache-Control': 'private, no-cache', # 매번 ETag로 재검증
+    }
+
+    if _is_not_modified(etag, last_modified):
+        metrics.inc('file_serve_requests_total', mode=FILE_SERVE_MODE, status='304')
+        return Response(status=304, headers=headers)
+
+    if FILE_SERVE_MODE in ('x-accel-redirect', 'x-sendfile'):
+        if FILE_SERVE_MODE == 'x-accel-redirect':
+            headers['X-Accel-Redirect'] = FILE_SERVE_ACCEL_PREFIX.rstrip('/') + '/' + quote(accel_path or download_name)
+        else:
+            headers['X-Sendfile'] = os.path.abspath(filepath)
+        metrics.inc('file_serve_requests_total', mode=FILE_SERVE_MODE, status='offloaded')
+        return Response(status=200, headers=headers, mimetype=mimetype)
+
+    start, length, status = 0, file_size, 200
+    requested_range = request.range if request.headers.get('Range') else None
+    if requested_range is not None and len(requested_range.ranges) == 1 and _if_range_matches(etag, last_modified):
+        byte_range = requested_range.range_for_length(file_size)
+        if byte_range is None:
+            headers['Content-Range'] = f"bytes */{file_size}"
+            metrics.inc('file_serve_requests_total', mode=FILE_SERVE_MODE, status='416')
+            return Response(status=416, headers=headers)
+        start, stop = byte_range
+        length, status = stop - start, 206
+        headers['Content-Range'] = f"bytes {start}-{stop - 1}/{file_size}"
+    headers['Content-Length'] = str(length)
+
+    file_obj = open(filepath, 'rb')
+    if start:
+        file_obj.seek(start)
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if file_wrapper is not None:
+        # gunicorn은 현재 파일 위치와 Content-Length만큼 sendfile로 전송
+        body = file_wrapper(file_obj, FILE_SERVE_BLOCK_SIZE)
+    else:
+        body = _iter_file_range(file_obj, length) # 개발 서버 등: Content-Length만큼만 읽어서 전송
+    response = Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
+    response.call_on_close(file_obj.close)
+    metrics.inc('file_serve_requests_total', mode=FILE_SERVE_MODE, status=str(status))
+    return response
+
+
+class _ZipOutputBuffer:
+    """zipfile이 쓰는 바이트를 잠시 모았다가 꺼내 가는 쓰기 전용(탐색 불가) 스트림."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries):
+    """(압축 파일 내 이름, 파일 경로) 목록을 무압축(STORED) ZIP으로 만들어 조각 단위로 yield합니다.
+
+    탐색 불가 스트림에 쓰므로 zipfile이 각 항목 뒤에 data descriptor를 붙이며, 디스크에 임시 아카이브를
+    만들거나 전체를 메모리에 올리지 않습니다 (메모리 사용량은 FILE_SERVE_BLOCK_SIZE 수준으로 일정).
+    4GiB를 넘는 파일은 크기를 미리 지정해 ZIP64로 기록됩니다. 읽는 도중 사라진 파일은 건너뜁니다.
+    """
+    output = _ZipOutputBuffer()
+    used_names = set()
+    with zipfile.ZipFile(output, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, filepath in entries:
+            try:
+                source = open(filepath, 'rb')
+            except FileNotFoundError:
+                logger.warning(f"ZIP 생성 중 파일 없음, 건너뜀: {filepath}")
+                continue
+            with source:
+                stat_result = os.fstat(source.fileno())
+                base_name, ext = os.path.splitext(arcname)
+                suffix = 1
+                while arcname in used_names: # 같은 이름은 '이름 (2).ext' 형태로 구분
+                    suffix += 1
+                    arcname = f"{base_name} ({suffix}){ext}"
+                used_names.add(arcname)
+                zip_info = zipfile.ZipInfo(arcname, date_time=time.localtime(max(stat_result.st_mtime, 315532800))[:6]) # ZIP은 1980년 이후만 표현
+                zip_info.compress_type = zipfile.ZIP_STORED
+                zip_info.file_size = stat_result.st_size
+                with archive.open(zip_info, mode='w') as dest:
+                    while True:
+                        chunk = source.read(FILE_SERVE_BLOCK_SIZE)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        yield output.drain()
+            pending = output.drain() # data descriptor
+            if pending: yield pending
+    yield output.drain() # 중앙 디렉터리 (ZipFile을 닫을 때 기록됨)
@@ -0,0 +1,14 @@
+# gunicorn 설정 (작업 디렉토리의 gunicorn.conf.py를 gunicorn이 자동으로 읽음, 명령줄 옵션이 이 값보다 우선)
+import os
+
+# 마스터가 app을 한 번 import한 뒤 워커를 fork: import한 모듈/템플릿 등을 워커들이 copy-on-write로 공유해
+# 워커당 메모리와 시작 시간이 줄어듦. 코드 변경은 마스터 재시작이 필요하므로(HUP으로 워커만 재시작 시 미반영) 선택 사항
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+
+
+def when_ready(server):
+    """워커를 fork하기 직전(마스터): preload한 객체를 GC 대상에서 제외해 워커의 GC가 공유 페이지를 복사하지 않도록 합니다."""
+    if server.cfg.preload_app:
+        import startup
+        startup.freeze_for_fork()
+        startup.log_startup_profile('web-master')
@@ -0,0 +1,268 @@
+import os
+import re
+import json
+import time
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+import logging
+
+import metrics
+from redis_store import get_redis, KEY_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# 영상 정보에는 만료되는 스트림 URL이 포함되므로 (보통 6시간) TTL은 그보다 충분히 짧게 유지
+INFO_CACHE_TTL_SECONDS = int(os.environ.get('INFO_CACHE_TTL_SECONDS', '1800'))
+INFO_CACHE_PLAYLIST_TTL_SECONDS = int(os.environ.get('INFO_CACHE_PLAYLIST_TTL_SECONDS', '600'))
+INFO_CACHE_LOCAL_MAX_ENTRIES = int(os.environ.get('INFO_CACHE_LOCAL_MAX_ENTRIES', '256'))
+INFO_CACHE_LOCK_TIMEOUT_SECONDS = int(os.environ.get('INFO_CACHE_LOCK_TIMEOUT_SECONDS', '60'))
+
+# 추출 종류별 yt-dlp 옵션: 'flat'은 플레이리스트 항목 목록, 'single'은 단일 영상 전체 정보
+EXTRACT_OPTIONS = {
+    'flat': {'quiet': True, 'no_warnings': True, 'skip_download': True, 'extract_flat': 'in_playlist', 'noplaylist': False},
+    'single': {'quiet': True, 'no_warnings': True, 'skip_download': True, 'noplaylist': True},
+}
+EXTRACT_TTLS = {'flat': INFO_CACHE_PLAYLIST_TTL_SECONDS, 'single': INFO_CACHE_TTL_SECONDS}
+
+# 다운로드/UI에 쓰이지 않으면서 크기가 큰 키는 캐시에 저장하지 않음
+_DROPPED_INFO_KEYS = ('automatic_captions', 'subtitles', 'heatmap')
+
+_YOUTUBE_ID_RE = re.compile(r'^[0-9A-Za-z_-]{11}$')
+_YOUTUBE_HOSTS = ('youtube.com', 'music.youtube.com', 'youtube-nocookie.com') # www./m. 은 떼고 비교
+_YOUTUBE_PATH_ID_RE = re.compile(r'^/(?:shorts|embed|live|v)/([0-9A-Za-z_-]{11})')
+
+
+def _parse_url_host(url):
+    """(urlparse 결과, www./m. 을 뗀 소문자 호스트). scheme이 없으면 https로 간주합니다."""
+    try:
+        parsed = urlparse(url if '://' in url else f"https://{url}")
+        host = (parsed.hostname or '').lower()
+    except ValueError:
+        return None, ''
+    if host.startswith('www.') or host.startswith('m.'):
+        host = host.split('.', 1)[1]
+    return parsed, host
+
+
+def youtube_video_id(url):
+    """YouTube 영상 URL(watch?v=, youtu.be/, shorts/, embed/ 등) 또는 영상 ID에서 11자리 영상 ID를 찾습니다. 없으면 None."""
+    url = (url or '').strip()
+    if _YOUTUBE_ID_RE.match(url):
+        return url
+    parsed, host = _parse_url_host(url)
+    video_id = None
+    if host in _YOUTUBE_HOSTS:
+        video_id = (parse_qs(parsed.query).get('v') or [None])[0]
+        if not video_id:
+            path_match = _YOUTUBE_PATH_ID_RE.match(parsed.path)
+            video_id = path_match.group(1) if path_match else None
+    elif host == 'youtu.be':
+        video_id = parsed.path.lstrip('/').split('/')[0]
+    return video_id if video_id and _YOUTUBE_ID_RE.match(video_id) else None
+
+
+def normalize_media_key(url, kind='single'):
+    """URL을 캐시 키로 정규화합니다. 예: 'video:<영상 ID>', 'playlist:<목록 ID>'.
+
+    같은 영상/목록을 가리키는 여러 형태의 URL(watch?v=, youtu.be/, shorts/ 등)이 같은 키를 갖도록 하며,
+    알 수 없는 형식은 URL 해시를 사용합니다. 'single'은 noplaylist 추출이므로 list= 파라미터를 무시합니다.
+    """
+    url = (url or '').strip()
+    if kind == 'flat' and not _YOUTUBE_ID_RE.match(url):
+        parsed, host = _parse_url_host(url)
+        if host in _YOUTUBE_HOSTS or host == 'youtu.be':
+            playlist_id = (parse_qs(parsed.query).get('list') or [None])[0]
+            if playlist_id:
+                return f"playlist:{playlist_id}"
+    video_id = youtube_video_id(url)
+    if video_id:
+        return f"video:{video_id}"
+    return f"url:{hashlib.sha1(url.encode('utf-8')).hexdigest()}"
+
+
+class InfoCache:
+    """extract_info 결과 캐시: 프로세스 내 LRU(TTL) + Redis 공유 캐시 + 동일 키 요청 병합(single-flight).
+
+    같은 키에 대한 동시 요청은 프로세스 안에서는 키별 잠금으로, 프로세스 간에는 Redis SET NX 잠금으로
+    하나만 실제 추출을 수행하고 나머지는 그 결과를 기다려 재사용합니다.
+    """
+
+    def __init__(self, local_max_entries=INFO_CACHE_LOCAL_MAX_ENTRIES, redis_client=None):
+        self.local_max_entries = local_max_entries
+        self._redis = redis_client
+        self._local = OrderedDict() # cache_key -> (expires_at, info)
+        self._local_lock = threading.Lock()
+        self._key_locks = {} # cache_key -> [threading.Lock, 참조 수]
+        self._key_locks_guard = threading.Lock()
+
+    @property
+    def redis(self):
+        return self._redis or get_redis()
+
+    def _cache_key(self, url, kind):
+        return f"{KEY_PREFIX}info:{kind}:{normalize_media_key(url, kind)}"
+
+    # --- 프로세스 내 LRU ---
+    def _local_get(self, cache_key):
+        with self._local_lock:
+            entry = self._local.get(cache_key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._local[cache_key]
+                return None
+            self._local.move_to_end(cache_key)
+            return entry[1]
+
+    def _local_put(self, cache_key, info, ttl):
+        with self._local_lock:
+            self._local[cache_key] = (time.monotonic() + ttl, info)
+            self._local.move_to_end(cache_key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    # --- Redis 공유 캐시 ---
+    def _redis_get(self, cache_key):
+        try:
+            raw, ttl = self.redis.pipeline(transaction=False).get(cache_key).ttl(cache_key).execute()
+        except Exception as e:
+            logger.warning(f"정보 캐시 Redis 조회 실패 ({cache_key}): {e}")
+            return None, None
+        if raw is None:
+            return None, None
+        try:
+            return json.loads(zlib.decompress(raw)), ttl
+        except Exception as e:
+            logger.warning(f"정보 캐시 항목 손상, 무시 ({cache_key}): {e}")
+            return None, None
+
+    def _redis_put(self, cache_key, info, ttl):
+        try:
+            payload = zlib.compress(json.dumps(info, ensure_ascii=False).encode('utf-8'))
+            self.redis.set(cache_key, payload, ex=ttl)
+        except Exception as e:
+            logger.warning(f"정보 캐시 Redis 저장 실패 ({cache_key}): {e}")
+
+    def _acquire_key_lock(self, cache_key):
+        with self._key_locks_guard:
+            entry = self._key_locks.setdefault(cache_key, [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+        return entry
+
+    def _release_key_lock(self, cache_key, entry):
+        entry[0].release()
+        with self._key_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._key_locks.pop(cache_key, None)
+
+    def peek(self, url, kind):
+        """캐시에 있는 정보만 반환합니다 (없으면 None, 추출하지 않음)."""
+        cache_key = self._cache_key(url, kind)
+        info = self._local_get(cache_key)
+        if info is None:
+            info, remaining_ttl = self._redis_get(cache_key)
+            if info is not None and remaining_ttl and remaining_ttl > 0:
+                self._local_put(cache_key, info, remaining_ttl)
+        return info
+
+    def put(self, url, kind, info, ttl=None):
+        """이미 추출한 정보를 캐시에 저장합니다 (다른 종류의 추출 결과 재사용 등)."""
+        ttl = ttl or EXTRACT_TTLS.get(kind, INFO_CACHE_TTL_SECONDS)
+        info = _strip_info(info)
+        cache_key = self._cache_key(url, kind)
+        self._local_put(cache_key, info, ttl)
+        self._redis_put(cache_key, info, ttl)
+
+    def get_or_extract(self, url, kind, extractor, ttl=None):
+        """캐시된 정보를 반환하거나, 없으면 extractor(url)로 한 번만 추출해 저장 후 반환합니다.
+
+        반환된 dict는 다른 요청과 공유되므로, 수정이 필요하면 호출 측에서 복사해서 사용해야 합니다.
+        """
+        ttl = ttl or EXTRACT_TTLS.get(kind, INFO_CACHE_TTL_SECONDS)
+        cache_key = self._cache_key(url, kind)
+
+        info = self._local_get(cache_key)
+        if info is not None:
+            metrics.inc('info_cache_requests_total', kind=kind, result='local_hit')
+            return info
+
+        key_lock = self._acquire_key_lock(cache_key)
+        try:
+            # 잠금을 기다리는 동안 같은 프로세스의 다른 요청이 채웠을 수 있음
+            info = self._local_get(cache_key)
+            if info is not None:
+                metrics.inc('info_cache_requests_total', kind=kind, result='coalesced')
+                return info
+
+            info, remaining_ttl = self._redis_get(cache_key)
+            if info is not None:
+                metrics.inc('info_cache_requests_total', kind=kind, result='redis_hit')
+                self._local_put(cache_key, info, remaining_ttl if remaining_ttl and remaining_ttl > 0 else ttl)
+                return info
+
+            info = self._extract_single_flight(cache_key, url, kind, extractor, ttl)
+            self._local_put(cache_key, info, ttl)
+            return info
+        finally:
+            self._release_key_lock(cache_key, key_lock)
+
+    def _extract_single_flight(self, cache_key, url, kind, extractor, ttl):
+        lock_key = f"{cache_key}:lock"
+        try:
+            lock_acquired = bool(self.redis.set(lock_key, b"1", nx=True, ex=INFO_CACHE_LOCK_TIMEOUT_SECONDS))
+        except Exception as e:
+            logger.warning(f"정보 캐시 잠금 실패, 직접 추출 ({cache_key}): {e}")
+            lock_acquired = None
+
+        if lock_acquired is False:
+            # 다른 프로세스가 추출 중: 결과가 저장되거나 잠금이 풀릴 때까지 대기
+            deadline = time.monotonic() + INFO_CACHE_LOCK_TIMEOUT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(0.2)
+                info, _ = self._redis_get(cache_key)
+                if info is not None:
+                    metrics.inc('info_cache_requests_total', kind=kind, result='coalesced')
+                    return info
+                try:
+                    if not self.redis.exists(lock_key):
+                        break # 추출 실패 등으로 잠금 해제됨 -> 직접 추출
+                except Exception:
+                    break
+
+        metrics.inc('info_cache_requests_total', kind=kind, result='miss')
+        try:
+            info = _strip_info(extractor(url))
+            self._redis_put(cache_key, info, ttl)
+            return info
+        finally:
+            if lock_acquired:
+                try: self.redis.delete(lock_key)
+                except Exception: pass
+
+
+def _strip_info(info):
+    if isinstance(info, dict) and any(k in info for k in _DROPPED_INFO_KEYS):
+        info = {k: v for k, v in info.items() if k not in _DROPPED_INFO_KEYS}
+    return info
+
+
+def _extract_with_options(kind):
+    def extractor(url):
+        from session_pool import ydl_pool # 추출은 워커에서만 실행 (웹 계층은 캐시 조회만 하므로 yt_dlp를 로드하지 않음)
+        with ydl_pool.acquire(EXTRACT_OPTIONS[kind]) as ydl:
+            # 캐시(JSON) 저장 및 process_ie_result 재사용이 가능하도록 정리된 형태로 변환
+            return ydl.sanitize_info(ydl.extract_info(url, download=False))
+    return extractor
+
+
+info_cache = InfoCache() # 프로세스 공용 인스턴스 (웹/워커 모두 사용)
+
+
+def extract_info_cached(url, kind='single'):
+    """kind('flat' 또는 'single') 옵션으로 extract_info(download=False) 결과를 캐시를 거쳐 반환합니다."""
+    return info_cache.get_or_extract(url, kind, _extract_with_options(kind))
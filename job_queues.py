@@ -0,0 +1,154 @@
+import os
+import time
+import logging
+
+from redis_store import get_redis, KEY_PREFIX
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE_QUEUE = os.environ.get('INTERACTIVE_QUEUE', 'interactive') # 영상 1개 등 금방 끝나는 다운로드 작업 큐
+BULK_QUEUE = os.environ.get('BULK_QUEUE', 'bulk') # 큰 플레이리스트 등 오래 걸리는 다운로드 작업 큐
+BULK_COST_THRESHOLD = float(os.environ.get('BULK_COST_THRESHOLD', '12')) # 예상 비용이 이 값 이상이면 bulk 큐 (음성 1개=1, 1080p 영상 1개=4)
+CLIENT_MAX_RUNNING_SLOTS = int(os.environ.get('CLIENT_MAX_RUNNING_SLOTS', '2')) # 클라이언트(IP) 하나가 동시에 차지할 수 있는 워커 슬롯 수 (0: 제한 없음)
+CLIENT_SLOT_RETRY_SECONDS = int(os.environ.get('CLIENT_SLOT_RETRY_SECONDS', '15')) # 슬롯을 얻지 못한 작업을 큐에 다시 넣기 전 대기 시간
+CLIENT_SLOT_MAX_RETRIES = int(os.environ.get('CLIENT_SLOT_MAX_RETRIES', '240')) # 슬롯 대기 재시도 최대 횟수 (넘으면 슬롯 없이 실행)
+CLIENT_SLOT_STALE_SECONDS = 6 * 60 * 60 # 워커 비정상 종료로 해제되지 않은 슬롯은 이 시간이 지나면 무시
+QUEUE_WAIT_SAMPLES = 200 # 큐별로 보관하는 최근 대기 시간 수 (평균/p95 계산용)
+JOB_QUEUES = (INTERACTIVE_QUEUE, BULK_QUEUE)
+
+_KOMBU_PRIORITY_SEPARATOR = '\x06\x16' # kombu Redis transport가 우선순위별 큐 리스트 이름에 붙이는 구분자
+
+
+def _client_slots_key(client_id):
+    return f"{KEY_PREFIX}slots:client:{client_id or 'unknown'}" # ZSET: 작업 ID -> 슬롯을 얻은 시각
+
+
+def _queue_running_key(queue_name):
+    return f"{KEY_PREFIX}queue:{queue_name}:running" # ZSET: 실행 중인 작업 ID -> 시작 시각
+
+
+def _queue_stats_key(queue_name):
+    return f"{KEY_PREFIX}queue:{queue_name}:stats" # HASH: 시작한 작업 수, 누적 대기 시간
+
+
+def _queue_waits_key(queue_name):
+    return f"{KEY_PREFIX}queue:{queue_name}:waits" # LIST: 최근 대기 시간(초)
+
+
+# --- 작업 비용 추정/큐 선택 ---
+def format_height(info, format_id):
+    """info dict의 포맷 목록에서 format_id('137+140' 등 병합 포함)의 영상 높이를 찾습니다. 없으면 None."""
+    if not isinstance(info, dict) or not format_id:
+        return None
+    requested_ids = set(str(format_id).split('/')[0].split('+'))
+    heights = [f.get('height') for f in info.get('formats') or [] if str(f.get('format_id')) in requested_ids and f.get('height')]
+    return max(heights) if heights else None
+
+
+def item_cost(audio_only, height=None):
+    """항목 하나의 상대 비용 (대략적인 다운로드 크기/후처리 시간 비율)."""
+    if audio_only:
+        return 1
+    if not height:
+        return 3 # 해상도를 모르는 영상
+    if height <= 480:
+        return 2
+    if height <= 1080:
+        return 4
+    return 8
+
+
+def estimate_job_cost(item_count, audio_only, height=None):
+    return max(1, item_count) * item_cost(audio_only, height)
+
+
+def choose_queue(job_cost):
+    return BULK_QUEUE if job_cost >= BULK_COST_THRESHOLD else INTERACTIVE_QUEUE
+
+
+# --- 클라이언트별 워커 슬롯 ---
+def acquire_client_slot(client_id, task_id):
+    """클라이언트의 실행 중 작업이 CLIENT_MAX_RUNNING_SLOTS 미만이면 슬롯을 잡고 True를 반환합니다.
+
+    같은 작업 ID가 이미 잡은 슬롯(재전달/재시도, 같은 job의 다른 하위 작업)은 그대로 유지됩니다.
+    클라이언트 정보가 없거나 제한이 없으면 항상 True.
+    """
+    if not client_id or CLIENT_MAX_RUNNING_SLOTS <= 0:
+        return True
+    now = time.time()
+    client_key = _client_slots_key(client_id)
+    redis_client = get_redis()
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zremrangebyscore(client_key, '-inf', now - CLIENT_SLOT_STALE_SECONDS)
+    pipe.zadd(client_key, {str(task_id): now}, nx=True)
+    pipe.expire(client_key, CLIENT_SLOT_STALE_SECONDS)
+    pipe.zrank(client_key, str(task_id))
+    rank = pipe.execute()[-1]
+    if rank is not None and rank < CLIENT_MAX_RUNNING_SLOTS:
+        return True
+    redis_client.zrem(client_key, str(task_id)) # 먼저 슬롯을 잡은 작업들이 끝날 때까지 양보
+    return False
+
+
+def release_client_slot(client_id, task_id):
+    if not client_id or CLIENT_MAX_RUNNING_SLOTS <= 0:
+        return
+    try:
+        get_redis().zrem(_client_slots_key(client_id), str(task_id))
+    except Exception as e:
+        logger.warning(f"클라이언트 슬롯 해제 실패 ({client_id}, {task_id}): {e}")
+
+
+# --- 큐별 대기 시간/깊이 ---
+def record_job_started(queue_name, task_id, enqueued_at=None):
+    """작업이 워커에서 시작될 때 호출: 큐에서 기다린 시간과 실행 중 작업을 기록합니다."""
+    now = time.time()
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zadd(_queue_running_key(queue_name), {str(task_id): now})
+    pipe.zremrangebyscore(_queue_running_key(queue_name), '-inf', now - CLIENT_SLOT_STALE_SECONDS)
+    pipe.hincrby(_queue_stats_key(queue_name), 'started_total', 1)
+    if enqueued_at:
+        wait_seconds = max(0.0, now - float(enqueued_at))
+        pipe.hincrbyfloat(_queue_stats_key(queue_name), 'wait_seconds_total', wait_seconds)
+        pipe.lpush(_queue_waits_key(queue_name), f"{wait_seconds:.3f}")
+        pipe.ltrim(_queue_waits_key(queue_name), 0, QUEUE_WAIT_SAMPLES - 1)
+    pipe.execute()
+
+
+def record_job_finished(queue_name, task_id):
+    get_redis().zrem(_queue_running_key(queue_name), str(task_id))
+
+
+def queue_depth(redis_client, queue_name):
+    """브로커(Redis)의 큐 리스트에 대기 중인 메시지 수 (우선순위별 리스트 포함)."""
+    pipe = redis_client.pipeline(transaction=False)
+    for list_name in [queue_name] + [f"{queue_name}{_KOMBU_PRIORITY_SEPARATOR}{priority}" for priority in (3, 6, 9)]:
+        pipe.llen(list_name)
+    return sum(pipe.execute())
+
+
+def queue_stats():
+    """큐(작업 등급)별 대기 중/실행 중 작업 수와 최근 대기 시간. 두 워커 풀의 크기를 정하는 데 사용합니다."""
+    redis_client = get_redis()
+    stats = {}
+    for queue_name in JOB_QUEUES:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zremrangebyscore(_queue_running_key(queue_name), '-inf', time.time() - CLIENT_SLOT_STALE_SECONDS)
+        pipe.zcard(_queue_running_key(queue_name))
+        pipe.hgetall(_queue_stats_key(queue_name))
+        pipe.lrange(_queue_waits_key(queue_name), 0, -1)
+        _, running, totals, recent_waits = pipe.execute()
+        recent_waits = sorted(float(wait) for wait in recent_waits)
+        started_total = int(totals.get(b'started_total', 0))
+        stats[queue_name] = {
+            'depth': queue_depth(redis_client, queue_name),
+            'running': running,
+            'started_total': started_total,
+            'wait_seconds': {
+                'avg_total': round(float(totals.get(b'wait_seconds_total', 0)) / started_total, 3) if started_total else None,
+                'avg_recent': round(sum(recent_waits) / len(recent_waits), 3) if recent_waits else None,
+                'p95_recent': recent_waits[min(len(recent_waits) - 1, int(len(recent_waits) * 0.95))] if recent_waits else None,
+                'samples': len(recent_waits),
+            },
+        }
+    return stats
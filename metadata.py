@@ -0,0 +1,184 @@
+import os
+import time
+import logging
+
+from redis_store import get_redis, KEY_PREFIX
+from info_cache import info_cache, extract_info_cached
+
+logger = logging.getLogger(__name__)
+
+# 정보 가져오기(/fetch_info)를 웹 워커 밖의 전용 Celery 큐에서 처리하기 위한 설정
+METADATA_QUEUE = os.environ.get('METADATA_QUEUE', 'metadata') # 정보 추출 전용 큐 (다운로드 작업 뒤에 밀리지 않도록 분리)
+METADATA_TASK_SOFT_TIME_LIMIT_SECONDS = int(os.environ.get('METADATA_TASK_SOFT_TIME_LIMIT_SECONDS', '60')) # 추출 1건의 최대 시간
+METADATA_MAX_PENDING = int(os.environ.get('METADATA_MAX_PENDING', '32')) # 대기+실행 중인 추출 작업 최대 수 (초과 시 503)
+METADATA_MAX_PENDING_PER_CLIENT = int(os.environ.get('METADATA_MAX_PENDING_PER_CLIENT', '4')) # 클라이언트 하나가 동시에 요청할 수 있는 추출 수
+FETCH_INFO_WAIT_SECONDS = float(os.environ.get('FETCH_INFO_WAIT_SECONDS', '10')) # 요청 안에서 결과를 기다리는 최대 시간 (이후 job_id로 조회)
+FETCH_INFO_POLL_INTERVAL_SECONDS = 0.1
+PLAYLIST_PAGE_SIZE = int(os.environ.get('PLAYLIST_PAGE_SIZE', '100')) # /fetch_info 응답과 항목 페이지 조회의 기본 항목 수
+PLAYLIST_PAGE_MAX_SIZE = 500 # /playlist_entries에서 한 번에 요청할 수 있는 최대 항목 수
+
+DEFAULT_VIDEO_FORMATS_PREF = ["616", "22", "18"] # 사용자가 선호하는 비디오 포맷 ID (선호도 순)
+DEFAULT_AUDIO_FORMATS_PREF = ["140", "251", "250", "249", "139"] # 선호하는 오디오 포맷 ID
+
+_PENDING_KEY = f"{KEY_PREFIX}metadata:pending" # ZSET: 추출 작업 ID -> 요청 시각
+
+
+def _client_pending_key(client_id):
+    return f"{KEY_PREFIX}metadata:pending:client:{client_id}"
+
+
+def get_best_format_id(formats_list, preferred_ids, is_video=False):
+    """주어진 포맷 리스트에서 가장 적합한 포맷 ID를 반환합니다."""
+    if not formats_list: return None
+    for pref_id in preferred_ids:
+        for f_dict in formats_list: # formats_list는 이제 dict의 리스트
+            if f_dict.get('format_id') == pref_id:
+                return pref_id
+    # 선호하는 ID가 없는 경우, (이미 정렬된) 목록의 첫 번째 항목을 기본값으로 사용
+    if formats_list:
+        return formats_list[0].get('format_id')
+    return None
+
+
+def format_playlist_entry(idx, entry):
+    return {"id": entry.get("id"),
+            "url": entry.get("url") or f"https://www.youtube.com/watch?v={entry.get('id')}",
+            "title": entry.get("title", f"항목 {idx+1}")}
+
+
+def playlist_entries_page(playlist_info_dict, offset, limit):
+    """flat 추출 결과의 entries 중 [offset, offset+limit) 구간을 UI 항목 형태로 반환합니다.
+
+    offset/total은 원본 entries 기준이며 None인 항목은 건너뜁니다 (페이지의 항목 수가 limit보다 적을 수 있음).
+    """
+    raw_entries = playlist_info_dict.get('entries') or []
+    offset = max(0, offset)
+    end = min(offset + max(1, limit), len(raw_entries))
+    return {
+        "entries": [format_playlist_entry(idx, raw_entries[idx]) for idx in range(offset, end) if raw_entries[idx]],
+        "offset": offset, "total": len(raw_entries),
+        "next_offset": end if end < len(raw_entries) else None,
+    }
+
+
+def build_video_info(url):
+    """URL의 영상/플레이리스트 정보를 UI에 표시할 형태(제목, 썸네일, 포맷 목록, 플레이리스트 항목)로 만듭니다.
+
+    추출은 앱/워커 공유 정보 캐시를 거치며, 실패하면 yt-dlp 예외가 그대로 전달됩니다.
+    """
+    # 플레이리스트 정보 우선 가져오기 (항목 목록 등, 플레이리스트 허용) - 앱/워커 공유 캐시 경유
+    playlist_info_dict = extract_info_cached(url, 'flat')
+
+    processed_info = {
+        "title": playlist_info_dict.get("title", "제목 없음"),
+        "thumbnail_url": playlist_info_dict.get("thumbnail"), # 플레이리스트 썸네일 또는 첫 항목 썸네일
+        "original_url": url, # Celery 작업에 전달할 원본 URL
+        "video_formats": [], "audio_formats": [],
+        "default_video_format_id": None, "default_audio_format_id": None,
+        "playlist_entries": [], # 첫 페이지만 포함 (나머지는 /playlist_entries로 조회)
+        "playlist_total": 0, "playlist_next_offset": None,
+    }
+
+    # 포맷 정보는 첫 번째 유효한 항목에서 가져옴
+    first_entry_for_formats_url = None
+    if 'entries' in playlist_info_dict and playlist_info_dict['entries']:
+        # 플레이리스트 항목 처리 (큰 플레이리스트도 응답 크기가 일정하도록 첫 페이지만 포함)
+        first_page = playlist_entries_page(playlist_info_dict, 0, PLAYLIST_PAGE_SIZE)
+        processed_info["playlist_entries"] = first_page["entries"]
+        processed_info["playlist_total"] = first_page["total"]
+        processed_info["playlist_next_offset"] = first_page["next_offset"]
+        first_valid_entry = next((entry for entry in playlist_info_dict['entries'] if entry), None)
+        if first_valid_entry: # 유효한 항목이 있다면 첫 번째 항목 URL 사용
+            first_entry_for_formats_url = format_playlist_entry(0, first_valid_entry)['url']
+    else: # 단일 영상인 경우
+        first_entry_for_formats_url = url # 원본 URL 사용
+
+    formats_info_dict_for_ui = None # UI 포맷 표시에 사용할 정보
+    is_single_video = not ('entries' in playlist_info_dict and playlist_info_dict['entries'])
+    if is_single_video and playlist_info_dict.get('formats'):
+        # 단일 영상이면 첫 추출 결과가 이미 전체 정보이므로 재추출하지 않고, 워커가 재사용하도록 'single'로도 캐시
+        formats_info_dict_for_ui = playlist_info_dict
+        info_cache.put(url, 'single', playlist_info_dict)
+    elif first_entry_for_formats_url:
+        formats_info_dict_for_ui = extract_info_cached(first_entry_for_formats_url, 'single')
+    if formats_info_dict_for_ui and is_single_video:
+        # 단일 영상의 경우, 가져온 정보로 썸네일 업데이트 (플레이리스트 썸네일보다 우선)
+        processed_info["thumbnail_url"] = formats_info_dict_for_ui.get("thumbnail", processed_info["thumbnail_url"])
+
+    if formats_info_dict_for_ui and 'formats' in formats_info_dict_for_ui:
+        all_formats = formats_info_dict_for_ui.get("formats", [])
+
+        # 비디오 포맷 정렬 (None 값 처리, mp4 선호)
+        video_formats_raw = [f for f in all_formats if f.get('vcodec') != 'none' and f.get('acodec') == 'none'] # 영상만
+        if not video_formats_raw : # 영상+음성도 포함 (영상만 없을 시)
+            video_formats_raw = [f for f in all_formats if f.get('vcodec') != 'none']
+
+        video_formats_raw.sort(key=lambda x: (
+            x.get('height') if x.get('height') is not None else -1, 
+            x.get('fps') if x.get('fps') is not None else -1,
+            x.get('tbr') if x.get('tbr') is not None else -1,
+            1 if x.get('ext') == 'mp4' else (2 if x.get('ext') == 'webm' else 3) # mp4, webm 순으로 선호
+        ), reverse=True)
+        processed_info["video_formats"] = [
+            {"format_id": f.get("format_id"), "format_note": f.get("format_note"), 
+             "ext": f.get("ext"), 
+             "filesize_approx": f.get("filesize_approx") or f.get("filesize"), 
+             "resolution": f.get("resolution") or (f"{f.get('width')}x{f.get('height')}" if f.get('width') and f.get('height') else "N/A")} 
+            for f in video_formats_raw
+        ]
+
+        # 오디오 포맷 정렬 (None 값 처리, m4a/opus 선호)
+        audio_formats_raw = [f for f in all_formats if f.get('acodec') != 'none' and f.get('vcodec') == 'none'] # 음성만
+        audio_formats_raw.sort(key=lambda x: (
+            x.get('abr') if x.get('abr') is not None else -1, # Audio Bitrate
+            1 if x.get('ext') == 'm4a' else (2 if x.get('ext') == 'opus' else (3 if x.get('ext') == 'webm' else 4))
+        ), reverse=True)
+        processed_info["audio_formats"] = [
+            {"format_id": f.get("format_id"), 
+             "format_note": f.get("format_note") or (f"{f.get('abr')}k" if f.get('abr') else "N/A"), 
+             "ext": f.get("ext"), 
+             "filesize_approx": f.get("filesize_approx") or f.get("filesize"), 
+             "abr": f.get('abr')} 
+            for f in audio_formats_raw
+        ]
+
+        processed_info["default_video_format_id"] = get_best_format_id(processed_info["video_formats"], DEFAULT_VIDEO_FORMATS_PREF, is_video=True)
+        processed_info["default_audio_format_id"] = get_best_format_id(processed_info["audio_formats"], DEFAULT_AUDIO_FORMATS_PREF)
+    return processed_info
+
+
+# --- 추출 작업 수 제한 ---
+def admit_metadata_job(job_id, client_id):
+    """추출 작업을 받을 수 있으면 대기 목록에 등록하고 None, 가득 찼으면 재시도까지 권장 대기 시간(초)을 반환합니다.
+
+    전체 한도와 클라이언트별 한도를 함께 적용해 한 클라이언트가 큐를 독점하지 못하게 합니다.
+    워커 비정상 종료 등으로 남은 항목은 시간 제한이 지나면 자동으로 제외됩니다.
+    """
+    now = time.time()
+    stale_before = now - METADATA_TASK_SOFT_TIME_LIMIT_SECONDS * 2
+    client_key = _client_pending_key(client_id)
+    redis_client = get_redis()
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zremrangebyscore(_PENDING_KEY, '-inf', stale_before)
+    pipe.zremrangebyscore(client_key, '-inf', stale_before)
+    pipe.zcard(_PENDING_KEY)
+    pipe.zcard(client_key)
+    _, _, pending_total, pending_for_client = pipe.execute()
+    if pending_total >= METADATA_MAX_PENDING or pending_for_client >= METADATA_MAX_PENDING_PER_CLIENT:
+        return max(1, int(FETCH_INFO_WAIT_SECONDS))
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zadd(_PENDING_KEY, {job_id: now})
+    pipe.zadd(client_key, {job_id: now})
+    pipe.expire(client_key, METADATA_TASK_SOFT_TIME_LIMIT_SECONDS * 2)
+    pipe.execute()
+    return None
+
+
+def release_metadata_job(job_id, client_id):
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.zrem(_PENDING_KEY, job_id)
+        pipe.zrem(_client_pending_key(client_id), job_id)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"추출 작업 대기 목록 정리 실패 ({job_id}): {e}")
@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import atexit
+import shutil
+import tempfile
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# 프로세스 내 간단한 메트릭 레지스트리 (웹/워커 각 프로세스별로 독립적으로 집계됨)
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = {} # (이름, 라벨) -> [버킷별 누적 개수 리스트, 합계, 개수]
+_histogram_buckets = {} # 이름 -> 버킷 상한 튜플 (처음 기록할 때 정해짐)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600) # 초
+BYTES_BUCKETS = tuple(1024 * 1024 * size for size in (1, 4, 16, 64, 256, 1024, 4096)) # 바이트
+THROUGHPUT_BUCKETS = tuple(1024 * rate for rate in (64, 256, 1024, 4096, 16384, 65536)) # 초당 바이트
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# prefork 풀: 작업은 자식 프로세스에서 실행되므로 자식이 자기 메트릭을 이 폴더의 <pid>.json에 기록하고,
+# 본 프로세스의 exporter가 수집 요청 시 합산합니다 (enable_child_export / start_child_export)
+_child_export_dir = None
+_child_export_path = None
+
+
+def _metric_key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+def inc(name, amount=1, **labels):
+    """카운터를 amount 만큼 증가시킵니다."""
+    key = _metric_key(name, labels)
+    with _lock:
+        _counters[key] += amount
+
+
+def get(name, **labels):
+    """현재 카운터 값을 반환합니다 (없으면 0)."""
+    with _lock:
+        return _counters.get(_metric_key(name, labels), 0)
+
+
+def observe(name, value, buckets=DURATION_BUCKETS, **labels):
+    """히스토그램에 값을 기록합니다 (Prometheus histogram과 같은 누적 버킷)."""
+    key = _metric_key(name, labels)
+    with _lock:
+        bucket_bounds = _histogram_buckets.setdefault(name, tuple(buckets))
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(bucket_bounds), 0.0, 0]
+        for n, bound in enumerate(bucket_bounds):
+            if value <= bound:
+                histogram[0][n] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+@contextmanager
+def timer(name, **labels):
+    """블록 실행 시간(초)을 히스토그램 name에 기록합니다. 예외가 나도 기록합니다."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def snapshot():
+    """모든 카운터를 {"이름{라벨}": 값} 형태의 dict로 반환합니다."""
+    with _lock:
+        items = list(_counters.items())
+    result = {}
+    for (name, labels), value in items:
+        label_str = ",".join(f'{k}="{v}"' for k, v in labels)
+        result[f"{name}{{{label_str}}}" if label_str else name] = value
+    return result
+
+
+def _registry_state():
+    """레지스트리 복사본: (카운터 dict, 히스토그램 dict, 버킷 dict)."""
+    with _lock:
+        return (dict(_counters), {key: [list(h[0]), h[1], h[2]] for key, h in _histograms.items()},
+                dict(_histogram_buckets))
+
+
+def _merge_state(state, data):
+    """자식 프로세스가 기록한 메트릭(data)을 state(_registry_state 형식)에 더합니다."""
+    counters, histograms, histogram_buckets = state
+    for name, labels, value in data.get('counters', []):
+        key = (name, tuple(tuple(pair) for pair in labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, bounds, bucket_counts, total, count in data.get('histograms', []):
+        bounds = tuple(bounds)
+        if histogram_buckets.setdefault(name, bounds) != bounds:
+            continue # 버킷이 다른 기록은 합산할 수 없음
+        key = (name, tuple(tuple(pair) for pair in labels))
+        histogram = histograms.setdefault(key, [[0] * len(bounds), 0.0, 0])
+        histogram[0] = [a + b for a, b in zip(histogram[0], bucket_counts)]
+        histogram[1] += total
+        histogram[2] += count
+
+
+def _serialize_registry():
+    counters, histograms, histogram_buckets = _registry_state()
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, histogram_buckets[name], h[0], h[1], h[2]] for (name, labels), h in histograms.items()],
+    }
+
+
+def enable_child_export():
+    """(워커 본 프로세스, fork 전) 자식 프로세스 메트릭을 모을 임시 폴더를 만듭니다. 이후 render_prometheus가 함께 합산합니다."""
+    global _child_export_dir
+    if _child_export_dir:
+        return
+    _child_export_dir = tempfile.mkdtemp(prefix='youtubedl-metrics-')
+    owner_pid = os.getpid()
+
+    def _cleanup():
+        if os.getpid() == owner_pid: # fork된 자식이 종료될 때는 지우지 않음
+            shutil.rmtree(_child_export_dir, ignore_errors=True)
+    atexit.register(_cleanup)
+
+
+def start_child_export():
+    """(prefork 자식, fork 직후) 부모에게서 물려받은 값을 비우고 이 프로세스의 기록 파일을 정합니다."""
+    global _child_export_path
+    if not _child_export_dir:
+        return
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+    _child_export_path = os.path.join(_child_export_dir, f"{os.getpid()}.json")
+
+
+def write_child_export():
+    """(prefork 자식) 현재 메트릭을 기록 파일에 씁니다 (작업이 끝날 때마다 호출)."""
+    if not _child_export_path:
+        return
+    tmp_path = f"{_child_export_path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(_serialize_registry(), f)
+        os.replace(tmp_path, _child_export_path)
+    except OSError as e:
+        logger.warning(f"메트릭 기록 실패 ({_child_export_path}): {e}")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _collect_child_exports(state):
+    """자식 프로세스 기록을 state에 합산합니다. 종료된 자식의 기록은 이 프로세스 레지스트리에 흡수하고 파일을 지웁니다
+    (pid가 재사용되어 덮어써지거나 카운터가 줄어들지 않도록)."""
+    try:
+        filenames = [name for name in os.listdir(_child_export_dir) if name.endswith('.json')]
+    except OSError:
+        return
+    for filename in filenames:
+        path = os.path.join(_child_export_dir, filename)
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        pid = int(filename[:-len('.json')]) if filename[:-len('.json')].isdigit() else None
+        if pid is not None and not _pid_alive(pid):
+            with _lock:
+                _merge_state((_counters, _histograms, _histogram_buckets), data)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        _merge_state(state, data)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def render_prometheus():
+    """모든 카운터/히스토그램을 Prometheus 텍스트 형식으로 반환합니다 (/metrics 응답, prefork 자식 기록 포함)."""
+    state = _registry_state()
+    if _child_export_dir:
+        _collect_child_exports(state)
+    counters = sorted(state[0].items())
+    histograms = sorted((key, tuple(h)) for key, h in state[1].items())
+    histogram_buckets = state[2]
+    lines = []
+    declared = set()
+    for (name, labels), value in counters:
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), (bucket_counts, total, count) in histograms:
+        if name not in declared:
+            declared.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        for bound, bucket_count in zip(histogram_buckets[name], bucket_counts):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', f'{bound:g}')])} {bucket_count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:g}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args): # 스크레이프마다 접근 로그를 남기지 않음
+        pass
+
+
+def start_http_exporter(port, host='0.0.0.0'):
+    """Flask 앱이 없는 프로세스(Celery 워커)에서 /metrics를 제공하는 HTTP 서버를 백그라운드 스레드로 시작합니다."""
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    logger.info(f"메트릭 exporter 시작: http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from datetime import datetime
+import logging
+
+import metrics
+from redis_store import get_redis, task_logs_key, task_files_key, task_items_key, TASK_DATA_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 결과 백엔드(Redis)에 진행 상태를 기록하는 최소 간격 (밀리초)
+PROGRESS_FLUSH_INTERVAL_MS = int(os.environ.get('PROGRESS_FLUSH_INTERVAL_MS', '1000'))
+MAX_META_LOGS = 50 # 최종 결과 등에 포함되는 최근 로그 수
+PROGRESS_SNAPSHOT_TTL_MS = int(os.environ.get('PROGRESS_SNAPSHOT_TTL_MS', '250')) # 웹 프로세스가 같은 작업의 /progress 응답을 재사용하는 시간 (0: 사용 안 함)
+
+
+class TaskProgressPublisher:
+    """작업 하나의 진행 상태/로그를 워커 메모리에 보관하고, 백엔드에는 일정 간격으로만 기록합니다.
+
+    yt-dlp progress hook은 초당 여러 번 호출되므로, 매 호출마다 Redis에서 meta를 읽고 다시 쓰는 대신
+    메모리의 상태만 갱신하고 flush_interval 마다 한 번 update_state를 호출합니다.
+    항목 완료, 오류, 앨범 아트 완료 같은 상태 전환은 force=True로 즉시 기록합니다.
+
+    로그와 완료 파일 목록은 meta에 매번 전체를 다시 쓰지 않고, flush 시 새 항목만
+    작업별 Redis 리스트(append-only)에 RPUSH합니다. meta에는 각 리스트의 길이(log_count, file_count)만 기록되어
+    /progress가 커서 이후의 항목만 읽을 수 있습니다.
+    """
+
+    def __init__(self, task_instance, flush_interval_ms=None, redis_client=None, task_id=None):
+        self.task = task_instance
+        self.task_id = task_id or task_instance.request.id # 상태/로그를 기록할 작업 ID (병렬 하위 작업은 job ID)
+        if flush_interval_ms is None:
+            flush_interval_ms = PROGRESS_FLUSH_INTERVAL_MS
+        self.flush_interval = max(flush_interval_ms, 0) / 1000.0
+        self.redis = redis_client or get_redis()
+        self.logs_key = task_logs_key(self.task_id)
+        self.files_key = task_files_key(self.task_id)
+
+        self.status = ""
+        self.progress = 0
+        self.newly_completed_file = None
+        self.completed_files = [] # 현재까지 완료된 모든 파일 (최종 결과용)
+        self.extra = {} # meta에 그대로 실릴 추가 키 (예: current_item_index_being_processed)
+        self.log_count = 0 # Redis 로그 리스트에 기록된 항목 수
+        self.file_count = 0 # Redis 파일 리스트에 기록된 항목 수
+
+        self.hook_calls = 0
+        self.updates = 0
+        self.backend_writes = 0
+
+        self._recent_logs = deque(maxlen=MAX_META_LOGS)
+        self._pending_logs = [] # 아직 Redis 리스트에 기록되지 않은 로그
+        self._pending_files = [] # 아직 Redis 리스트에 기록되지 않은 완료 파일
+        self._dirty = False
+        self._last_flush_ts = 0.0
+        self._lock = threading.Lock()
+
+    def _append_log(self, message, prefix):
+        log_entry = f"[{datetime.now().strftime('%H:%M:%S')}] {prefix}{message}"
+        if self._recent_logs and self._recent_logs[-1] == log_entry:
+            return
+        self._recent_logs.append(log_entry)
+        self._pending_logs.append(log_entry)
+
+    def update(self, status_message, progress_percent, new_log_message=None, current_item_info_prefix="",
+               newly_completed_file_info=None, force=False, transient=False, hook=False, **extra):
+        """메모리 상태를 갱신하고, 필요 시(강제 또는 간격 경과) 백엔드에 기록합니다.
+
+        transient=True인 메시지(다운로드 진행률 등)는 status에만 반영하고 로그 리스트에는 남기지 않습니다.
+        """
+        with self._lock:
+            self.updates += 1
+            metrics.inc('progress_updates_total')
+            if hook:
+                self.hook_calls += 1
+                metrics.inc('progress_hook_calls_total')
+
+            self.status = f"{current_item_info_prefix}{status_message}" if current_item_info_prefix else status_message
+            self.progress = progress_percent
+            if new_log_message and not transient:
+                self._append_log(new_log_message, current_item_info_prefix)
+            if newly_completed_file_info:
+                self.completed_files.append(newly_completed_file_info)
+                self._pending_files.append(newly_completed_file_info)
+                force = True
+            self.newly_completed_file = newly_completed_file_info
+            self.extra.update(extra)
+            self._dirty = True
+
+            if force or (time.monotonic() - self._last_flush_ts) >= self.flush_interval:
+                self._flush_locked()
+
+    def add_log(self, message, current_item_info_prefix="", force=False):
+        """상태/진행률 변경 없이 로그만 추가합니다."""
+        with self._lock:
+            self._append_log(message, current_item_info_prefix)
+            self._dirty = True
+            if force:
+                self._flush_locked()
+
+    def flush(self):
+        """변경된 상태가 있다면 즉시 백엔드에 기록합니다."""
+        with self._lock:
+            if self._dirty:
+                self._flush_locked()
+
+    def flush_lists(self):
+        """meta는 건드리지 않고 대기 중인 로그/파일만 Redis 리스트에 기록합니다 (최종 결과 저장 직전 등)."""
+        with self._lock:
+            self._push_pending_lists()
+
+    def recover_existing_lists(self):
+        """같은 작업 ID로 다시 실행될 때(워커 재시작 후 재전달 등) 이전 실행이 남긴 로그/완료 파일 리스트를 이어받습니다.
+
+        리스트의 실제 길이를 log_count/file_count로 사용해 클라이언트 커서가 이어지도록 합니다.
+        반환값: 이전 실행이 기록한 완료 파일 수
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.llen(self.logs_key)
+        pipe.llen(self.files_key)
+        log_count, file_count = pipe.execute()
+        with self._lock:
+            self.log_count = log_count
+            self.file_count = file_count
+        return file_count
+
+    def restore_missing_files(self, file_infos):
+        """체크포인트에는 있지만 완료 파일 리스트에는 없는 파일을 리스트에 추가합니다 (이미 있는 파일은 건너뜀).
+
+        항목 완료 시 체크포인트를 먼저 기록하므로, 리스트에 기록하기 전에 워커가 종료된 항목을 다시 실행할 때 채웁니다.
+        반환값: 추가한 파일 수
+        """
+        listed_names = {json.loads(raw).get('name') for raw in self.redis.lrange(self.files_key, 0, -1)}
+        missing = [file_info for file_info in file_infos if file_info.get('name') not in listed_names]
+        if missing:
+            with self._lock:
+                self._pending_files.extend(missing)
+                self._push_pending_lists()
+        return len(missing)
+
+    def _build_meta(self):
+        meta = {
+            'status': self.status,
+            'progress': round(min(self.progress, 99.99), 2), # 100%는 최종 완료 시에만
+            'newly_completed_file': self.newly_completed_file,
+            'log_count': self.log_count,
+            'file_count': self.file_count,
+        }
+        meta.update(self.extra)
+        return meta
+
+    def _queue_pending_lists(self, pipe):
+        """대기 중인 로그/파일의 RPUSH 명령을 파이프라인에 추가합니다 (대기 목록은 실행 후 _clear_pending_lists로 비움)."""
+        if self._pending_logs:
+            pipe.rpush(self.logs_key, *self._pending_logs)
+            pipe.expire(self.logs_key, TASK_DATA_TTL_SECONDS)
+        if self._pending_files:
+            pipe.rpush(self.files_key, *[json.dumps(f, ensure_ascii=False) for f in self._pending_files])
+            pipe.expire(self.files_key, TASK_DATA_TTL_SECONDS)
+
+    def _clear_pending_lists(self):
+        self._pending_logs = []
+        self._pending_files = []
+
+    def _push_pending_lists(self):
+        if not self._pending_logs and not self._pending_files:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        self._queue_pending_lists(pipe)
+        pipe.execute()
+        self.log_count += len(self._pending_logs)
+        self.file_count += len(self._pending_files)
+        self._clear_pending_lists()
+
+    def _flush_locked(self):
+        # 리스트를 먼저 기록해야 update_state의 PUBLISH를 받은 구독자가 새 항목을 읽을 수 있음
+        with metrics.timer('progress_backend_write_seconds'):
+            self._push_pending_lists()
+            self.task.update_state(task_id=self.task_id, state='PROGRESS', meta=self._build_meta())
+        self.backend_writes += 1
+        metrics.inc('progress_backend_writes_total')
+        self._last_flush_ts = time.monotonic()
+        self._dirty = False
+
+    def recent_logs(self):
+        with self._lock:
+            return list(self._recent_logs)
+
+    def stats(self):
+        """hook 호출 수 대비 실제 백엔드 기록 횟수."""
+        return {'hook_calls': self.hook_calls, 'updates': self.updates, 'backend_writes': self.backend_writes}
+
+
+class JobItemProgressPublisher(TaskProgressPublisher):
+    """병렬 작업(job)의 항목 하나를 처리하는 하위 작업용 publisher.
+
+    로그/완료 파일은 job의 리스트에 함께 쌓고, meta는 job ID로 기록합니다.
+    update()의 progress_percent는 이 항목의 진행률(0~100)이며, flush 시 job의 항목별 진행률 해시에
+    기록한 뒤 전체 항목의 평균을 job 진행률로 사용합니다. log_count/file_count도 리스트의 실제 길이를 사용합니다.
+    """
+
+    def __init__(self, task_instance, job_id, item_index, total_items, flush_interval_ms=None, redis_client=None):
+        super().__init__(task_instance, flush_interval_ms, redis_client, task_id=job_id)
+        self.item_index = item_index
+        self.total_items = max(total_items, 1)
+        self.items_key = task_items_key(job_id)
+        self.job_progress = 0
+
+    def _push_pending_lists(self):
+        # 대기 중인 로그/파일이 없어도 항목 진행률은 기록하고, 다른 하위 작업이 추가한 항목까지 포함한 리스트 길이를 읽음
+        pipe = self.redis.pipeline(transaction=False)
+        self._queue_pending_lists(pipe)
+        pipe.hset(self.items_key, self.item_index, round(min(self.progress, 100), 2))
+        pipe.expire(self.items_key, TASK_DATA_TTL_SECONDS)
+        pipe.hvals(self.items_key)
+        pipe.llen(self.logs_key)
+        pipe.llen(self.files_key)
+        item_progresses, self.log_count, self.file_count = pipe.execute()[-3:]
+        self._clear_pending_lists()
+        self.job_progress = sum(float(value) for value in item_progresses) / self.total_items
+
+    def _build_meta(self):
+        meta = super()._build_meta()
+        meta['progress'] = round(min(self.job_progress, 99.99), 2)
+        meta['current_item_progress'] = round(min(self.progress, 100), 2)
+        return meta
+
+
+def _queue_progress_entries(pipe, task_id, log_cursor, file_cursor, default_log_tail):
+    """read_progress_entries()의 리스트 조회 명령 4개를 파이프라인에 추가합니다."""
+    logs_key, files_key = task_logs_key(task_id), task_files_key(task_id)
+    log_start = max(log_cursor, 0) if log_cursor is not None else -default_log_tail
+    file_start = max(file_cursor, 0) if file_cursor is not None else 0
+    pipe.llen(logs_key)
+    pipe.lrange(logs_key, log_start, -1)
+    pipe.llen(files_key)
+    pipe.lrange(files_key, file_start, -1)
+
+
+def _parse_progress_entries(task_id, log_total, raw_logs, file_total, raw_files):
+    new_logs = [entry.decode('utf-8') if isinstance(entry, bytes) else entry for entry in raw_logs]
+    new_files = []
+    for raw_file in raw_files:
+        try: new_files.append(json.loads(raw_file))
+        except (TypeError, ValueError): logger.warning(f"Task {task_id}: 잘못된 완료 파일 항목 무시: {raw_file!r}")
+    return new_logs, log_total, new_files, file_total
+
+
+def read_progress_entries(redis_client, task_id, log_cursor=None, file_cursor=None, default_log_tail=MAX_META_LOGS):
+    """작업의 로그/완료 파일 리스트에서 커서 이후 항목만 한 번의 파이프라인으로 읽습니다.
+
+    커서가 None이면 로그는 최근 default_log_tail개, 파일은 전체를 반환합니다.
+    반환값: (new_logs, next_log_cursor, new_files, next_file_cursor)
+    """
+    pipe = redis_client.pipeline(transaction=True)
+    _queue_progress_entries(pipe, task_id, log_cursor, file_cursor, default_log_tail)
+    return _parse_progress_entries(task_id, *pipe.execute())
+
+
+def read_progress_batch(redis_client, result_backend, progress_requests, default_log_tail=MAX_META_LOGS):
+    """여러 작업의 Celery 결과 meta(MGET 한 번)와 로그/완료 파일 리스트를 파이프라인 한 번으로 읽습니다.
+
+    progress_requests: [(task_id, log_cursor, file_cursor), ...]
+    반환값: [(task_state, task_info_meta, progress_entries), ...] (요청 순서와 동일)
+    결과 키가 없는 작업은 AsyncResult와 같이 PENDING/None으로 취급합니다.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.mget([result_backend.get_key_for_task(task_id) for task_id, _, _ in progress_requests])
+    for task_id, log_cursor, file_cursor in progress_requests:
+        _queue_progress_entries(pipe, task_id, log_cursor, file_cursor, default_log_tail)
+    raw_metas, *list_results = pipe.execute()
+
+    snapshots = []
+    for n, ((task_id, _, _), raw_meta) in enumerate(zip(progress_requests, raw_metas)):
+        meta = result_backend.decode_result(raw_meta) if raw_meta else {'status': 'PENDING', 'result': None}
+        progress_entries = _parse_progress_entries(task_id, *list_results[n * 4:n * 4 + 4])
+        snapshots.append((meta['status'], meta.get('result'), progress_entries))
+    return snapshots
+
+
+class ProgressSnapshotCache:
+    """/progress 응답을 프로세스 메모리에 짧게(ttl_ms) 보관합니다.
+
+    여러 탭/대시보드가 같은 작업을 거의 동시에 조회할 때, 같은 (작업, 커서) 조회는
+    Redis 조회/결과 디코딩/파일 URL 생성 없이 보관된 응답을 그대로 반환합니다.
+    워커의 진행 상태 기록 간격(PROGRESS_FLUSH_INTERVAL_MS)보다 짧으므로 보이는 지연은 거의 없습니다.
+    """
+
+    def __init__(self, ttl_ms=250, max_entries=4096):
+        self.ttl_seconds = ttl_ms / 1000.0
+        self.max_entries = max_entries
+        self._entries = {} # (task_id, log_cursor, file_cursor) -> (만료 시각, 응답 dict)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if self.ttl_seconds <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                metrics.inc('progress_snapshot_cache_hits_total')
+                return entry[1]
+        metrics.inc('progress_snapshot_cache_misses_total')
+        return None
+
+    def put(self, key, response_data):
+        if self.ttl_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # 만료된 항목부터 정리하고, 그래도 가득 차 있으면 전부 비움 (짧은 TTL이라 곧 다시 채워짐)
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (now + self.ttl_seconds, response_data)
+
+    def stats(self):
+        hits = int(metrics.get('progress_snapshot_cache_hits_total'))
+        misses = int(metrics.get('progress_snapshot_cache_misses_total'))
+        with self._lock:
+            size = len(self._entries)
+        return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None, 'entries': size}
@@ -0,0 +1,138 @@
+import os
+import queue
+import threading
+import time
+import logging
+
+import metrics
+from redis_store import get_redis
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_STREAM_HEARTBEAT_SECONDS = int(os.environ.get('PROGRESS_STREAM_HEARTBEAT_SECONDS', '15'))
+PROGRESS_STREAM_MAX_SECONDS = int(os.environ.get('PROGRESS_STREAM_MAX_SECONDS', '600')) # 이후 클라이언트가 재연결
+
+
+class ProgressEventHub:
+    """웹 워커 프로세스당 Redis pub/sub 연결 하나로 여러 SSE 클라이언트에 진행 이벤트를 분배합니다.
+
+    브라우저 탭마다 Redis 연결을 여는 대신, 구독자가 있는 채널만 구독하고
+    수신한 메시지를 채널별 구독자 큐에 넣어줍니다. 구독/해제 요청은 수신 루프에서 일괄 처리합니다.
+    """
+
+    def __init__(self, poll_timeout=0.2):
+        self.poll_timeout = poll_timeout
+        self._subscribers = {} # channel -> set(queue.Queue)
+        self._pending_ops = queue.Queue() # ('subscribe' | 'unsubscribe', channel)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, channel):
+        """채널 구독자 큐를 생성해 반환합니다."""
+        subscriber_queue = queue.Queue(maxsize=16)
+        with self._lock:
+            subscribers = self._subscribers.setdefault(channel, set())
+            first_subscriber = not subscribers
+            subscribers.add(subscriber_queue)
+        if first_subscriber:
+            self._pending_ops.put(('subscribe', channel))
+        self._ensure_started()
+        metrics.inc('progress_stream_subscriptions_total')
+        return subscriber_queue
+
+    def unsubscribe(self, channel, subscriber_queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if not subscribers:
+                return
+            subscribers.discard(subscriber_queue)
+            if subscribers:
+                return
+            del self._subscribers[channel]
+        self._pending_ops.put(('unsubscribe', channel))
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                # gunicorn eventlet 워커에서는 monkey patch로 green thread로 동작
+                self._thread = threading.Thread(target=self._run, name="progress-event-hub", daemon=True)
+                self._thread.start()
+
+    def _apply_pending_ops(self, pubsub):
+        while True:
+            try:
+                op, channel = self._pending_ops.get_nowait()
+            except queue.Empty:
+                return
+            with self._lock:
+                has_subscribers = channel in self._subscribers
+            # 요청이 처리되기 전에 구독 상태가 다시 바뀌었을 수 있으므로 현재 상태 기준으로 반영
+            if op == 'subscribe' and has_subscribers:
+                pubsub.subscribe(channel)
+            elif op == 'unsubscribe' and not has_subscribers:
+                pubsub.unsubscribe(channel)
+
+    def _dispatch(self, channel, data):
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber_queue in subscribers:
+            try:
+                subscriber_queue.put_nowait(data)
+            except queue.Full:
+                # 느린 클라이언트: 가장 오래된 이벤트를 버리고 최신 이벤트 유지
+                try: subscriber_queue.get_nowait()
+                except queue.Empty: pass
+                try: subscriber_queue.put_nowait(data)
+                except queue.Full: pass
+        metrics.inc('progress_stream_events_received_total')
+
+    def _run(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                # (재)연결 시 현재 구독자가 있는 채널 모두 다시 구독
+                with self._lock:
+                    channels = list(self._subscribers)
+                if channels:
+                    pubsub.subscribe(*channels)
+                while True:
+                    self._apply_pending_ops(pubsub)
+                    if not pubsub.subscribed:
+                        time.sleep(self.poll_timeout)
+                        continue
+                    message = pubsub.get_message(timeout=self.poll_timeout)
+                    if message and message.get('type') == 'message':
+                        self._dispatch(message['channel'], message['data'])
+            except Exception as e:
+                logger.warning(f"진행 이벤트 허브 pub/sub 오류, 재연결 시도: {e}")
+                time.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try: pubsub.close()
+                    except Exception: pass
+
+
+def drain_latest(subscriber_queue, timeout):
+    """큐에서 이벤트를 기다린 뒤, 쌓여 있는 이벤트 중 가장 최신 것만 반환합니다 (없으면 None)."""
+    try:
+        data = subscriber_queue.get(timeout=timeout)
+    except queue.Empty:
+        return None
+    while True:
+        try:
+            data = subscriber_queue.get_nowait()
+        except queue.Empty:
+            return data
+
+
+def format_sse(data_json, event=None):
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {data_json}")
+    return "\n".join(lines) + "\n\n"
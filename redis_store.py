@@ -0,0 +1,57 @@
+import os
+import threading
+
+import redis
+
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+KEY_PREFIX = "ytdl:" # Celery 키(celery-task-meta-*)와 구분하기 위한 앱 전용 키 접두사
+TASK_DATA_TTL_SECONDS = 3600 * 24 # 작업 결과/로그/파일 목록 보관 기간 (Celery result_expires와 동일)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_redis():
+    """프로세스 공용 Redis 클라이언트를 반환합니다 (연결 풀 공유)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = redis.Redis.from_url(REDIS_URL)
+    return _client
+
+
+
+def task_logs_key(task_id):
+    """작업 로그가 순서대로 쌓이는 append-only 리스트 키."""
+    return f"{KEY_PREFIX}task:{task_id}:logs"
+
+
+def task_files_key(task_id):
+    """완료된 파일 정보(JSON)가 순서대로 쌓이는 append-only 리스트 키."""
+    return f"{KEY_PREFIX}task:{task_id}:files"
+
+
+def task_items_key(task_id):
+    """병렬 작업의 항목별 진행률(항목 인덱스 -> %) 해시 키."""
+    return f"{KEY_PREFIX}task:{task_id}:items"
+
+
+def task_remaining_key(task_id):
+    """병렬 작업에서 아직 끝나지 않은 하위 작업 수 카운터 키."""
+    return f"{KEY_PREFIX}task:{task_id}:remaining"
+
+
+def task_checkpoint_key(task_id):
+    """완료된 항목 체크포인트(항목 인덱스 -> 완료 파일 JSON) 해시 키. 작업이 다시 실행되면 이 항목들은 건너뜀."""
+    return f"{KEY_PREFIX}task:{task_id}:checkpoint"
+
+
+def task_finished_items_key(task_id):
+    """병렬 작업에서 처리가 끝난(성공/실패) 항목 인덱스 집합 키 (재전달 시 카운터 중복 감소 방지)."""
+    return f"{KEY_PREFIX}task:{task_id}:finished"
+
+
+def task_cancel_key(task_id):
+    """작업 취소 요청 플래그 키 (/cancel에서 설정하고 실행 중인 작업이 확인)."""
+    return f"{KEY_PREFIX}task:{task_id}:cancel"
@@ -0,0 +1,185 @@
+import os
+import json
+import threading
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import requests
+import yt_dlp
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+YDL_POOL_MAX_IDLE_PER_KEY = int(os.environ.get('YDL_POOL_MAX_IDLE_PER_KEY', '4')) # 옵션 조합별로 보관하는 유휴 인스턴스 수
+YDL_POOL_MAX_KEYS = int(os.environ.get('YDL_POOL_MAX_KEYS', '16')) # 보관하는 옵션 조합 수 (초과 시 오래 안 쓴 조합부터 정리)
+YDL_POOL_MAX_USES = int(os.environ.get('YDL_POOL_MAX_USES', '200')) # 인스턴스 하나를 재사용하는 최대 횟수 (이후 새로 생성)
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', '16')) # 썸네일 등 requests 세션의 호스트별 연결 수
+
+# 사용할 때마다 바뀌는 옵션: 풀 키에서 제외하고 꺼낼 때 인스턴스에 적용
+_PER_USE_OPTIONS = ('outtmpl', 'progress_hooks', 'postprocessor_hooks')
+# 재사용 전에 되돌리는 yt-dlp 내부 속성 (requirements.txt에 고정한 버전 기준).
+# 이름이 바뀐 버전이면 재사용하지 않고 사용할 때마다 새 인스턴스를 만듭니다 (supports_reuse)
+_RESET_ATTRIBUTES = {
+    '_progress_hooks': list, '_postprocessor_hooks': list, '_pps': dict, '_download_retcode': int,
+    '_num_downloads': int, '_num_videos': int, '_playlist_level': int, '_playlist_urls': set, '_printed_messages': set,
+}
+
+
+def supports_reuse(ydl):
+    """이 yt-dlp 버전의 인스턴스를 _PooledYoutubeDL.reset으로 안전하게 되돌릴 수 있는지 확인합니다."""
+    if not callable(getattr(ydl, '_parse_outtmpl', None)):
+        return False
+    return all(isinstance(getattr(ydl, name, None), expected_type) for name, expected_type in _RESET_ATTRIBUTES.items())
+
+
+def _options_key(options):
+    return json.dumps({k: v for k, v in options.items() if k not in _PER_USE_OPTIONS}, sort_keys=True, default=repr)
+
+
+class _PooledYoutubeDL:
+    def __init__(self, ydl):
+        self.ydl = ydl
+        self.uses = 0
+        # 생성 직후의 params (사용 중 바뀐 값을 다음 사용 전에 되돌리기 위함)
+        self.base_params = {k: (dict(v) if isinstance(v, dict) else v) for k, v in ydl.params.items()}
+        self.base_pps = {when: list(pps) for when, pps in ydl._pps.items()} # 사용 중 add_post_processor로 추가된 후처리기 제거용
+
+    def reset(self, outtmpl=None, progress_hooks=(), postprocessor_hooks=()):
+        """이전 사용의 상태(params, 진행 hook, 후처리기, 출력 템플릿, 다운로드 카운터 등)를 지우고 이번 사용 값을 적용합니다.
+
+        추출기 인스턴스와 HTTP 연결(RequestDirector)은 그대로 두어 재사용합니다.
+        """
+        ydl = self.ydl
+        ydl.params.clear()
+        ydl.params.update({k: (dict(v) if isinstance(v, dict) else v) for k, v in self.base_params.items()})
+        if outtmpl is not None:
+            ydl.params['outtmpl'] = outtmpl
+            ydl._parse_outtmpl()
+        ydl._progress_hooks = list(progress_hooks)
+        ydl._postprocessor_hooks = list(postprocessor_hooks) # 이후 생성되는 후처리기(병합 등)에 적용됨
+        ydl._pps = {when: list(pps) for when, pps in self.base_pps.items()}
+        ydl._download_retcode = 0
+        ydl._num_downloads = 0
+        ydl._num_videos = 0
+        ydl._playlist_level = 0
+        ydl._playlist_urls.clear()
+        ydl._printed_messages.clear()
+
+
+class YoutubeDLPool:
+    """옵션 조합별로 오래 유지되는 YoutubeDL 인스턴스를 빌려주는 프로세스 내 풀.
+
+    YoutubeDL 생성 시 매번 하는 추출기 등록/쿠키 저장소/HTTP 연결 풀 생성을 반복하지 않고,
+    CDN과의 keep-alive 연결을 유지합니다. 인스턴스는 스레드 안전하지 않으므로 한 번에 한 사용자에게만 빌려주며,
+    블록 안에서 예외가 발생한 인스턴스는 상태를 신뢰할 수 없으므로 닫고 버립니다.
+    설치된 yt-dlp가 재사용에 필요한 내부 속성을 갖고 있지 않으면(supports_reuse) 풀을 쓰지 않고 매번 새로 만듭니다.
+    """
+
+    def __init__(self, factory=yt_dlp.YoutubeDL, max_idle_per_key=YDL_POOL_MAX_IDLE_PER_KEY,
+                 max_keys=YDL_POOL_MAX_KEYS, max_uses=YDL_POOL_MAX_USES):
+        self.factory = factory
+        self.max_idle_per_key = max_idle_per_key
+        self.max_keys = max_keys
+        self.max_uses = max_uses
+        self._idle = OrderedDict() # 옵션 키 -> 유휴 인스턴스 리스트 (최근 사용한 키가 뒤쪽)
+        self._lock = threading.Lock()
+        self.reuse_enabled = None # 처음 만든 인스턴스로 확인 (None: 아직 확인 전)
+
+    @contextmanager
+    def acquire(self, options):
+        """options로 설정된 YoutubeDL을 빌려줍니다. outtmpl/progress_hooks/postprocessor_hooks는 이번 사용에만 적용됩니다."""
+        if self.reuse_enabled is False:
+            yield from self._use_unpooled(options)
+            return
+        key = _options_key(options)
+        with self._lock:
+            idle_list = self._idle.get(key)
+            pooled = idle_list.pop() if idle_list else None
+        if pooled is None:
+            ydl = self.factory({k: v for k, v in options.items() if k not in _PER_USE_OPTIONS})
+            if not self._check_reuse(ydl):
+                self._close_ydl(ydl)
+                yield from self._use_unpooled(options)
+                return
+            pooled = _PooledYoutubeDL(ydl)
+            metrics.inc('ydl_pool_requests_total', result='created')
+        else:
+            metrics.inc('ydl_pool_requests_total', result='reused')
+        pooled.reset(options.get('outtmpl'), options.get('progress_hooks') or (), options.get('postprocessor_hooks') or ())
+        try:
+            yield pooled.ydl
+        except BaseException:
+            self._close(pooled)
+            raise
+        pooled.uses += 1
+        pooled.reset() # 빌려간 쪽의 hook(클로저)이 풀에 남지 않도록
+        self._release(key, pooled)
+
+    def _check_reuse(self, ydl):
+        """처음 만든 인스턴스로 한 번만 확인합니다. 재사용할 수 없으면 이후 acquire는 매번 새 인스턴스를 만듭니다."""
+        if self.reuse_enabled is None:
+            self.reuse_enabled = supports_reuse(ydl)
+            if not self.reuse_enabled:
+                logger.warning(f"설치된 yt-dlp({yt_dlp.version.__version__})에 재사용에 필요한 내부 속성이 없어 "
+                               f"YoutubeDL 인스턴스를 풀링하지 않습니다 (requirements.txt의 고정 버전 확인)")
+        return self.reuse_enabled
+
+    def _use_unpooled(self, options):
+        metrics.inc('ydl_pool_requests_total', result='unpooled')
+        ydl = self.factory(options)
+        try:
+            yield ydl
+        finally:
+            self._close_ydl(ydl)
+
+    def _release(self, key, pooled):
+        to_close = []
+        with self._lock:
+            idle_list = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if pooled.uses >= self.max_uses or len(idle_list) >= self.max_idle_per_key:
+                to_close.append(pooled)
+            else:
+                idle_list.append(pooled)
+            while len(self._idle) > self.max_keys:
+                _, evicted = self._idle.popitem(last=False)
+                to_close.extend(evicted)
+        for stale in to_close:
+            self._close(stale)
+
+    @classmethod
+    def _close(cls, pooled):
+        cls._close_ydl(pooled.ydl)
+
+    @staticmethod
+    def _close_ydl(ydl):
+        try:
+            ydl.close()
+        except Exception as e:
+            logger.warning(f"YoutubeDL 인스턴스 정리 실패: {e}")
+
+    def clear(self):
+        with self._lock:
+            pooled_items = [pooled for idle_list in self._idle.values() for pooled in idle_list]
+            self._idle.clear()
+        for pooled in pooled_items:
+            self._close(pooled)
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._idle), 'idle': sum(len(v) for v in self._idle.values())}
+
+
+def build_http_session(pool_maxsize=HTTP_POOL_MAXSIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+ydl_pool = YoutubeDLPool() # 프로세스 공용 인스턴스
+http_session = build_http_session() # 썸네일 등 yt-dlp 밖의 HTTP 요청이 공유하는 연결 풀
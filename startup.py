@@ -0,0 +1,86 @@
+import gc
+import os
+import importlib
+import sys
+import time
+import logging
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+WORKER_PRELOAD = os.environ.get('WORKER_PRELOAD', '1') != '0' # 워커 본 프로세스에서 yt-dlp 추출기/mutagen/Pillow를 미리 로드 (prefork 자식이 공유)
+
+_preload_summary = None # 사전 로드 결과 (worker_init 시점에는 로깅 설정 전이므로 시작 완료 로그에 함께 남김)
+
+
+def process_rss_mb():
+    """현재 프로세스의 RSS(MB). /proc이 없으면 None."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def process_age_seconds():
+    """프로세스가 시작(또는 fork)된 뒤 지난 시간(초). 인터프리터 시작과 import 시간을 포함합니다. /proc이 없으면 None."""
+    try:
+        with open('/proc/self/stat', 'rb') as f:
+            stat = f.read()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        start_ticks = int(stat[stat.rindex(b')') + 2:].split()[19]) # "pid (comm) state ..." 의 22번째 필드 starttime
+        return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def log_startup_profile(component):
+    """시작 시간/RSS/로드된 모듈 수를 로그로 남기고, 시작 시간은 process_startup_seconds{component}에 기록합니다."""
+    age_seconds = process_age_seconds()
+    if age_seconds is not None:
+        metrics.observe('process_startup_seconds', age_seconds, component=component)
+    age_text = f"{age_seconds:.2f}초" if age_seconds is not None else "알 수 없음"
+    preload_text = f", {_preload_summary}" if _preload_summary else ""
+    logger.info(f"{component} 시작 완료: 프로세스 시작 후 {age_text}, RSS {process_rss_mb()} MB, 모듈 {len(sys.modules)}개{preload_text}")
+
+
+def freeze_for_fork():
+    """지금까지 만든 객체를 GC 추적 대상에서 제외합니다 (gc.freeze).
+
+    fork 후 자식에서 GC가 부모에게서 물려받은 객체의 헤더를 건드리면 그 메모리 페이지가 복사되어 공유가 깨지므로,
+    fork 직전 부모에서 호출합니다.
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def preload_worker_modules():
+    """첫 작업에서야 로드/초기화되는 무거운 모듈을 미리 준비합니다.
+
+    - yt-dlp 추출기 클래스 전체와 URL 정규식 (첫 extract_info가 URL에 맞는 추출기를 찾으며 대부분 컴파일함)
+    - 음성 변환/태그/앨범 커버에 쓰는 yt-dlp 후처리기, mutagen, Pillow 이미지 플러그인
+    prefork 풀에서는 부모가 한 번만 준비하고 자식들이 copy-on-write로 공유합니다.
+    """
+    global _preload_summary
+    started = time.perf_counter()
+    from yt_dlp.extractor import gen_extractor_classes
+    for module_name in ('yt_dlp.postprocessor', 'mutagen.mp4', 'mutagen.id3'):
+        importlib.import_module(module_name)
+    from PIL import Image
+    extractor_count = 0
+    for extractor_class in gen_extractor_classes():
+        try:
+            extractor_class.suitable('') # _VALID_URL 정규식을 컴파일해 클래스에 캐시
+        except Exception:
+            pass
+        extractor_count += 1
+    Image.init()
+    elapsed = time.perf_counter() - started
+    metrics.observe('worker_preload_seconds', elapsed)
+    _preload_summary = f"사전 로드 {elapsed:.2f}초 (추출기 {extractor_count}개)"
+    return elapsed
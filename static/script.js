@@ -5,14 +5,18 @@ document.addEventListener('DOMContentLoaded', () => {
     const downloadButton = document.getElementById('downloadButton');
     const audioOnlyButton = document.getElementById('audioOnlyButton');
     const resetButton = document.getElementById('resetButton');
+    const cancelButton = document.getElementById('cancelButton');
 
     const infoSection = document.getElementById('infoSection');
     const thumbnailImage = document.getElementById('thumbnailImage');
     const titleText = document.getElementById('titleText');
     const videoFormatSelect = document.getElementById('videoFormatSelect');
     const audioFormatSelect = document.getElementById('audioFormatSelect');
+    const audioOutputModeSelect = document.getElementById('audioOutputModeSelect');
+    const rateLimitInput = document.getElementById('rateLimitInput');
     
     const useThumbnailCheckbox = document.getElementById('useThumbnailAsCover');
+    const parallelDownloadCheckbox = document.getElementById('parallelDownloadCheckbox');
     const autoDownloadCheckbox = document.getElementById('autoDownloadCheckbox');
 
     const playlistSection = document.getElementById('playlistSection');
@@ -28,7 +32,20 @@ document.addEventListener('DOMContentLoaded', () => {
 
     let currentVideoInfo = null;
     let currentProgressInterval = null;
-    let processedFileNames = new Set(); // 이미 처리(링크 생성/자동 다운로드)한 파일명 추적
+    let currentProgressStream = null; // 진행 상태 SSE 연결 (EventSource)
+    let currentTaskId = null; // 진행 중인 다운로드 작업 ID (취소 버튼용)
+    // 진행 상태 커서: 서버는 커서 이후의 로그/완료 파일만 보내므로 클라이언트에서 중복 확인이 필요 없음
+    let progressLogCursor = 0;
+    let progressFileCursor = 0;
+    const MAX_LOG_ENTRIES_IN_VIEW = 500; // 로그 영역에 유지할 최대 줄 수
+    const PLAYLIST_PAGE_LIMIT = 100; // 스크롤 시 한 번에 불러오는 플레이리스트 항목 수
+    const PLAYLIST_PAGE_MAX_LIMIT = 500; // 다운로드 요청 시 미로딩 항목 ID 조회 단위 (서버 최대값)
+    // defaultChecked: 아직 불러오지 않은 항목의 선택 상태 (전체 선택/해제로 바뀜)
+    let playlistPaging = { url: null, nextOffset: null, total: 0, rendered: 0, loading: false, defaultChecked: true };
+    const playlistSentinel = document.createElement('div'); playlistSentinel.className = 'playlist-item';
+    const playlistObserver = window.IntersectionObserver
+        ? new IntersectionObserver(entries => { if (entries.some(e => e.isIntersecting)) loadNextPlaylistPage(); })
+        : null;
 
     if (typeof preLoadYouTubeUrl !== 'undefined' && preLoadYouTubeUrl) {
         urlEntry.value = preLoadYouTubeUrl;
@@ -56,18 +73,34 @@ document.addEventListener('DOMContentLoaded', () => {
         urlEntry.value = '';
         infoSection.classList.add('hidden'); thumbnailImage.src = '#'; titleText.textContent = '제목';
         videoFormatSelect.innerHTML = '<option value="">-- 선택 --</option>'; audioFormatSelect.innerHTML = '<option value="">-- 선택 --</option>';
-        playlistSection.classList.add('hidden'); playlistItemsContainer.innerHTML = '';
+        playlistSection.classList.add('hidden'); playlistItemsContainer.innerHTML = ''; resetPlaylistPaging();
         progressSection.classList.add('hidden'); progressBarFill.style.width = '0%'; statusMessage.textContent = '';
         logMessages.innerHTML = ''; downloadedFilesList.innerHTML = '';
         downloadButton.disabled = true; audioOnlyButton.disabled = true; fetchButton.disabled = false; resetButton.disabled = false;
-        currentVideoInfo = null;
-        if (currentProgressInterval) { clearInterval(currentProgressInterval); currentProgressInterval = null; }
-        useThumbnailCheckbox.checked = false; autoDownloadCheckbox.checked = true;
-        processedFileNames.clear(); // 처리된 파일 목록 초기화
+        currentVideoInfo = null; currentTaskId = null; cancelButton.disabled = true;
+        stopProgressUpdates();
+        useThumbnailCheckbox.checked = false; parallelDownloadCheckbox.checked = false; autoDownloadCheckbox.checked = true;
+        audioOutputModeSelect.value = 'auto'; rateLimitInput.value = '';
+        resetProgressCursors();
     }
 
     resetButton.addEventListener('click', resetUI);
 
+    // 진행 중인 작업 취소: 서버가 다운로드/ffmpeg를 중단하고 REVOKED 상태를 보내면 진행 상태 처리에서 종료됨
+    cancelButton.addEventListener('click', async () => {
+        if (!currentTaskId) return;
+        cancelButton.disabled = true;
+        appendToLog('작업 취소 요청 중...');
+        try {
+            const response = await fetch(`/cancel/${currentTaskId}`, { method: 'POST' });
+            const result = await response.json();
+            if (!response.ok) throw new Error(result.error || `HTTP error ${response.status}`);
+            statusMessage.textContent = '작업 취소 중...';
+        } catch (error) {
+            appendToLog(`작업 취소 오류: ${error.message}`, 'error');
+        }
+    });
+
     fetchButton.addEventListener('click', async () => {
         // ... (fetchButton 로직은 이전과 동일)
         const url = urlEntry.value.trim();
@@ -78,14 +111,24 @@ document.addEventListener('DOMContentLoaded', () => {
         progressSection.classList.add('hidden'); progressBarFill.style.width = '0%'; statusMessage.textContent = '정보를 가져오는 중...';
         logMessages.innerHTML = ''; downloadedFilesList.innerHTML = ''; // 새 fetch 시 이전 다운로드 링크 제거
         downloadButton.disabled = true; audioOnlyButton.disabled = true; fetchButton.disabled = true;
-        processedFileNames.clear(); // 새 fetch 시 처리된 파일 목록 초기화
+        resetProgressCursors();
 
         appendToLog(`정보 가져오기 시작: ${url}`);
         try {
-            const response = await fetch('/fetch_info', {
+            let response = await fetch('/fetch_info', {
                 method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ url: url })
             });
-            if (!response.ok) { const errorData = await response.json(); throw new Error(errorData.error || `HTTP error ${response.status}`); }
+            // 추출이 오래 걸리면 202와 job_id를 받으므로 결과가 나올 때까지 조회 (서버가 최대 대기 시간만큼 기다렸다 응답)
+            while (response.status === 202) {
+                const pendingJob = await response.json();
+                statusMessage.textContent = '정보를 가져오는 중... (대기열 처리 중)';
+                response = await fetch(`/fetch_info/${pendingJob.job_id}?wait=10`);
+            }
+            if (!response.ok) {
+                const errorData = await response.json();
+                const retryAfter = response.headers.get('Retry-After');
+                throw new Error((errorData.error || `HTTP error ${response.status}`) + (retryAfter ? ` (${retryAfter}초 후 재시도)` : ''));
+            }
             currentVideoInfo = await response.json();
             updateUIWithInfo(currentVideoInfo);
             appendToLog('정보 가져오기 완료.'); statusMessage.textContent = '정보 가져오기 완료.';
@@ -105,20 +148,89 @@ document.addEventListener('DOMContentLoaded', () => {
         titleText.textContent = data.title || '제목 없음';
         populateFormatSelect(videoFormatSelect, data.video_formats, data.default_video_format_id);
         populateFormatSelect(audioFormatSelect, data.audio_formats, data.default_audio_format_id);
+        resetPlaylistPaging();
         if (data.playlist_entries && data.playlist_entries.length > 0) {
             playlistSection.classList.remove('hidden');
             playlistItemsContainer.innerHTML = '';
-            data.playlist_entries.forEach((entry, index) => {
-                const div = document.createElement('div'); div.className = 'playlist-item';
-                const checkbox = document.createElement('input'); checkbox.type = 'checkbox'; checkbox.id = `playlist_item_${index}`;
-                checkbox.value = entry.id || entry.url; checkbox.checked = true;
-                const label = document.createElement('label'); label.htmlFor = `playlist_item_${index}`; label.textContent = entry.title || `항목 ${index + 1}`;
-                div.appendChild(checkbox); div.appendChild(label); playlistItemsContainer.appendChild(div);
-            });
+            playlistPaging.url = data.original_url;
+            playlistPaging.total = data.playlist_total || data.playlist_entries.length;
+            renderPlaylistEntries(data.playlist_entries);
+            setPlaylistNextOffset(data.playlist_next_offset);
         } else {
             playlistSection.classList.add('hidden');
         }
     }
+
+    // --- 플레이리스트 항목 페이지 로딩 (스크롤 시 다음 페이지를 불러옴) ---
+    function resetPlaylistPaging() {
+        if (playlistObserver) playlistObserver.disconnect();
+        playlistSentinel.remove();
+        playlistPaging = { url: null, nextOffset: null, total: 0, rendered: 0, loading: false, defaultChecked: true };
+    }
+
+    function renderPlaylistEntries(entries) {
+        const fragment = document.createDocumentFragment();
+        entries.forEach(entry => {
+            const index = playlistPaging.rendered++;
+            const div = document.createElement('div'); div.className = 'playlist-item';
+            const checkbox = document.createElement('input'); checkbox.type = 'checkbox'; checkbox.id = `playlist_item_${index}`;
+            checkbox.value = entry.id || entry.url; checkbox.checked = playlistPaging.defaultChecked;
+            const label = document.createElement('label'); label.htmlFor = `playlist_item_${index}`; label.textContent = entry.title || `항목 ${index + 1}`;
+            div.appendChild(checkbox); div.appendChild(label); fragment.appendChild(div);
+        });
+        playlistItemsContainer.appendChild(fragment);
+    }
+
+    function setPlaylistNextOffset(nextOffset) {
+        playlistPaging.nextOffset = (typeof nextOffset === 'number') ? nextOffset : null;
+        if (playlistPaging.nextOffset === null) {
+            if (playlistObserver) playlistObserver.disconnect();
+            playlistSentinel.remove();
+            return;
+        }
+        playlistSentinel.textContent = `더 불러오는 중... (${playlistPaging.rendered}/${playlistPaging.total})`;
+        playlistItemsContainer.appendChild(playlistSentinel); // 항상 목록 맨 아래
+        if (playlistObserver) { // 다시 observe해야 센티널이 계속 보이는 경우(짧은 목록)에도 콜백이 호출됨
+            playlistObserver.unobserve(playlistSentinel); playlistObserver.observe(playlistSentinel);
+        } else loadNextPlaylistPage();
+    }
+
+    async function fetchPlaylistPage(offset, limit) {
+        const params = new URLSearchParams({ url: playlistPaging.url, offset: offset, limit: limit });
+        const response = await fetch(`/playlist_entries?${params}`);
+        const page = await response.json();
+        if (!response.ok) throw new Error(page.error || `HTTP error ${response.status}`);
+        return page;
+    }
+
+    async function loadNextPlaylistPage() {
+        if (playlistPaging.loading || playlistPaging.nextOffset === null) return;
+        playlistPaging.loading = true;
+        const pagingAtStart = playlistPaging;
+        try {
+            const page = await fetchPlaylistPage(playlistPaging.nextOffset, PLAYLIST_PAGE_LIMIT);
+            if (pagingAtStart !== playlistPaging) return; // 그 사이 새 정보를 가져온 경우
+            renderPlaylistEntries(page.entries);
+            setPlaylistNextOffset(page.next_offset);
+        } catch (error) {
+            appendToLog(`플레이리스트 항목 불러오기 오류: ${error.message}`, 'error');
+            setPlaylistNextOffset(null);
+        } finally {
+            pagingAtStart.loading = false;
+        }
+    }
+
+    // 아직 화면에 불러오지 않은 항목의 ID (다운로드 요청 시 렌더링 없이 조회)
+    async function fetchUnloadedPlaylistItemIds() {
+        const ids = [];
+        let offset = playlistPaging.nextOffset;
+        while (offset !== null) {
+            const page = await fetchPlaylistPage(offset, PLAYLIST_PAGE_MAX_LIMIT);
+            page.entries.forEach(entry => ids.push(entry.id || entry.url));
+            offset = (typeof page.next_offset === 'number') ? page.next_offset : null;
+        }
+        return ids;
+    }
     function populateFormatSelect(selectElement, formats, defaultFormatId) {
         selectElement.innerHTML = '';
         if (!formats || formats.length === 0) {
@@ -133,8 +245,14 @@ document.addEventListener('DOMContentLoaded', () => {
         if (defaultFormatId && selectElement.querySelector(`option[value="${defaultFormatId}"]`)) selectElement.value = defaultFormatId;
         else if (formats.length > 0) selectElement.value = formats[0].format_id;
     }
-    selectAllButton.addEventListener('click', () => playlistItemsContainer.querySelectorAll('input[type="checkbox"]').forEach(cb => cb.checked = true));
-    deselectAllButton.addEventListener('click', () => playlistItemsContainer.querySelectorAll('input[type="checkbox"]').forEach(cb => cb.checked = false));
+    selectAllButton.addEventListener('click', () => {
+        playlistPaging.defaultChecked = true;
+        playlistItemsContainer.querySelectorAll('input[type="checkbox"]').forEach(cb => cb.checked = true);
+    });
+    deselectAllButton.addEventListener('click', () => {
+        playlistPaging.defaultChecked = false;
+        playlistItemsContainer.querySelectorAll('input[type="checkbox"]').forEach(cb => cb.checked = false);
+    });
 
 
     function triggerFileDownload(fileUrl, fileName) {
@@ -149,13 +267,22 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // 개별 파일에 대한 링크 생성 및 자동 다운로드 처리 함수
     function processSingleCompletedFile(fileInfo) {
-        if (!fileInfo || !fileInfo.name || processedFileNames.has(fileInfo.name)) {
-            return; // 파일 정보가 없거나 이미 처리된 파일이면 스킵
+        if (!fileInfo || !fileInfo.name) {
+            return; // 파일 정보가 없으면 스킵
         }
 
         // 수동 다운로드 링크 추가
         if (downloadedFilesList.innerHTML.includes("<h3>") === false) { // 제목 한 번만 추가
              downloadedFilesList.innerHTML = '<h3>다운로드된 파일 (수동):</h3>';
+             if (fileInfo.task_id) { // 지금까지 완료된 파일 전체를 ZIP 하나로 받기 (진행 중에도 가능)
+                 const zipParagraph = document.createElement('p');
+                 const zipLink = document.createElement('a');
+                 zipLink.href = `/task_files/${encodeURIComponent(fileInfo.task_id)}/all.zip`;
+                 zipLink.textContent = '전체 파일 ZIP으로 받기';
+                 zipLink.className = 'button download-link';
+                 zipParagraph.appendChild(zipLink);
+                 downloadedFilesList.appendChild(zipParagraph);
+             }
         }
         const p = document.createElement('p');
         const link = document.createElement('a');
@@ -169,12 +296,14 @@ document.addEventListener('DOMContentLoaded', () => {
         // 자동 다운로드 처리
         if (autoDownloadCheckbox.checked) {
             appendToLog(`"${fileInfo.name}" 자동 다운로드를 시작합니다...`);
-            // 여러 파일이 동시에 완료될 경우를 대비해 약간의 지연은 유지할 수 있으나,
-            // newly_completed_file은 하나씩 오므로 바로 실행해도 무방할 수 있음.
-            // 여기서는 즉시 실행.
+            // 서버가 커서 이후의 새 파일만 보내므로 즉시 실행.
             triggerFileDownload(fileInfo.url, fileInfo.name);
         }
-        processedFileNames.add(fileInfo.name); // 처리된 파일로 기록
+    }
+
+    function resetProgressCursors() {
+        progressLogCursor = 0;
+        progressFileCursor = 0;
     }
 
 
@@ -188,22 +317,30 @@ document.addEventListener('DOMContentLoaded', () => {
         let playlistItemsToSubmit = [];
         if (currentVideoInfo && currentVideoInfo.playlist_entries && currentVideoInfo.playlist_entries.length > 0) {
             playlistItemsContainer.querySelectorAll('input[type="checkbox"]:checked').forEach(cb => playlistItemsToSubmit.push(cb.value));
+            if (playlistPaging.defaultChecked && playlistPaging.nextOffset !== null) {
+                // 스크롤하지 않아 불러오지 않은 항목도 선택된 것으로 보고 포함
+                try { playlistItemsToSubmit.push(...await fetchUnloadedPlaylistItemIds()); }
+                catch (error) { appendToLog(`플레이리스트 항목 불러오기 오류: ${error.message}`, 'error'); return; }
+            }
             if (playlistItemsToSubmit.length === 0) { appendToLog('다운로드할 플레이리스트 항목을 선택해주세요.', 'error'); return; }
         }
         downloadButton.disabled = true; audioOnlyButton.disabled = true; fetchButton.disabled = true; resetButton.disabled = true;
         statusMessage.textContent = audioOnly ? '음성 다운로드 요청 중...' : '다운로드 요청 중...';
         progressBarFill.style.width = '0%'; progressSection.classList.remove('hidden');
         logMessages.innerHTML = ''; downloadedFilesList.innerHTML = ''; // 다운로드 시작 시 이전 목록 초기화
-        processedFileNames.clear(); // 새 다운로드 시작 시 처리된 파일 목록 초기화
+        resetProgressCursors();
         appendToLog(`${audioOnly ? '음성' : '영상/음성'} 다운로드 시작 요청.`);
         const payload = {
             url: urlToDownload, video_format_id: audioOnly ? null : selectedVideoFormat, audio_format_id: selectedAudioFormat,
             audio_only: audioOnly, playlist_items: playlistItemsToSubmit, use_thumbnail_as_cover: useThumbnailCheckbox.checked,
+            audio_output_mode: audioOnly ? audioOutputModeSelect.value : null,
+            rate_limit: rateLimitInput.value.trim() || null,
             title_override: currentVideoInfo ? currentVideoInfo.title : null, 
             thumbnail_url_override: currentVideoInfo ? currentVideoInfo.thumbnail_url : null,
+            parallel: parallelDownloadCheckbox.checked && playlistItemsToSubmit.length > 1,
         };
         
-        if (currentProgressInterval) clearInterval(currentProgressInterval);
+        stopProgressUpdates();
 
         try {
             const response = await fetch('/download', {
@@ -217,80 +354,125 @@ document.addEventListener('DOMContentLoaded', () => {
             const celeryTaskId = initialAck.task_id;
             appendToLog(`서버에서 다운로드 작업 시작됨 (Task ID: ${celeryTaskId})`);
             statusMessage.textContent = "작업 대기 중...";
+            currentTaskId = celeryTaskId; cancelButton.disabled = false;
 
-            currentProgressInterval = setInterval(async () => {
-                try {
-                    const progressResponse = await fetch(`/progress/${celeryTaskId}`);
-                    if (!progressResponse.ok) {
-                        // ... (404 등 에러 처리)
-                        console.warn(`Progress polling for ${celeryTaskId} failed: ${progressResponse.status}`);
-                        if (progressResponse.status === 404) {
-                            clearInterval(currentProgressInterval); currentProgressInterval = null;
-                            statusMessage.textContent = "작업 정보 없음 (정리됨).";
-                            downloadButton.disabled = false; audioOnlyButton.disabled = false; fetchButton.disabled = false; resetButton.disabled = false;
-                        }
-                        return; 
-                    }
+            startProgressUpdates(celeryTaskId);
 
-                    const progressData = await progressResponse.json();
-                    statusMessage.textContent = progressData.status_text || "상태 업데이트 중...";
-                    progressBarFill.style.width = `${progressData.progress || 0}%`;
-                    
-                    logMessages.innerHTML = ''; 
-                    if (progressData.logs && progressData.logs.length > 0) {
-                        appendToLog(progressData.logs);
-                    }
+        } catch (error) {
+            // ... (기존 에러 처리)
+            stopProgressUpdates();
+            console.error('Download error:', error);
+            statusMessage.textContent = `다운로드 요청 오류: ${error.message}`;
+            appendToLog(`다운로드 요청 오류: ${error.message}`, 'error');
+            downloadButton.disabled = false; audioOnlyButton.disabled = false; fetchButton.disabled = false; resetButton.disabled = false;
+        }
+    }
 
-                    // --- 개별 파일 완료 처리 ---
-                    if (progressData.newly_completed_file) {
-                        processSingleCompletedFile(progressData.newly_completed_file);
-                    }
-                    // 만약 newly_completed_file이 아니라 all_completed_files로 온다면,
-                    // all_completed_files를 순회하며 processedFileNames에 없는 파일들을 처리.
-                    if (progressData.all_completed_files && progressData.all_completed_files.length > 0) {
-                        progressData.all_completed_files.forEach(fileInfo => {
-                            if (fileInfo && fileInfo.name && !processedFileNames.has(fileInfo.name)) {
-                                processSingleCompletedFile(fileInfo); // 새로 발견된 완료 파일 처리
-                            }
-                        });
-                    }
+    function stopProgressUpdates() {
+        if (currentProgressInterval) { clearInterval(currentProgressInterval); currentProgressInterval = null; }
+        if (currentProgressStream) { currentProgressStream.close(); currentProgressStream = null; }
+    }
+
+    // 진행 상태 업데이트 시작: SSE 스트림을 우선 사용하고, 지원하지 않거나 연결이 계속 실패하면 폴링으로 전환
+    function startProgressUpdates(celeryTaskId) {
+        stopProgressUpdates();
+        if (!window.EventSource) {
+            startProgressPolling(celeryTaskId);
+            return;
+        }
 
+        let consecutiveStreamErrors = 0;
+        // 자동 재연결 시에는 브라우저가 마지막 이벤트 id(커서)를 Last-Event-ID로 보내 이어서 받음
+        const stream = new EventSource(`/progress/${celeryTaskId}/stream?log_cursor=${progressLogCursor}&file_cursor=${progressFileCursor}`);
+        currentProgressStream = stream;
+        stream.onmessage = (event) => {
+            consecutiveStreamErrors = 0;
+            try {
+                const finished = handleProgressData(JSON.parse(event.data));
+                if (finished) stopProgressUpdates();
+            } catch (parseError) {
+                console.warn('Progress stream parse error:', parseError);
+            }
+        };
+        stream.onerror = () => {
+            if (currentProgressStream !== stream) return; // 이미 종료/교체된 스트림
+            consecutiveStreamErrors += 1;
+            // 서버가 최대 유지 시간 후 연결을 닫는 경우 EventSource가 자동 재연결하므로, 연속 실패 시에만 폴링으로 전환
+            if (stream.readyState === EventSource.CLOSED || consecutiveStreamErrors >= 3) {
+                console.warn(`Progress stream for ${celeryTaskId} failed, falling back to polling.`);
+                stream.close(); currentProgressStream = null;
+                startProgressPolling(celeryTaskId);
+            }
+        };
+    }
 
-                    // --- 전체 작업 완료 처리 ---
-                    if (['SUCCESS', 'FAILURE', 'REVOKED'].includes(progressData.state) || progressData.progress >= 100) {
-                        clearInterval(currentProgressInterval); currentProgressInterval = null;
-                        statusMessage.textContent = progressData.status_text || (progressData.state === 'SUCCESS' ? "완료" : "종료됨");
-                        
-                        // 최종 SUCCESS 시, 혹시 누락된 파일이 있다면 all_completed_files 기준으로 한 번 더 처리
-                        if (progressData.state === 'SUCCESS' && progressData.all_completed_files && progressData.all_completed_files.length > 0) {
-                            progressData.all_completed_files.forEach(fileInfo => {
-                                if (fileInfo && fileInfo.name && !processedFileNames.has(fileInfo.name)) {
-                                    processSingleCompletedFile(fileInfo);
-                                }
-                            });
-                        }
-                        
-                        if (progressData.state === 'SUCCESS' && (!progressData.all_completed_files || progressData.all_completed_files.length === 0) && downloadedFilesList.innerHTML === '') {
-                             appendToLog("완료되었지만 다운로드할 파일이 없습니다.", "info");
-                        } else if (progressData.state === 'FAILURE') {
-                             appendToLog(`작업 실패: ${progressData.status_text || '알 수 없는 오류'}`, 'error');
-                        }
-                        
+    function startProgressPolling(celeryTaskId) {
+        currentProgressInterval = setInterval(async () => {
+            try {
+                const progressResponse = await fetch(`/progress/${celeryTaskId}?log_cursor=${progressLogCursor}&file_cursor=${progressFileCursor}`);
+                if (!progressResponse.ok) {
+                    // ... (404 등 에러 처리)
+                    console.warn(`Progress polling for ${celeryTaskId} failed: ${progressResponse.status}`);
+                    if (progressResponse.status === 404) {
+                        stopProgressUpdates();
+                        statusMessage.textContent = "작업 정보 없음 (정리됨).";
+                        currentTaskId = null; cancelButton.disabled = true;
                         downloadButton.disabled = false; audioOnlyButton.disabled = false; fetchButton.disabled = false; resetButton.disabled = false;
                     }
-                } catch (pollError) {
-                    console.warn('Progress polling error:', pollError);
+                    return; 
                 }
-            }, 2000);
 
-        } catch (error) {
-            // ... (기존 에러 처리)
-            if(currentProgressInterval) clearInterval(currentProgressInterval); currentProgressInterval = null;
-            console.error('Download error:', error);
-            statusMessage.textContent = `다운로드 요청 오류: ${error.message}`;
-            appendToLog(`다운로드 요청 오류: ${error.message}`, 'error');
+                const progressData = await progressResponse.json();
+                if (handleProgressData(progressData)) stopProgressUpdates();
+            } catch (pollError) {
+                console.warn('Progress polling error:', pollError);
+            }
+        }, 2000);
+    }
+
+    // 진행 상태 응답(폴링/스트림 공통) 처리. 작업이 끝났으면 true 반환
+    function formatRate(bytesPerSecond) {
+        return bytesPerSecond >= 1024 * 1024 ? `${(bytesPerSecond / 1024 / 1024).toFixed(1)} MB/s` : `${(bytesPerSecond / 1024).toFixed(0)} KB/s`;
+    }
+
+    function handleProgressData(progressData) {
+        statusMessage.textContent = progressData.status_text || "상태 업데이트 중...";
+        if (progressData.throughput_bps) {
+            // 작업 전체의 실제 속도 (대역폭 예산이 있으면 허용된 속도도 함께 표시)
+            const limitText = progressData.rate_limit_bps ? ` / 허용 ${formatRate(progressData.rate_limit_bps)}` : '';
+            statusMessage.textContent += ` [작업 속도 ${formatRate(progressData.throughput_bps)}${limitText}]`;
+        }
+        progressBarFill.style.width = `${progressData.progress || 0}%`;
+        
+        // logs / all_completed_files에는 커서 이후의 새 항목만 담겨 옴
+        if (progressData.logs && progressData.logs.length > 0) {
+            appendToLog(progressData.logs);
+            while (logMessages.children.length > MAX_LOG_ENTRIES_IN_VIEW) logMessages.removeChild(logMessages.firstChild);
+        }
+        if (progressData.all_completed_files && progressData.all_completed_files.length > 0) {
+            progressData.all_completed_files.forEach(fileInfo => processSingleCompletedFile(fileInfo));
+        }
+        if (typeof progressData.log_cursor === 'number') progressLogCursor = progressData.log_cursor;
+        if (typeof progressData.file_cursor === 'number') progressFileCursor = progressData.file_cursor;
+
+
+        // --- 전체 작업 완료 처리 ---
+        if (['SUCCESS', 'FAILURE', 'REVOKED'].includes(progressData.state) || progressData.progress >= 100) {
+            statusMessage.textContent = progressData.status_text || (progressData.state === 'SUCCESS' ? "완료" : "종료됨");
+            
+            if (progressData.state === 'SUCCESS' && progressFileCursor === 0 && downloadedFilesList.innerHTML === '') {
+                 appendToLog("완료되었지만 다운로드할 파일이 없습니다.", "info");
+            } else if (progressData.state === 'FAILURE') {
+                 appendToLog(`작업 실패: ${progressData.status_text || '알 수 없는 오류'}`, 'error');
+            } else if (progressData.state === 'REVOKED') {
+                 appendToLog('작업이 취소되었습니다. 이미 완료된 파일은 그대로 받을 수 있습니다.');
+            }
+            currentTaskId = null; cancelButton.disabled = true;
+            
             downloadButton.disabled = false; audioOnlyButton.disabled = false; fetchButton.disabled = false; resetButton.disabled = false;
+            return true;
         }
+        return false;
     }
 
     downloadButton.addEventListener('click', () => startDownload(false));
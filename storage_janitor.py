@@ -0,0 +1,232 @@
+import os
+import time
+import shutil
+import logging
+
+import metrics
+from redis_store import get_redis, KEY_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# 디스크 사용률이 HIGH_WATER를 넘으면 LOW_WATER 아래로 내려갈 때까지 오래 사용되지 않은 작업 폴더부터 삭제
+JANITOR_HIGH_WATER_PERCENT = float(os.environ.get('JANITOR_HIGH_WATER_PERCENT', '90'))
+JANITOR_LOW_WATER_PERCENT = float(os.environ.get('JANITOR_LOW_WATER_PERCENT', '75'))
+JANITOR_MAX_AGE_SECONDS = int(os.environ.get('JANITOR_MAX_AGE_SECONDS', str(6 * 60 * 60))) # 마지막 사용 후 이 시간이 지나면 삭제
+JANITOR_RUNNING_GRACE_SECONDS = int(os.environ.get('JANITOR_RUNNING_GRACE_SECONDS', str(6 * 60 * 60))) # 이 시간 동안 갱신 없는 '실행 중' 표시는 무시 (워커 비정상 종료 대비)
+JANITOR_RECONCILE_INTERVAL_SECONDS = int(os.environ.get('JANITOR_RECONCILE_INTERVAL_SECONDS', str(6 * 60 * 60))) # 인덱스에 없는 폴더 확인 주기
+
+_ATIME_KEY = f"{KEY_PREFIX}storage:atime" # ZSET: 작업 ID -> 마지막 사용(기록/다운로드) 시각
+_SIZE_KEY = f"{KEY_PREFIX}storage:size" # HASH: 작업 ID -> 폴더 크기(bytes)
+_RUNNING_KEY = f"{KEY_PREFIX}storage:running" # ZSET: 실행 중인 작업 ID -> 마지막 갱신 시각
+_STATS_KEY = f"{KEY_PREFIX}storage:stats" # HASH: 누적 삭제 수/바이트
+_LOCK_KEY = f"{KEY_PREFIX}storage:janitor:lock"
+_RECONCILED_KEY = f"{KEY_PREFIX}storage:reconciled_at"
+
+
+def _folder_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try: total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError: pass
+    return total
+
+
+def _folder_freeable_size(path):
+    """폴더를 삭제하면 실제로 확보되는 크기. 다른 곳(다운로드 캐시 등)에 하드링크가 남은 파일은 제외합니다."""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                st = os.lstat(os.path.join(dirpath, filename))
+            except OSError:
+                continue
+            if st.st_nlink <= 1:
+                total += st.st_size
+    return total
+
+
+class StorageJanitor:
+    """작업 폴더별 크기/마지막 사용 시각을 Redis 인덱스로 관리하고, 디스크 사용률에 따라 LRU로 삭제합니다.
+
+    파일이 기록될 때(record_write)와 다운로드될 때(touch) 인덱스를 갱신하므로, 정리할 때 폴더 전체를
+    listdir/getmtime으로 훑지 않습니다. 기록 시점에 사용률이 HIGH_WATER를 넘으면 바로 정리하며,
+    실행 중인 작업의 폴더는 삭제하지 않습니다.
+    """
+
+    def __init__(self, base_dir, redis_client=None):
+        self.base_dir = base_dir
+        self._redis = redis_client
+
+    @property
+    def redis(self):
+        return self._redis or get_redis()
+
+    # --- 인덱스 갱신 ---
+    def mark_running(self, task_id):
+        """작업 시작(또는 진행 중 갱신) 표시. 표시된 작업의 폴더는 삭제 대상에서 제외됩니다."""
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(_RUNNING_KEY, {str(task_id): now})
+        pipe.zadd(_ATIME_KEY, {str(task_id): now})
+        pipe.execute()
+
+    def mark_finished(self, task_id):
+        self.redis.zrem(_RUNNING_KEY, str(task_id))
+
+    def record_write(self, task_id, filepath):
+        """작업 폴더에 파일이 완성되었을 때 호출: 크기/사용 시각을 갱신하고 필요하면 즉시 정리합니다."""
+        try:
+            size = os.path.getsize(filepath)
+        except OSError:
+            size = 0
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hincrby(_SIZE_KEY, str(task_id), size)
+        pipe.zadd(_ATIME_KEY, {str(task_id): now})
+        pipe.zadd(_RUNNING_KEY, {str(task_id): now}, xx=True) # 실행 중 표시가 있으면 갱신
+        pipe.execute()
+        if self.disk_usage_percent() >= JANITOR_HIGH_WATER_PERCENT:
+            self.run(reason='disk')
+
+    def touch(self, task_id):
+        """파일이 다운로드(서빙)될 때 호출: 마지막 사용 시각만 갱신합니다 (인덱스에 있는 폴더만)."""
+        try:
+            self.redis.zadd(_ATIME_KEY, {str(task_id): time.time()}, xx=True)
+        except Exception as e:
+            logger.warning(f"작업 폴더 사용 시각 갱신 실패 ({task_id}): {e}")
+
+    # --- 조회 ---
+    def disk_usage_percent(self):
+        usage = shutil.disk_usage(self.base_dir)
+        return usage.used * 100.0 / usage.total if usage.total else 0.0
+
+    def usage(self):
+        """디스크/인덱스 사용량과 누적 삭제 통계."""
+        disk = shutil.disk_usage(self.base_dir)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zcard(_ATIME_KEY)
+        pipe.hvals(_SIZE_KEY)
+        pipe.zcount(_RUNNING_KEY, time.time() - JANITOR_RUNNING_GRACE_SECONDS, '+inf')
+        pipe.hgetall(_STATS_KEY)
+        folder_count, sizes, running_count, stats = pipe.execute()
+        return {
+            'disk_total_bytes': disk.total, 'disk_used_bytes': disk.used, 'disk_free_bytes': disk.free,
+            'disk_used_percent': round(disk.used * 100.0 / disk.total, 2) if disk.total else 0.0,
+            'high_water_percent': JANITOR_HIGH_WATER_PERCENT, 'low_water_percent': JANITOR_LOW_WATER_PERCENT,
+            'task_folders': folder_count, 'task_folder_bytes': sum(int(v) for v in sizes),
+            'running_tasks': running_count,
+            'evictions': {k.decode(): int(v) for k, v in stats.items()},
+        }
+
+    # --- 정리 ---
+    def _running_task_ids(self):
+        cutoff = time.time() - JANITOR_RUNNING_GRACE_SECONDS
+        self.redis.zremrangebyscore(_RUNNING_KEY, '-inf', f"({cutoff}") # 비정상 종료로 남은 표시 제거
+        return {member.decode() for member in self.redis.zrangebyscore(_RUNNING_KEY, cutoff, '+inf')}
+
+    def _evict(self, task_id, reason):
+        folder = os.path.join(self.base_dir, task_id)
+        size = int(self.redis.hget(_SIZE_KEY, task_id) or 0)
+        try:
+            shutil.rmtree(folder)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"작업 폴더 삭제 실패 {folder}: {e}")
+            return False
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zrem(_ATIME_KEY, task_id)
+        pipe.hdel(_SIZE_KEY, task_id)
+        pipe.hincrby(_STATS_KEY, f"{reason}_evictions", 1)
+        pipe.hincrby(_STATS_KEY, f"{reason}_bytes", size)
+        pipe.execute()
+        metrics.inc('janitor_evictions_total', reason=reason)
+        metrics.inc('janitor_evicted_bytes_total', size, reason=reason)
+        logger.info(f"작업 폴더 삭제 ({reason}): {folder} ({size} bytes)")
+        return True
+
+    def _shrink_download_cache(self):
+        """디스크 사용률을 LOW_WATER로 낮추는 데 필요한 만큼 다운로드 캐시를 LRU로 줄입니다.
+
+        작업 폴더의 파일은 캐시에 하드링크되어 있어, 캐시 항목도 지워야 폴더 삭제로 공간이 확보됩니다.
+        반환값: 삭제한 캐시 항목 수
+        """
+        import download_cache as download_cache_module # 워커에서만 호출됨 (웹 계층에서 yt_dlp/sqlite3를 로드하지 않도록)
+        if not download_cache_module.is_enabled():
+            return 0
+        disk = shutil.disk_usage(self.base_dir)
+        excess_bytes = disk.used - disk.total * JANITOR_LOW_WATER_PERCENT / 100.0
+        if excess_bytes <= 0:
+            return 0
+        cache = download_cache_module.download_cache
+        try:
+            cache_bytes = cache.usage()['bytes']
+            return cache.evict(max_bytes=max(0, int(cache_bytes - excess_bytes)))
+        except Exception as e:
+            logger.warning(f"디스크 부족 시 다운로드 캐시 정리 실패: {e}")
+            return 0
+
+    def reconcile(self):
+        """인덱스에 없는 작업 폴더(업그레이드 이전 폴더, 비정상 종료 등)를 찾아 인덱스에 추가합니다."""
+        indexed = {member.decode() for member in self.redis.zrange(_ATIME_KEY, 0, -1)}
+        added = 0
+        for entry in os.scandir(self.base_dir):
+            if entry.name.startswith('.') or not entry.is_dir() or entry.name in indexed:
+                continue
+            try: mtime = entry.stat().st_mtime
+            except FileNotFoundError: continue
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.zadd(_ATIME_KEY, {entry.name: mtime}, nx=True)
+            pipe.hset(_SIZE_KEY, entry.name, _folder_size(entry.path))
+            pipe.execute()
+            added += 1
+        self.redis.set(_RECONCILED_KEY, time.time())
+        if added:
+            logger.info(f"작업 폴더 인덱스에 없던 폴더 {added}개 추가")
+        return added
+
+    def run(self, reason='periodic'):
+        """오래된 폴더와, 디스크 사용률이 HIGH_WATER 이상이면 LOW_WATER 아래가 될 때까지 LRU 폴더를 삭제합니다.
+
+        여러 워커가 동시에 정리하지 않도록 Redis 잠금을 사용하며, 이미 다른 곳에서 정리 중이면 건너뜁니다.
+        반환값: 삭제한 폴더 수
+        """
+        if not self.redis.set(_LOCK_KEY, b"1", nx=True, ex=300):
+            return 0
+        deleted_count = 0
+        try:
+            last_reconciled = float(self.redis.get(_RECONCILED_KEY) or 0)
+            if time.time() - last_reconciled >= JANITOR_RECONCILE_INTERVAL_SECONDS:
+                self.reconcile()
+            running = self._running_task_ids()
+
+            # 1) 마지막 사용 후 오래된 폴더
+            expired_before = time.time() - JANITOR_MAX_AGE_SECONDS
+            for member in self.redis.zrangebyscore(_ATIME_KEY, '-inf', expired_before):
+                task_id = member.decode()
+                if task_id not in running and self._evict(task_id, 'age'):
+                    deleted_count += 1
+
+            # 2) 디스크 사용률 초과 시 가장 오래 사용되지 않은 폴더부터
+            if self.disk_usage_percent() >= JANITOR_HIGH_WATER_PERCENT:
+                logger.warning(f"디스크 사용률 {self.disk_usage_percent():.1f}% (기준 {JANITOR_HIGH_WATER_PERCENT}%), LRU 정리 시작")
+                self._shrink_download_cache()
+                for member in self.redis.zrange(_ATIME_KEY, 0, -1):
+                    if self.disk_usage_percent() < JANITOR_LOW_WATER_PERCENT:
+                        break
+                    task_id = member.decode()
+                    if task_id in running:
+                        continue
+                    folder = os.path.join(self.base_dir, task_id)
+                    if os.path.isdir(folder) and _folder_freeable_size(folder) == 0:
+                        continue # 파일이 모두 캐시에 남아 있어 삭제해도 공간이 늘지 않음 (오래되면 age 기준으로 삭제)
+                    if self._evict(task_id, 'disk'):
+                        deleted_count += 1
+                if self.disk_usage_percent() >= JANITOR_LOW_WATER_PERCENT:
+                    logger.warning(f"LRU 정리 후에도 디스크 사용률이 높음: {self.disk_usage_percent():.1f}% (실행 중 작업 {len(running)}개 제외)")
+        finally:
+            self.redis.delete(_LOCK_KEY)
+        if deleted_count or reason != 'periodic':
+            logger.info(f"작업 폴더 정리 완료 ({reason}). {deleted_count}개 폴더 삭제.")
+        return deleted_count
@@ -0,0 +1,85 @@
+import os
+import time
+import logging
+
+from celery import Celery
+from celery.signals import before_task_publish
+
+import metrics
+from metadata import METADATA_QUEUE
+from storage_janitor import StorageJanitor
+from redis_store import REDIS_URL, TASK_DATA_TTL_SECONDS, get_redis, task_cancel_key
+
+logger = logging.getLogger(__name__)
+
+# 다운로드 작업은 완료 후 ack(acks_late)하므로, 실행 중인 작업이 다른 워커에 재전달되지 않도록 가장 긴 작업보다 길게 설정.
+# 워커가 강제 종료되면 이 시간이 지난 뒤 재전달되어 체크포인트부터 이어서 진행
+TASK_VISIBILITY_TIMEOUT_SECONDS = int(os.environ.get('TASK_VISIBILITY_TIMEOUT_SECONDS', str(6 * 60 * 60)))
+
+# 웹 앱과 워커가 함께 사용하는 Celery 앱. 웹 계층은 작업을 이름으로 발행하므로 작업 구현(tasks.py)과
+# 워커 전용 모듈(yt_dlp, mutagen, Pillow 등)을 import하지 않습니다. 워커는 tasks.celery_app(이 인스턴스)으로 실행합니다.
+celery_app = Celery('youtube_tasks', broker=REDIS_URL, backend=REDIS_URL)
+celery_app.conf.update(
+    task_serializer='json', result_serializer='json', accept_content=['json'],
+    timezone='Asia/Seoul', enable_utc=True, result_expires=TASK_DATA_TTL_SECONDS, # 24시간 후 결과 만료
+    task_track_started=True,
+    task_routes={'tasks.fetch_info_task': {'queue': METADATA_QUEUE}}, # 정보 추출은 다운로드와 다른 큐에서 처리
+    worker_prefetch_multiplier=1, # acks_late 작업을 한 워커가 미리 가져가 쌓아두지 않도록
+    broker_transport_options={'visibility_timeout': TASK_VISIBILITY_TIMEOUT_SECONDS},
+)
+
+TEMP_DOWNLOAD_BASE_DIR = "task_temp_downloads"
+if not os.path.exists(TEMP_DOWNLOAD_BASE_DIR):
+    os.makedirs(TEMP_DOWNLOAD_BASE_DIR, exist_ok=True)
+storage_janitor = StorageJanitor(TEMP_DOWNLOAD_BASE_DIR) # 작업 폴더 크기/사용 시각 인덱스 및 LRU 정리
+
+# 플레이리스트 병렬 처리(항목별 하위 작업) 설정
+PLAYLIST_FANOUT_MIN_ITEMS = int(os.environ.get('PLAYLIST_FANOUT_MIN_ITEMS', '0')) # 0이면 요청에서 parallel을 지정한 경우에만 병렬 처리
+PLAYLIST_FANOUT_DEFAULT_CONCURRENCY = int(os.environ.get('PLAYLIST_FANOUT_DEFAULT_CONCURRENCY', '4')) # 작업 하나가 동시에 처리하는 항목 수
+PLAYLIST_FANOUT_MAX_CONCURRENCY = int(os.environ.get('PLAYLIST_FANOUT_MAX_CONCURRENCY', '8')) # 요청으로 지정할 수 있는 최대값
+
+# 음성만 다운로드 시 출력 방식
+# - auto: 재인코딩 없이 스트림 복사할 수 있는 원본(m4a←AAC, mp3←MP3)을 우선 선택하고, 없을 때만 변환
+# - transcode: 선택한 포맷을 항상 m4a/mp3로 변환 (기존 동작)
+# - native: 변환 없이 원본 컨테이너(webm/m4a 등) 그대로 전달
+AUDIO_OUTPUT_MODES = ('auto', 'transcode', 'native')
+AUDIO_OUTPUT_MODE_DEFAULT = os.environ.get('AUDIO_OUTPUT_MODE', 'auto').lower()
+
+# 작업 이름 (tasks.py의 작업 함수 이름과 같아야 함)
+DOWNLOAD_VIDEO_TASK = 'tasks.download_video_task'
+DOWNLOAD_PLAYLIST_TASK = 'tasks.download_playlist_task'
+DOWNLOAD_PLAYLIST_ITEM_TASK = 'tasks.download_playlist_item_task'
+DOWNLOAD_BATCH_TASK = 'tasks.download_batch_task'
+FETCH_INFO_TASK = 'tasks.fetch_info_task'
+
+# 워커 슬롯을 차지하는(실제로 다운로드하는) 작업. 클라이언트별 동시 실행 수 제한과 큐 대기 시간 기록 대상
+_SLOT_TASK_NAMES = (DOWNLOAD_VIDEO_TASK, DOWNLOAD_PLAYLIST_ITEM_TASK)
+
+
+def task_signature(task_name):
+    """작업 이름으로 시그니처를 만듭니다. apply_async는 작업이 등록된 프로세스(워커, eager 실행)에서는 그 작업을,
+    웹 프로세스에서는 send_task로 메시지만 발행합니다 (라우팅/큐 옵션은 동일하게 적용)."""
+    return celery_app.signature(task_name)
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(sender=None, headers=None, **kwargs):
+    """다운로드 작업 메시지에 큐에 넣은 시각을 기록합니다 (워커에서 큐 대기 시간 계산용)."""
+    if sender in _SLOT_TASK_NAMES and headers is not None:
+        headers.setdefault('enqueued_at', time.time())
+
+
+def should_fan_out(playlist_item_ids_or_urls, parallel_requested=False):
+    """플레이리스트 요청을 항목별 하위 작업으로 나눠 병렬 처리할지 결정합니다."""
+    item_count = len(playlist_item_ids_or_urls or [])
+    if item_count < 2:
+        return False
+    if parallel_requested:
+        return True
+    return PLAYLIST_FANOUT_MIN_ITEMS > 0 and item_count >= PLAYLIST_FANOUT_MIN_ITEMS
+
+
+def request_cancel(task_id):
+    """작업 취소를 요청합니다. 실행 중인 작업은 다음 확인 시점(진행 hook, 항목 사이 등)에 중단합니다."""
+    get_redis().set(task_cancel_key(task_id), 1, ex=TASK_DATA_TTL_SECONDS)
+    metrics.inc('task_cancel_requests_total')
@@ -1,30 +1,57 @@
 import os
-import shutil
+import copy
+import glob
+import json
 import yt_dlp
 import requests
 import io
 import re
 import time
-from celery import Celery
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from celery import group, chain
+from celery.exceptions import Ignore, SoftTimeLimitExceeded
+from yt_dlp.postprocessor import FFmpegExtractAudioPP
 from mutagen.mp4 import MP4, MP4Cover
 from mutagen.id3 import ID3, APIC
+from PIL import UnidentifiedImageError
 from datetime import datetime
 import logging
 from celery.schedules import crontab
+from celery.signals import task_postrun, worker_init, worker_ready, worker_process_init, worker_process_shutdown
+
+from progress import TaskProgressPublisher, JobItemProgressPublisher, read_progress_entries
+from info_cache import info_cache, extract_info_cached
+from download_cache import download_cache, build_cache_key, materialize
+import metrics
+from session_pool import ydl_pool
+from thumbnail_cache import thumbnail_cache
+from bandwidth import bandwidth_scheduler, parse_rate, DOWNLOAD_CONCURRENT_FRAGMENTS
+from job_queues import (acquire_client_slot, release_client_slot, record_job_started, record_job_finished,
+                        CLIENT_SLOT_RETRY_SECONDS, CLIENT_SLOT_MAX_RETRIES)
+from cancellation import CancelToken, TaskCancelled, is_cancel_requested, kill_child_processes, remove_partial_files
+from metadata import build_video_info, release_metadata_job, METADATA_TASK_SOFT_TIME_LIMIT_SECONDS
+from redis_store import (TASK_DATA_TTL_SECONDS, get_redis,
+                         task_logs_key, task_files_key, task_remaining_key, task_checkpoint_key,
+                         task_finished_items_key)
+from task_app import (celery_app, storage_janitor, TEMP_DOWNLOAD_BASE_DIR, AUDIO_OUTPUT_MODES,
+                      AUDIO_OUTPUT_MODE_DEFAULT, PLAYLIST_FANOUT_DEFAULT_CONCURRENCY, PLAYLIST_FANOUT_MAX_CONCURRENCY,
+                      DOWNLOAD_PLAYLIST_ITEM_TASK, _SLOT_TASK_NAMES)
+import startup
 
 logger = logging.getLogger(__name__)
 
-REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
-celery_app = Celery('youtube_tasks', broker=REDIS_URL, backend=REDIS_URL)
-celery_app.conf.update(
-    task_serializer='json', result_serializer='json', accept_content=['json'],
-    timezone='Asia/Seoul', enable_utc=True, result_expires=3600 * 24, # 24시간 후 결과 만료
-    task_track_started=True,
-)
+WORKER_METRICS_PORT = int(os.environ.get('WORKER_METRICS_PORT', '0')) # 워커 /metrics(Prometheus) 포트 (0: 사용 안 함)
+
+# 작업 내 단계별 파이프라인(다운로드 → ffmpeg/태그) 설정
+PIPELINE_DOWNLOAD_WORKERS = max(1, int(os.environ.get('PIPELINE_DOWNLOAD_WORKERS', '1'))) # 동시에 다운로드하는 항목 수
+PIPELINE_POSTPROCESS_WORKERS = max(1, int(os.environ.get('PIPELINE_POSTPROCESS_WORKERS', '1'))) # 동시에 음성 변환/태그 처리하는 항목 수
+PIPELINE_MAX_PENDING = max(0, int(os.environ.get('PIPELINE_MAX_PENDING', '2'))) # 다운로드가 끝나고 후처리를 기다릴 수 있는 최대 항목 수
+DOWNLOAD_STAGE_SHARE = 0.9 # 항목 진행률 중 다운로드 단계가 차지하는 비율 (나머지는 후처리)
+
+# 음성만 다운로드 출력 방식(AUDIO_OUTPUT_MODES)은 task_app 참고
+_STREAM_COPY_FILTERS = {'m4a': '[acodec^=mp4a]', 'mp3': '[acodec=mp3]'} # 대상 컨테이너에 그대로 넣을 수 있는 코덱
 
-TEMP_DOWNLOAD_BASE_DIR = "task_temp_downloads"
-if not os.path.exists(TEMP_DOWNLOAD_BASE_DIR):
-    os.makedirs(TEMP_DOWNLOAD_BASE_DIR, exist_ok=True)
 
 def sanitize_filename_for_task(filename):
     filename = re.sub(r'[<>:"/\\|?*\x00-\x1f]', '', filename)
@@ -37,80 +64,32 @@ def add_album_art_for_task(audio_filepath, thumbnail_url, file_ext):
         return False # 성공 여부 반환
     task_id_log = celery_app.current_task.request.id if celery_app.current_task else 'N/A'
     try:
-        response = requests.get(thumbnail_url, stream=True, timeout=15)
-        response.raise_for_status()
-        image_data = response.content
+        if file_ext.lower() not in ['m4a', 'mp4', 'mp3']:
+            logger.info(f"Task {task_id_log}: 앨범 아트 미지원 형식: {file_ext} ({audio_filepath})")
+            return False
+        # 같은 썸네일은 한 번만 받아 축소한 JPEG 커버를 트랙/작업 간에 재사용
+        image_data = thumbnail_cache.get_cover(thumbnail_url)
         if file_ext.lower() in ['m4a', 'mp4']:
             audio = MP4(audio_filepath)
-            img_format = MP4Cover.FORMAT_JPEG
-            if thumbnail_url.lower().endswith(".png"): img_format = MP4Cover.FORMAT_PNG
-            audio['covr'] = [MP4Cover(image_data, imageformat=img_format)]
+            audio['covr'] = [MP4Cover(image_data, imageformat=MP4Cover.FORMAT_JPEG)]
             audio.save()
-        elif file_ext.lower() == 'mp3':
+        else:
             audio = ID3(audio_filepath)
-            mime_type = 'image/jpeg'
-            if thumbnail_url.lower().endswith(".png"): mime_type = 'image/png'
-            audio.add(APIC(encoding=3, mime=mime_type, type=3, desc='Cover', data=image_data))
+            audio.add(APIC(encoding=3, mime='image/jpeg', type=3, desc='Cover', data=image_data))
             audio.save(v2_version=3)
-        else:
-            logger.info(f"Task {task_id_log}: 앨범 아트 미지원 형식: {file_ext} ({audio_filepath})")
-            return False
         logger.info(f"Task {task_id_log}: 앨범 아트 추가됨: {audio_filepath}")
         return True
     except requests.RequestException as e:
         logger.error(f"Task {task_id_log}: 썸네일 다운로드 실패 ({thumbnail_url}): {e}")
+    except (ValueError, UnidentifiedImageError) as e: # 크기 제한 초과, 디코딩할 수 없는 이미지
+        logger.warning(f"Task {task_id_log}: 썸네일을 커버로 사용할 수 없음 ({thumbnail_url}): {e}")
     except Exception as e:
         logger.error(f"Task {task_id_log}: 앨범 아트 처리 오류 ({audio_filepath}): {e}", exc_info=True)
     return False
 
 
-def _update_task_meta(task_instance, status_message, progress_percent, new_log_message=None, 
-                      current_item_info_prefix="", newly_completed_file_info=None, all_completed_files_list=None):
-    """Celery 작업의 메타데이터(info)를 업데이트합니다."""
-    current_task_id = task_instance.request.id
-    
-    # 현재 로그 및 완료된 파일 목록 가져오기 (주의: 경쟁조건 가능성, 더 복잡한 큐/DB 사용 가능)
-    current_meta_snapshot = task_instance.AsyncResult(current_task_id).info
-    existing_logs = []
-    # all_completed_files는 이 함수 호출 시 인자로 받은 것을 사용 (누적)
-    
-    if isinstance(current_meta_snapshot, dict):
-        existing_logs = current_meta_snapshot.get('logs', [])
-        # all_completed_files는 외부에서 관리하고 전달받음
-    
-    full_status_message = f"{current_item_info_prefix}{status_message}" if current_item_info_prefix else status_message
-
-    if new_log_message:
-        log_entry = f"[{datetime.now().strftime('%H:%M:%S')}] {current_item_info_prefix}{new_log_message}"
-        if not existing_logs or existing_logs[-1] != log_entry:
-             existing_logs.append(log_entry)
-
-    new_meta = {
-        'status': full_status_message,
-        'progress': round(min(progress_percent, 99.99), 2), # 100%는 최종 완료 시에만
-        'logs': existing_logs[-50:], # 최근 50개 로그
-        'newly_completed_file': newly_completed_file_info, # 방금 완료된 파일 정보
-        'all_completed_files': all_completed_files_list if all_completed_files_list is not None else [] # 현재까지 완료된 모든 파일
-    }
-    task_instance.update_state(state='PROGRESS', meta=new_meta)
-
-
-@celery_app.task(bind=True)
-def download_video_task(self, celery_internal_task_id_arg_not_used,
-                        base_url, video_format_id, audio_format_id, audio_only,
-                        playlist_item_ids_or_urls, use_thumbnail_as_cover,
-                        title_override=None, thumbnail_url_override=None):
-    task_id = self.request.id
-    task_specific_temp_dir = os.path.join(TEMP_DOWNLOAD_BASE_DIR, str(task_id))
-    os.makedirs(task_specific_temp_dir, exist_ok=True)
-    
-    initial_log = f"작업 시작됨 (ID: {task_id}). 임시 폴더: {task_specific_temp_dir}"
-    logger.info(f"Task {task_id}: {initial_log}")
-    _update_task_meta(self, "작업 초기화 중...", 0, initial_log, all_completed_files_list=[])
-
-    # 이 리스트는 작업 전체에서 완료된 파일들을 누적합니다.
-    master_completed_files_list = [] 
-    
+def resolve_item_urls(base_url, playlist_item_ids_or_urls):
+    """선택된 플레이리스트 항목(ID 또는 URL)을 다운로드할 URL 목록으로 변환합니다 (항목이 없으면 base_url 하나)."""
     urls_to_process = []
     if playlist_item_ids_or_urls:
         for item_id_or_url in playlist_item_ids_or_urls:
@@ -120,27 +99,34 @@ def download_video_task(self, celery_internal_task_id_arg_not_used,
                 urls_to_process.append(f"https://www.youtube.com/watch?v={item_id_or_url}")
     else:
         urls_to_process.append(base_url)
+    return urls_to_process
 
-    total_items = len(urls_to_process)
-    current_item_progress_weight = 100.0 / total_items if total_items > 0 else 100.0
-    
-    # hook 함수가 urls_to_process와 task_id를 참조할 수 있도록 함
-    # nonlocal 대신, hook 함수를 download_video_task 내부에 정의하여 클로저로 사용
-    
+
+def load_flat_entries(base_url, playlist_item_ids_or_urls):
+    """/fetch_info에서 캐시된 플레이리스트 항목(flat) 정보를 ID/URL로 찾을 수 있게 반환합니다 (추출 없이 캐시만 조회)."""
+    flat_entries_by_key = {}
+    if playlist_item_ids_or_urls:
+        playlist_flat_info = info_cache.peek(base_url, 'flat')
+        if isinstance(playlist_flat_info, dict):
+            for flat_entry in playlist_flat_info.get('entries') or []:
+                if not flat_entry: continue
+                if flat_entry.get('id'): flat_entries_by_key[flat_entry['id']] = flat_entry
+                if flat_entry.get('url'): flat_entries_by_key[flat_entry['url']] = flat_entry
+    return flat_entries_by_key
+
+
+def make_progress_hook(publisher, current_item_idx_for_hook, total_items, to_overall_progress, cancel_token=None,
+                       throttle=None):
+    """항목 인덱스가 고정된 yt-dlp progress hook을 만듭니다 (hook의 info_dict URL로 항목을 찾지 않음).
+
+    cancel_token이 취소되면 hook에서 TaskCancelled를 발생시켜 진행 중인 다운로드를 중단합니다.
+    throttle(TaskThrottle)이 있으면 대역폭 예산만큼 hook에서 쉬고, 작업 처리량/허용 속도를 meta에 함께 기록합니다.
+    """
     def celery_progress_hook(d):
-        hook_url = None
-        if 'info_dict' in d:
-            hook_url = d['info_dict'].get('original_url') or d['info_dict'].get('webpage_url')
-
-        current_item_idx_for_hook = 0
-        if hook_url and total_items > 0:
-            try: current_item_idx_for_hook = urls_to_process.index(hook_url)
-            except ValueError:
-                logger.warning(f"Task {task_id}: Hook URL '{hook_url}' not in list. Using last known index.")
-                current_meta_fallback = self.AsyncResult(task_id).info
-                if isinstance(current_meta_fallback, dict):
-                    current_item_idx_for_hook = current_meta_fallback.get('current_item_index_being_processed', 0)
-        
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        if throttle is not None:
+            throttle.on_progress(d)
         hook_status_text = "진행 상태 알 수 없음"
         hook_item_progress_percent = 0
         current_dl_filename = os.path.basename(d.get('filename','')) if d.get('filename','').strip() and d.get('filename','').strip() != '-' else ""
@@ -148,7 +134,6 @@ def download_video_task(self, celery_internal_task_id_arg_not_used,
              current_dl_filename = os.path.basename(d['info_dict']['filename'])
 
         if d['status'] == 'downloading':
-            # ... (이전 hook의 다운로딩 상태 로직과 동일)
             total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
             downloaded_bytes = d.get('downloaded_bytes')
             if total_bytes and downloaded_bytes:
@@ -166,180 +151,852 @@ def download_video_task(self, celery_internal_task_id_arg_not_used,
             final_filepath = d.get('info_dict', {}).get('filepath') or d.get('filename')
             final_filename_log = os.path.basename(final_filepath) if final_filepath else current_dl_filename
             hook_status_text = f"{final_filename_log} 후처리(병합 등) 중..."
-            hook_item_progress_percent = 99.9 # 거의 완료 (아직 메인 루프에서 최종 처리 전)
+            hook_item_progress_percent = 99.9 # 거의 완료 (아직 항목 처리 함수에서 최종 처리 전)
 
-        progress_base = current_item_idx_for_hook * current_item_progress_weight
-        overall_progress_percent = progress_base + (hook_item_progress_percent / 100.0) * current_item_progress_weight
-        
         item_info_for_display = f"({current_item_idx_for_hook + 1}/{total_items}) " if total_items > 0 else ""
-        # hook에서는 newly_completed_file을 None으로 보내거나, yt-dlp의 finished 상태에서 파일 정보를 추출할 수 있다면 전달 가능
-        # 여기서는 메인 루프에서 파일 완료를 확정하고 newly_completed_file을 설정
-        _update_task_meta(self, hook_status_text, overall_progress_percent, hook_status_text, item_info_for_display, 
-                          newly_completed_file_info=None, # hook에서는 아직 최종 완료 파일 아님
-                          all_completed_files_list=master_completed_files_list)
+        # 'downloading' 상태는 status에만 반영해 간격에 맞춰 기록하고(로그 리스트에는 남기지 않음),
+        # 오류/다운로드 완료 같은 전환은 로그와 함께 즉시 기록. 파일 완료 확정은 항목 처리 함수에서 함
+        publisher.update(hook_status_text, to_overall_progress(hook_item_progress_percent), hook_status_text, item_info_for_display,
+                         newly_completed_file_info=None, # hook에서는 아직 최종 완료 파일 아님
+                         force=d['status'] != 'downloading', transient=d['status'] == 'downloading', hook=True,
+                         **(throttle.stats() if throttle is not None else {}))
 
+    return celery_progress_hook
 
-    for i, current_url in enumerate(urls_to_process):
-        item_info_prefix = f"({i + 1}/{total_items}) " if total_items > 0 else ""
-        base_progress_for_this_item_start = i * current_item_progress_weight
-        
-        # 현재 처리 중인 아이템 정보와 기본 진행률 업데이트
-        status_msg_item_processing = f"처리 시작: {os.path.basename(current_url)}"
-        self.update_state(state='PROGRESS', meta={
-            'status': f"{item_info_prefix}{status_msg_item_processing}",
-            'progress': round(base_progress_for_this_item_start, 2),
-            'logs': self.AsyncResult(task_id).info.get('logs', []), # 이전 로그 유지
-            'newly_completed_file': None, # 새 아이템 시작 시에는 없음
-            'all_completed_files': master_completed_files_list,
-            'current_item_index_being_processed': i # hook에서 폴백으로 사용
-        })
-        
-        log_msg_item_start_full = f"처리 시작: {current_url}"
-        logger.info(f"Task {task_id}: {item_info_prefix}{log_msg_item_start_full}")
-        _update_task_meta(self, f"정보 가져오는 중...", base_progress_for_this_item_start, log_msg_item_start_full, 
-                          item_info_prefix, newly_completed_file_info=None, all_completed_files_list=master_completed_files_list)
-
-        current_item_title_for_file = "제목_없음"
-        current_item_thumbnail_url_for_art = None
-        try:
-            with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'skip_download': True, 'noplaylist': True}) as ydl_item_info:
-                item_info_dict = ydl_item_info.extract_info(current_url, download=False)
-                current_item_title_for_file = item_info_dict.get("title", f"항목_{i+1}")
-                current_item_thumbnail_url_for_art = item_info_dict.get("thumbnail")
-        except Exception as e:
-            err_msg = f"항목 정보 가져오기 실패: {e}"
-            logger.warning(f"Task {task_id}: {item_info_prefix}{err_msg} ({current_url})")
-            _update_task_meta(self, "정보 가져오기 실패", base_progress_for_this_item_start, err_msg, item_info_prefix, 
-                              newly_completed_file_info=None, all_completed_files_list=master_completed_files_list)
-            if title_override and total_items > 1: current_item_title_for_file = f"{sanitize_filename_for_task(title_override)}_항목_{i+1}"
-            elif title_override: current_item_title_for_file = sanitize_filename_for_task(title_override)
-
-        sanitized_title = sanitize_filename_for_task(current_item_title_for_file)
-        output_template_pattern = os.path.join(task_specific_temp_dir, f"{sanitized_title}.%(ext)s")
-
-        ydl_opts = {
-            'quiet': False, 'no_warnings': True, 'outtmpl': output_template_pattern,
-            'progress_hooks': [celery_progress_hook], 'noplaylist': True, 'ignoreerrors': True,
-        }
-        if audio_only:
-            ydl_opts['format'] = audio_format_id or 'bestaudio[ext=m4a]/bestaudio[ext=mp3]/bestaudio/best'
-            ydl_opts['postprocessors'] = [{'key': 'FFmpegExtractAudio', 'preferredcodec': 'm4a', 'preferredquality': '192'}]
-            if audio_format_id and 'mp3' in audio_format_id.lower(): ydl_opts['postprocessors'][0]['preferredcodec'] = 'mp3'
+
+def resolve_audio_output_mode(requested_mode=None):
+    """요청된 음성 출력 방식을 검증합니다 (알 수 없는 값이면 AUDIO_OUTPUT_MODE_DEFAULT)."""
+    mode = (requested_mode or AUDIO_OUTPUT_MODE_DEFAULT or '').lower()
+    return mode if mode in AUDIO_OUTPUT_MODES else 'auto'
+
+
+def build_audio_format_selector(audio_format_id, target_codec, audio_output_mode):
+    """음성 출력 방식에 맞는 yt-dlp 포맷 선택자를 만듭니다.
+
+    auto에서는 선택한 포맷이 대상 컨테이너로 스트림 복사 가능하면 그대로, 아니면 복사 가능한 최고 음질 원본을
+    먼저 고르고, 둘 다 없을 때만 선택한 포맷(변환 필요)으로 돌아갑니다.
+    """
+    if audio_output_mode == 'native':
+        return f"{audio_format_id}/bestaudio/best" if audio_format_id else 'bestaudio/best'
+    if audio_output_mode == 'transcode':
+        return audio_format_id or 'bestaudio[ext=m4a]/bestaudio[ext=mp3]/bestaudio/best'
+    copy_filter = _STREAM_COPY_FILTERS[target_codec]
+    candidates = [f"{audio_format_id}{copy_filter}"] if audio_format_id else []
+    candidates += [f"bestaudio{copy_filter}", audio_format_id, 'bestaudio', 'best']
+    return '/'.join(candidate for candidate in candidates if candidate)
+
+
+def audio_conversion_action(source_acodec, target_codec):
+    """원본 음성 코덱을 대상 컨테이너로 옮길 때 스트림 복사('copy')인지 재인코딩('transcode')인지 반환합니다.
+
+    FFmpegExtractAudio와 같은 기준입니다 (AAC → m4a, 같은 코덱 → 복사).
+    """
+    codec = (source_acodec or '').split('.')[0].lower()
+    if codec in ('mp4a', 'aac') and target_codec == 'm4a':
+        return 'copy'
+    return 'copy' if codec == target_codec else 'transcode'
+
+
+def save_item_checkpoint(task_id, item_index, file_info):
+    """항목 완료를 작업 상태(Redis)에 기록합니다. 작업이 다시 실행되면 이 항목은 다운로드하지 않습니다."""
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.hset(task_checkpoint_key(task_id), str(item_index), json.dumps(file_info, ensure_ascii=False))
+    pipe.expire(task_checkpoint_key(task_id), TASK_DATA_TTL_SECONDS)
+    pipe.execute()
+
+
+def _checkpoint_if_file_present(task_specific_temp_dir, raw_file_info):
+    file_info = json.loads(raw_file_info)
+    return file_info if os.path.exists(os.path.join(task_specific_temp_dir, file_info['name'])) else None
+
+
+def load_item_checkpoints(task_id, task_specific_temp_dir):
+    """이전 실행에서 완료된 항목 중 파일이 폴더에 남아 있는 것을 {항목 인덱스: 완료 파일 정보}로 반환합니다."""
+    completed = {}
+    for raw_index, raw_file_info in get_redis().hgetall(task_checkpoint_key(task_id)).items():
+        file_info = _checkpoint_if_file_present(task_specific_temp_dir, raw_file_info)
+        if file_info:
+            completed[int(raw_index)] = file_info
+    return completed
+
+
+def load_item_checkpoint(task_id, task_specific_temp_dir, item_index):
+    raw_file_info = get_redis().hget(task_checkpoint_key(task_id), str(item_index))
+    return _checkpoint_if_file_present(task_specific_temp_dir, raw_file_info) if raw_file_info else None
+
+
+def partial_download_files(task_specific_temp_dir, sanitized_title):
+    """이전 실행이 남긴 이 항목의 .part 파일과 크기 {경로: 바이트} (yt-dlp가 이어받아 다운로드함)."""
+    part_sizes = {}
+    for part_path in glob.glob(os.path.join(glob.escape(task_specific_temp_dir), f"{glob.escape(sanitized_title)}.*part")):
+        try: part_sizes[part_path] = os.path.getsize(part_path)
+        except OSError: pass
+    return part_sizes
+
+
+def make_postprocessor_timing_hook():
+    """yt-dlp 후처리기(영상/음성 병합 등) 실행 시간을 task_stage_duration_seconds{stage="merge"}에 기록하는 hook.
+
+    hook.elapsed_seconds에 누적 시간이 남아 다운로드 시간에서 병합 시간을 뺄 수 있습니다.
+    """
+    started_at = {}
+
+    def hook(d):
+        postprocessor_name = d.get('postprocessor')
+        if d.get('status') == 'started':
+            started_at[postprocessor_name] = time.perf_counter()
+        elif d.get('status') == 'finished' and postprocessor_name in started_at:
+            elapsed = time.perf_counter() - started_at.pop(postprocessor_name)
+            hook.elapsed_seconds += elapsed
+            metrics.observe('task_stage_duration_seconds', elapsed, stage='merge' if postprocessor_name == 'Merger' else 'postprocess')
+    hook.elapsed_seconds = 0.0
+    return hook
+
+
+def record_download_metrics(elapsed_seconds, downloaded_bytes):
+    """네트워크 다운로드 한 건의 시간/크기/속도를 기록합니다 (다운로드 캐시에서 가져온 항목은 제외)."""
+    elapsed_seconds = max(elapsed_seconds, 0.0)
+    metrics.observe('task_stage_duration_seconds', elapsed_seconds, stage='download')
+    if downloaded_bytes > 0:
+        metrics.observe('download_item_bytes', downloaded_bytes, buckets=metrics.BYTES_BUCKETS)
+        if elapsed_seconds > 0:
+            metrics.observe('download_item_throughput_bytes_per_second', downloaded_bytes / elapsed_seconds,
+                            buckets=metrics.THROUGHPUT_BUCKETS)
+
+
+def download_item_stage(publisher, task_id, task_specific_temp_dir, item_index, total_items, current_url,
+                        item_options, flat_entry=None, to_overall_progress=None, cancel_token=None, throttle=None):
+    """항목 처리 1단계(네트워크): 정보 조회 → 다운로드 캐시 확인 → 다운로드(영상은 병합까지).
+
+    성공하면 2단계(postprocess_item_stage)에 넘길 dict를, 실패하면 로그를 남기고 None을 반환합니다.
+    음성 추출(ffmpeg)과 앨범 커버는 2단계에서 처리하므로, 이 단계의 진행률은 항목의 DOWNLOAD_STAGE_SHARE까지입니다.
+    작업이 취소되면 TaskCancelled가 그대로 전파됩니다.
+    """
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    if to_overall_progress is None:
+        to_overall_progress = lambda item_percent: item_percent
+    download_progress = lambda item_percent: to_overall_progress(item_percent * DOWNLOAD_STAGE_SHARE)
+    audio_only = item_options.get('audio_only')
+    video_format_id = item_options.get('video_format_id')
+    audio_format_id = item_options.get('audio_format_id')
+    title_override = item_options.get('title_override')
+
+    i = item_index
+    item_info_prefix = f"({i + 1}/{total_items}) " if total_items > 0 else ""
+    base_progress_for_this_item_start = to_overall_progress(0)
+
+    # 현재 처리 중인 아이템 정보와 기본 진행률 업데이트
+    # (새 아이템 시작 시 newly_completed_file은 None, 현재 항목 인덱스도 meta에 함께 기록)
+    log_msg_item_start_full = f"처리 시작: {current_url}"
+    logger.info(f"Task {task_id}: {item_info_prefix}{log_msg_item_start_full}")
+    publisher.update("정보 가져오는 중...", base_progress_for_this_item_start, log_msg_item_start_full,
+                     item_info_prefix, newly_completed_file_info=None, force=True,
+                     current_item_index_being_processed=i)
+
+    current_item_title_for_file = "제목_없음"
+    current_item_thumbnail_url_for_art = None
+    item_info_dict = None # 한 번만 추출한 항목 정보 (다운로드에 그대로 사용)
+    try:
+        # /fetch_info에서 이미 추출했다면 공유 캐시에서 바로 가져옴.
+        # process_ie_result가 info dict를 수정하므로 캐시와 공유되지 않도록 복사본 사용
+        with metrics.timer('task_stage_duration_seconds', stage='info'):
+            item_info_dict = copy.deepcopy(extract_info_cached(current_url, 'single'))
+        current_item_title_for_file = item_info_dict.get("title", f"항목_{i+1}")
+        current_item_thumbnail_url_for_art = item_info_dict.get("thumbnail")
+    except Exception as e:
+        metrics.inc('task_stage_failures_total', stage='info')
+        err_msg = f"항목 정보 가져오기 실패: {e}"
+        logger.warning(f"Task {task_id}: {item_info_prefix}{err_msg} ({current_url})")
+        publisher.update("정보 가져오기 실패", base_progress_for_this_item_start, err_msg, item_info_prefix,
+                         newly_completed_file_info=None, force=True)
+        if flat_entry and flat_entry.get("title"):
+            # 플레이리스트 flat 항목에 제목이 있으면 파일명/앨범 커버에 재사용
+            current_item_title_for_file = flat_entry["title"]
+            current_item_thumbnail_url_for_art = flat_entry.get("thumbnail") or ((flat_entry.get("thumbnails") or [{}])[-1]).get("url")
+        elif title_override and total_items > 1: current_item_title_for_file = f"{sanitize_filename_for_task(title_override)}_항목_{i+1}"
+        elif title_override: current_item_title_for_file = sanitize_filename_for_task(title_override)
+
+    sanitized_title = sanitize_filename_for_task(current_item_title_for_file)
+    output_template_pattern = os.path.join(task_specific_temp_dir, f"{sanitized_title}.%(ext)s")
+
+    merge_timing_hook = make_postprocessor_timing_hook()
+    ydl_opts = {
+        'quiet': False, 'no_warnings': True, 'outtmpl': output_template_pattern,
+        'progress_hooks': [make_progress_hook(publisher, i, total_items, download_progress, cancel_token, throttle)],
+        'postprocessor_hooks': [merge_timing_hook],
+        'noplaylist': True, 'ignoreerrors': True,
+        'continuedl': True, # 이전 실행이 남긴 .part 파일은 처음부터 받지 않고 이어받음
+        'concurrent_fragment_downloads': DOWNLOAD_CONCURRENT_FRAGMENTS, # DASH/HLS 조각 병렬 다운로드
+    }
+    audio_output_mode = resolve_audio_output_mode(item_options.get('audio_output_mode')) if audio_only else None
+    if audio_only:
+        target_codec = 'mp3' if audio_format_id and 'mp3' in audio_format_id.lower() else 'm4a'
+        ydl_opts['format'] = build_audio_format_selector(audio_format_id, target_codec, audio_output_mode)
+        if audio_output_mode != 'native': # native는 원본 컨테이너 그대로 (ffmpeg 미사용)
+            ydl_opts['postprocessors'] = [{'key': 'FFmpegExtractAudio', 'preferredcodec': target_codec, 'preferredquality': '192'}]
+    else:
+        selected_format = "bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best"
+        if video_format_id and audio_format_id: selected_format = f"{video_format_id}+{audio_format_id}/{selected_format}"
+        elif video_format_id: selected_format = f"{video_format_id}/{selected_format}"
+        ydl_opts['format'] = selected_format
+        ydl_opts['merge_output_format'] = 'mp4'
+
+    actual_downloaded_filepath = None
+    want_cover_art = bool(audio_only and item_options.get('use_thumbnail_as_cover') and current_item_thumbnail_url_for_art)
+    cache_claim = None
+    result_info = None
+    try:
+        # 같은 영상/포맷/후처리 결과가 다운로드 캐시에 있으면 네트워크/ffmpeg 작업 없이 작업 폴더로 가져옴.
+        # 다른 작업이 같은 항목을 다운로드 중이면 그 결과를 기다림
+        cache_key = build_cache_key(item_info_dict, ydl_opts, audio_only, want_cover_art) if item_info_dict is not None else None
+        cache_claim = download_cache.claim(cache_key, on_wait=lambda: publisher.update(
+            "동일 항목 다운로드 대기 중...", base_progress_for_this_item_start, "다른 작업이 같은 항목을 다운로드 중이므로 완료를 기다립니다.",
+            item_info_prefix, newly_completed_file_info=None, force=True), owner=f"{task_id}:{i}")
+        if cache_claim.cached_path:
+            actual_downloaded_filepath = os.path.join(task_specific_temp_dir, f"{sanitized_title}{os.path.splitext(cache_claim.cached_path)[1]}")
+            link_mode = materialize(cache_claim.cached_path, actual_downloaded_filepath)
+            publisher.add_log(f"다운로드 캐시에서 가져옴 ({'하드링크' if link_mode == 'link' else '복사'})", item_info_prefix)
         else:
-            selected_format = "bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best"
-            if video_format_id and audio_format_id: selected_format = f"{video_format_id}+{audio_format_id}/{selected_format}"
-            elif video_format_id: selected_format = f"{video_format_id}/{selected_format}"
-            ydl_opts['format'] = selected_format
-            ydl_opts['merge_output_format'] = 'mp4'
-        
-        actual_downloaded_filepath = None
-        newly_completed_file_this_iteration = None # 이번 반복에서 완료된 파일 정보
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                result_info = ydl.extract_info(current_url, download=True) 
+            resumed_part_sizes = partial_download_files(task_specific_temp_dir, sanitized_title)
+            resumed_bytes = sum(resumed_part_sizes.values())
+            if throttle is not None:
+                throttle.expect_resumed(resumed_part_sizes) # 이어받은 부분은 처리량/대역폭 예산에서 제외
+            if resumed_bytes:
+                publisher.add_log(f"이전 실행의 부분 다운로드 이어받기 ({resumed_bytes / 1024 / 1024:.1f} MB)", item_info_prefix)
+                metrics.inc('download_resumed_bytes_total', resumed_bytes)
+            # 음성 추출은 2단계에서 실행하도록 다운로드 옵션에서는 제외 (캐시 키에는 포함)
+            download_opts = {key: value for key, value in ydl_opts.items() if key != 'postprocessors'}
+            download_started = time.perf_counter()
+            with ydl_pool.acquire(download_opts) as ydl: # 같은 옵션의 인스턴스/HTTP 연결 재사용
+                if item_info_dict is not None:
+                    # 이미 추출한 정보로 바로 포맷 선택/다운로드 (재추출 없음)
+                    result_info = ydl.process_ie_result(item_info_dict, download=True)
+                else:
+                    # 정보 추출에 실패한 경우에만 기존처럼 추출+다운로드를 한 번에 시도
+                    result_info = ydl.extract_info(current_url, download=True)
                 if result_info:
                     actual_downloaded_filepath = result_info.get('filepath') or result_info.get('_filename')
                     if not actual_downloaded_filepath and result_info.get('requested_downloads'):
                         dl_info_list = result_info.get('requested_downloads', [])
                         if dl_info_list: actual_downloaded_filepath = dl_info_list[0].get('filepath') or dl_info_list[0].get('_filename')
-            
             if actual_downloaded_filepath and os.path.exists(actual_downloaded_filepath):
-                actual_filename = os.path.basename(actual_downloaded_filepath)
-                newly_completed_file_this_iteration = {"name": actual_filename, "task_id": str(task_id)}
-                master_completed_files_list.append(newly_completed_file_this_iteration) # 전체 완료 목록에 추가
-
-                log_dl_complete = f"항목 완료: {actual_filename}"
-                logger.info(f"Task {task_id}: {item_info_prefix}{log_dl_complete}")
-                
-                # 현재 아이템 완료 시, 진행률 업데이트하고 newly_completed_file 정보 전달
-                current_item_final_progress = base_progress_for_this_item_start + current_item_progress_weight
-                _update_task_meta(self, f"완료: {actual_filename}", current_item_final_progress, log_dl_complete, 
-                                  item_info_prefix, newly_completed_file_info=newly_completed_file_this_iteration, 
-                                  all_completed_files_list=master_completed_files_list)
-
-                if audio_only and use_thumbnail_as_cover and current_item_thumbnail_url_for_art:
-                    log_album_art_start = f"앨범 커버 추가 시도: {actual_filename}"
-                    _update_task_meta(self, f"앨범 커버 추가 중...", current_item_final_progress, log_album_art_start, 
-                                      item_info_prefix, newly_completed_file_info=None, # 앨범아트 추가중에는 새 파일 완료 아님
-                                      all_completed_files_list=master_completed_files_list)
-                    art_added = add_album_art_for_task(actual_downloaded_filepath, current_item_thumbnail_url_for_art, os.path.splitext(actual_filename)[1].lstrip('.'))
-                    art_log_msg = f"앨범 커버 추가됨: {actual_filename}" if art_added else f"앨범 커버 추가 실패 또는 미지원 ({actual_filename})"
-                    _update_task_meta(self, f"앨범 커버 처리 완료", current_item_final_progress, art_log_msg, 
-                                      item_info_prefix, newly_completed_file_info=None,
-                                      all_completed_files_list=master_completed_files_list)
+                # 영상 병합(ffmpeg)은 process_ie_result 안에서 실행되므로 병합 시간은 빼고 기록
+                record_download_metrics(time.perf_counter() - download_started - merge_timing_hook.elapsed_seconds,
+                                        os.path.getsize(actual_downloaded_filepath) - resumed_bytes)
+
+        if actual_downloaded_filepath and os.path.exists(actual_downloaded_filepath):
+            publisher.update(f"다운로드 완료: {os.path.basename(actual_downloaded_filepath)}", download_progress(100),
+                             f"다운로드 완료, 후처리 대기: {os.path.basename(actual_downloaded_filepath)}", item_info_prefix)
+            downloaded = {
+                'task_id': task_id, 'item_index': i, 'item_info_prefix': item_info_prefix,
+                'filepath': actual_downloaded_filepath, 'from_cache': bool(cache_claim.cached_path),
+                'media_info': {key: (result_info or {}).get(key) for key in ('ext', 'vcodec', 'acodec')},
+                'audio_postprocessors': [] if cache_claim.cached_path else ydl_opts.get('postprocessors', []),
+                'audio_output_mode': audio_output_mode,
+                'want_cover_art': want_cover_art, 'thumbnail_url': current_item_thumbnail_url_for_art,
+                'cache_claim': cache_claim, 'to_overall_progress': to_overall_progress,
+                'cancel_token': cancel_token,
+            }
+            cache_claim = None # 잠금 해제는 2단계에서 캐시에 저장한 뒤에
+            return downloaded
+
+        metrics.inc('task_stage_failures_total', stage='download')
+        log_file_not_found = "오류: 파일 경로를 찾을 수 없습니다."
+        logger.error(f"Task {task_id}: {item_info_prefix}{log_file_not_found} (URL: {current_url}). Result: {result_info}")
+        publisher.update("파일 경로 오류", base_progress_for_this_item_start, log_file_not_found,
+                         item_info_prefix, newly_completed_file_info=None, force=True)
+
+    except TaskCancelled:
+        raise
+    except yt_dlp.utils.DownloadError as de:
+        metrics.inc('task_stage_failures_total', stage='download')
+        err_msg_dl = f"다운로드 오류: {str(de)}"
+        logger.error(f"Task {task_id}: {item_info_prefix}yt-dlp DownloadError for {current_url}: {de}")
+        publisher.update("다운로드 오류", base_progress_for_this_item_start, err_msg_dl,
+                         item_info_prefix, newly_completed_file_info=None, force=True)
+    except Exception as e:
+        metrics.inc('task_stage_failures_total', stage='download')
+        err_msg_general = f"일반 오류: {str(e)}"
+        logger.error(f"Task {task_id}: {item_info_prefix}General error for {current_url}: {e}", exc_info=True)
+        publisher.update("일반 오류", base_progress_for_this_item_start, err_msg_general,
+                         item_info_prefix, newly_completed_file_info=None, force=True)
+    finally:
+        if cache_claim: cache_claim.release() # 같은 항목을 기다리는 다른 작업이 진행할 수 있도록 잠금 해제
+    return None
+
+
+def extract_audio_for_task(filepath, media_info, postprocessor_opts):
+    """다운로드된 파일에서 음성을 추출/변환합니다 (yt-dlp FFmpegExtractAudio를 다운로드와 분리해 실행). 새 경로 반환."""
+    pp_options = {key: value for key, value in postprocessor_opts.items() if key != 'key'}
+    information = {'filepath': filepath, 'ext': media_info.get('ext') or os.path.splitext(filepath)[1].lstrip('.'),
+                   'vcodec': media_info.get('vcodec'), 'acodec': media_info.get('acodec')}
+    with metrics.timer('task_stage_duration_seconds', stage='audio_extract'), \
+            ydl_pool.acquire({'quiet': True, 'no_warnings': True}) as pp_ydl:
+        files_to_delete, information = FFmpegExtractAudioPP(pp_ydl, **pp_options).run(information)
+    for obsolete_path in files_to_delete: # 변환 전 원본 (yt-dlp가 keepvideo 없이 하는 정리와 동일)
+        try: os.remove(obsolete_path)
+        except FileNotFoundError: pass
+    return information['filepath']
+
+
+def postprocess_item_stage(publisher, downloaded):
+    """항목 처리 2단계(CPU/후처리): 음성 추출(ffmpeg) → 앨범 커버 → 다운로드 캐시 저장 후 완료 파일로 등록합니다.
+
+    완료된 파일 정보(dict) 또는 None을 반환합니다. 1단계에서 받은 캐시 잠금은 여기서 해제합니다.
+    """
+    task_id = downloaded['task_id']
+    item_info_prefix = downloaded['item_info_prefix']
+    to_overall_progress = downloaded['to_overall_progress']
+    cache_claim = downloaded['cache_claim']
+    cancel_token = downloaded.get('cancel_token')
+    actual_downloaded_filepath = downloaded['filepath']
+    try:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        source_acodec = downloaded['media_info'].get('acodec')
+        for postprocessor_opts in downloaded['audio_postprocessors']:
+            action = audio_conversion_action(source_acodec, postprocessor_opts['preferredcodec'])
+            action_text = "스트림 복사" if action == 'copy' else "재인코딩"
+            publisher.update(f"음성 {action_text} 중...", to_overall_progress(DOWNLOAD_STAGE_SHARE * 100),
+                             f"음성 추출 시작: {os.path.basename(actual_downloaded_filepath)}", item_info_prefix)
+            if cancel_token is not None:
+                with cancel_token.kill_children_on_cancel(actual_downloaded_filepath): # 취소되면 ffmpeg를 바로 종료
+                    actual_downloaded_filepath = extract_audio_for_task(actual_downloaded_filepath, downloaded['media_info'], postprocessor_opts)
+                cancel_token.raise_if_cancelled()
             else:
-                log_file_not_found = f"오류: 파일 경로를 찾을 수 없습니다."
-                logger.error(f"Task {task_id}: {item_info_prefix}{log_file_not_found} (URL: {current_url}). Result: {result_info}")
-                _update_task_meta(self, "파일 경로 오류", base_progress_for_this_item_start, log_file_not_found, 
-                                  item_info_prefix, newly_completed_file_info=None, all_completed_files_list=master_completed_files_list)
-
-        except yt_dlp.utils.DownloadError as de:
-            err_msg_dl = f"다운로드 오류: {str(de)}"
-            logger.error(f"Task {task_id}: {item_info_prefix}yt-dlp DownloadError for {current_url}: {de}")
-            _update_task_meta(self, "다운로드 오류", base_progress_for_this_item_start, err_msg_dl, 
-                              item_info_prefix, newly_completed_file_info=None, all_completed_files_list=master_completed_files_list)
+                actual_downloaded_filepath = extract_audio_for_task(actual_downloaded_filepath, downloaded['media_info'], postprocessor_opts)
+            publisher.add_log(f"음성 {action_text} 완료 ({source_acodec or '알 수 없는 코덱'} → {postprocessor_opts['preferredcodec']})", item_info_prefix)
+            metrics.inc('audio_postprocess_total', action=action)
+        if downloaded['audio_output_mode'] == 'native' and not downloaded['from_cache']:
+            publisher.add_log(f"원본 컨테이너 그대로 전달 ({os.path.splitext(actual_downloaded_filepath)[1].lstrip('.')}, {source_acodec or '알 수 없는 코덱'})", item_info_prefix)
+            metrics.inc('audio_postprocess_total', action='native')
+
+        actual_filename = os.path.basename(actual_downloaded_filepath)
+        art_added = False
+        if downloaded['want_cover_art'] and not downloaded['from_cache']: # 캐시된 파일에는 이미 앨범 커버가 들어 있음
+            log_album_art_start = f"앨범 커버 추가 시도: {actual_filename}"
+            publisher.update("앨범 커버 추가 중...", to_overall_progress(DOWNLOAD_STAGE_SHARE * 100), log_album_art_start,
+                             item_info_prefix, newly_completed_file_info=None)
+            with metrics.timer('task_stage_duration_seconds', stage='album_art'):
+                art_added = add_album_art_for_task(actual_downloaded_filepath, downloaded['thumbnail_url'], os.path.splitext(actual_filename)[1].lstrip('.'))
+            if not art_added:
+                metrics.inc('task_stage_failures_total', stage='album_art')
+            art_log_msg = f"앨범 커버 추가됨: {actual_filename}" if art_added else f"앨범 커버 추가 실패 또는 미지원 ({actual_filename})"
+            publisher.add_log(art_log_msg, item_info_prefix)
+        if not downloaded['want_cover_art'] or art_added:
+            # 캐시 파일은 작업 폴더의 파일과 하드링크되므로 이후 내용이 바뀌는 처리는 모두 끝난 뒤에 저장
+            cache_claim.store(actual_downloaded_filepath)
+        storage_janitor.record_write(task_id, actual_downloaded_filepath) # 폴더 크기 반영 (디스크 사용률 초과 시 즉시 정리)
+
+        # 후처리까지 끝난 뒤에 완료 파일로 등록 (클라이언트 자동 다운로드가 변환/태그 전 파일을 받지 않도록)
+        newly_completed_file_this_iteration = {"name": actual_filename, "task_id": str(task_id)}
+        log_dl_complete = f"항목 완료: {actual_filename}"
+        logger.info(f"Task {task_id}: {item_info_prefix}{log_dl_complete}")
+        # 체크포인트를 먼저 기록: 그 사이 워커가 종료되면 다시 실행할 때 리스트에 빠진 파일만 채움 (restore_missing_files)
+        save_item_checkpoint(task_id, downloaded['item_index'], newly_completed_file_this_iteration)
+        publisher.update(f"완료: {actual_filename}", to_overall_progress(100), log_dl_complete,
+                         item_info_prefix, newly_completed_file_info=newly_completed_file_this_iteration)
+        return newly_completed_file_this_iteration
+    except TaskCancelled:
+        raise
+    except Exception as e:
+        if cancel_token is not None and cancel_token.is_cancelled(): # 취소로 ffmpeg가 종료되어 난 오류
+            raise TaskCancelled("작업이 취소되었습니다.") from e
+        metrics.inc('task_stage_failures_total', stage='postprocess')
+        err_msg_pp = f"후처리 오류: {str(e)}"
+        logger.error(f"Task {task_id}: {item_info_prefix}Postprocess error for {actual_downloaded_filepath}: {e}", exc_info=True)
+        publisher.update("후처리 오류", to_overall_progress(100), err_msg_pp,
+                         item_info_prefix, newly_completed_file_info=None, force=True)
+        return None
+    finally:
+        cache_claim.release() # 같은 항목을 기다리는 다른 작업이 진행할 수 있도록 잠금 해제
+
+
+def download_single_item(publisher, task_id, task_specific_temp_dir, item_index, total_items, current_url,
+                         item_options, flat_entry=None, to_overall_progress=None, cancel_token=None, throttle=None):
+    """항목 하나를 두 단계(다운로드 → 후처리) 모두 이어서 처리하고, 완료된 파일 정보(dict) 또는 None을 반환합니다.
+
+    병렬 하위 작업(download_playlist_item_task)과 단일 항목 작업이 사용합니다.
+    to_overall_progress는 항목 진행률(0~100)을 publisher에 전달할 진행률로 변환하는 함수입니다.
+    """
+    if to_overall_progress is None:
+        to_overall_progress = lambda item_percent: item_percent
+    downloaded = download_item_stage(publisher, task_id, task_specific_temp_dir, item_index, total_items, current_url,
+                                     item_options, flat_entry, to_overall_progress, cancel_token, throttle)
+    if downloaded is None:
+        return None
+    return postprocess_item_stage(publisher, downloaded)
+
+
+def run_item_pipeline(publisher, task_id, task_specific_temp_dir, urls_to_process, item_options, flat_entries,
+                      skip_item_indexes=(), cancel_token=None, throttle=None):
+    """여러 항목을 다운로드 단계와 후처리 단계로 나눠, 단계별 제한된 스레드 풀에서 겹쳐 실행합니다.
+
+    항목 i의 음성 변환/태그 작업이 후처리 풀에서 도는 동안 다음 항목이 다운로드 풀에서 다운로드됩니다.
+    다운로드가 끝나고 후처리를 기다리는 항목은 PIPELINE_MAX_PENDING개로 제한해 디스크 사용이 앞서 나가지 않게 합니다.
+    전체 진행률은 항목별 진행률의 평균입니다 (여러 항목이 동시에 진행되어도 되돌아가지 않음).
+    skip_item_indexes(이전 실행에서 완료된 항목)는 처리하지 않고 완료된 것으로 계산합니다.
+    cancel_token이 취소되면 새 항목을 시작하지 않고, 진행 중인 항목이 멈춘 뒤 TaskCancelled를 발생시킵니다.
+    """
+    total_items = len(urls_to_process)
+    item_progress = [100.0 if item_index in skip_item_indexes else 0.0 for item_index in range(total_items)]
+    progress_lock = threading.Lock()
+
+    def make_item_progress(item_index):
+        def to_overall_progress(item_percent):
+            with progress_lock:
+                item_progress[item_index] = max(item_progress[item_index], item_percent)
+                return sum(item_progress) / total_items
+        return to_overall_progress
+
+    in_flight_slots = threading.BoundedSemaphore(PIPELINE_DOWNLOAD_WORKERS + PIPELINE_MAX_PENDING)
+    postprocess_futures = []
+
+    def run_postprocess(downloaded):
+        try:
+            postprocess_item_stage(publisher, downloaded)
+        finally:
+            in_flight_slots.release()
+
+    def run_download(item_index, current_url):
+        handed_off = False
+        try:
+            to_overall_progress = make_item_progress(item_index)
+            downloaded = download_item_stage(publisher, task_id, task_specific_temp_dir, item_index, total_items, current_url,
+                                             item_options, flat_entries[item_index], to_overall_progress, cancel_token,
+                                             throttle)
+            if downloaded is None:
+                to_overall_progress(100) # 실패한 항목도 처리 끝으로 계산
+                return
+            postprocess_futures.append(postprocess_pool.submit(run_postprocess, downloaded))
+            handed_off = True
+        finally:
+            if not handed_off:
+                in_flight_slots.release()
+
+    with ThreadPoolExecutor(PIPELINE_POSTPROCESS_WORKERS, thread_name_prefix=f"pp-{task_id}") as postprocess_pool, \
+         ThreadPoolExecutor(PIPELINE_DOWNLOAD_WORKERS, thread_name_prefix=f"dl-{task_id}") as download_pool:
+        download_futures = []
+        stopped_by_cancel = False
+        for item_index, current_url in enumerate(urls_to_process):
+            if item_index in skip_item_indexes:
+                continue
+            in_flight_slots.acquire() # 후처리 대기 항목이 많으면 다음 다운로드 시작을 미룸
+            if cancel_token is not None and cancel_token.is_cancelled():
+                in_flight_slots.release()
+                stopped_by_cancel = True
+                break
+            download_futures.append(download_pool.submit(run_download, item_index, current_url))
+        for future in download_futures:
+            future.result()
+        for future in postprocess_futures:
+            future.result()
+    if stopped_by_cancel:
+        raise TaskCancelled("작업이 취소되었습니다.")
+
+
+def cleanup_cancelled_task(task_id, task_specific_temp_dir, completed_files, total_items):
+    """취소된 작업 정리: 남은 자식 프로세스(ffmpeg 등)를 종료하고 완료되지 않은 부분 파일을 삭제합니다.
+
+    이미 완료된 파일은 그대로 두어 내려받을 수 있게 합니다. 작업 로그/REVOKED 결과에 쓸 메시지를 반환합니다.
+    """
+    kill_child_processes(task_specific_temp_dir)
+    removed_count = remove_partial_files(task_specific_temp_dir, {file_info['name'] for file_info in completed_files})
+    storage_janitor.mark_finished(task_id)
+    metrics.inc('task_cancelled_total')
+    cancel_msg = f"작업 취소됨 (완료된 파일 {len(completed_files)}/{total_items}개 유지, 부분 파일 {removed_count}개 삭제)"
+    logger.info(f"Task {task_id}: {cancel_msg}")
+    return cancel_msg
+
+
+@worker_init.connect
+def preload_worker(sender=None, **kwargs):
+    """워커 본 프로세스가 풀(prefork 자식)을 시작하기 전에 무거운 모듈을 미리 로드하고 fork 공유를 위해 고정합니다."""
+    if startup.WORKER_PRELOAD:
+        try:
+            startup.preload_worker_modules()
         except Exception as e:
-            err_msg_general = f"일반 오류: {str(e)}"
-            logger.error(f"Task {task_id}: {item_info_prefix}General error for {current_url}: {e}", exc_info=True)
-            _update_task_meta(self, "일반 오류", base_progress_for_this_item_start, err_msg_general, 
-                              item_info_prefix, newly_completed_file_info=None, all_completed_files_list=master_completed_files_list)
-        
-        # 각 아이템 루프 후, newly_completed_file을 None으로 초기화하여 다음 폴링 시 중복 처리 방지
-        # (하지만 _update_task_meta 호출 시마다 newly_completed_file을 명시적으로 전달하므로 이 방식이 더 안전)
-        if newly_completed_file_this_iteration:
-             # 바로 다음 업데이트에서 newly_completed_file을 None으로 설정하여 클라이언트가 한 번만 받도록 함
-             # (또는 클라이언트가 처리했음을 서버에 알리는 방식도 가능)
-             # 여기서는 간단히 다음 _update_task_meta 호출 시 None으로 전달.
-             # 하지만 루프 다음 반복 시작 시 update_state에서 None으로 설정됨.
-             pass
+            logger.warning(f"워커 모듈 사전 로드 실패 (첫 작업에서 로드): {e}")
+        startup.freeze_for_fork()
+    if WORKER_METRICS_PORT > 0:
+        metrics.enable_child_export() # prefork 자식의 메트릭을 본 프로세스 exporter가 합산하도록 fork 전에 준비
+
+
+@worker_process_init.connect
+def start_child_metrics_export(sender=None, **kwargs):
+    """prefork 자식 프로세스: 자기 메트릭을 본 프로세스의 /metrics가 읽을 파일로 기록하기 시작합니다."""
+    metrics.start_child_export()
+
+
+@worker_process_shutdown.connect
+def flush_child_metrics_export(sender=None, **kwargs):
+    metrics.write_child_export()
+
+
+@worker_ready.connect
+def start_worker_metrics_exporter(sender=None, **kwargs):
+    """워커 프로세스의 단계별 시간/카운터를 Prometheus가 수집할 수 있도록 /metrics를 엽니다.
+
+    eventlet/threads 풀은 본 프로세스의 메트릭을, prefork 풀은 자식 프로세스들이 작업마다 기록한 파일을 합산해 응답합니다.
+    """
+    startup.log_startup_profile('worker')
+    if WORKER_METRICS_PORT > 0:
+        try:
+            metrics.start_http_exporter(WORKER_METRICS_PORT)
+        except OSError as e:
+            logger.warning(f"워커 메트릭 exporter 시작 실패 (포트 {WORKER_METRICS_PORT}): {e}")
+
+
+def task_queue_name(request):
+    return (request.delivery_info or {}).get('routing_key') or celery_app.conf.task_default_queue
 
 
+def enter_worker_slot(task_instance, client_id, slot_id=None):
+    """다운로드 작업 시작 시 호출: 클라이언트 슬롯을 잡고 큐 대기 시간을 기록합니다.
+
+    클라이언트가 이미 CLIENT_MAX_RUNNING_SLOTS개 작업을 실행 중이면 잠시 뒤 같은 큐에 다시 넣어(retry)
+    워커를 다른 클라이언트에게 양보합니다. 병렬 작업의 하위 작업은 slot_id(job ID)로 job 전체가 슬롯 하나를 함께 사용합니다.
+    CLIENT_SLOT_MAX_RETRIES번 양보한 작업은 더 기다리지 않고 슬롯 없이 실행합니다.
+    슬롯 해제는 작업이 어떻게 끝나든 task_postrun에서 처리합니다.
+    """
+    request = task_instance.request
+    if not acquire_client_slot(client_id, slot_id or request.id):
+        if request.retries < CLIENT_SLOT_MAX_RETRIES:
+            logger.info(f"Task {request.id}: 클라이언트 {client_id}의 동시 실행 한도 도달, {CLIENT_SLOT_RETRY_SECONDS}초 후 다시 시도")
+            metrics.inc('client_slot_deferrals_total')
+            raise task_instance.retry(countdown=CLIENT_SLOT_RETRY_SECONDS, max_retries=CLIENT_SLOT_MAX_RETRIES)
+        logger.warning(f"Task {request.id}: 클라이언트 {client_id} 슬롯 대기 {request.retries}회 초과, 슬롯 없이 실행")
+        metrics.inc('client_slot_overrides_total')
+    record_job_started(task_queue_name(request), request.id, getattr(request, 'enqueued_at', None))
+
+
+@task_postrun.connect
+def leave_worker_slot(sender=None, task_id=None, task=None, args=None, kwargs=None, **extra):
+    if task is None or task.name not in _SLOT_TASK_NAMES:
+        return
+    if task.name == DOWNLOAD_PLAYLIST_ITEM_TASK:
+        # job 전체가 함께 쓰는 슬롯은 마지막 하위 작업이 끝나 남은 항목 카운터가 지워진 뒤에 해제
+        job_id = (kwargs or {}).get('job_id') or (args[0] if args else None)
+        if job_id and not get_redis().exists(task_remaining_key(job_id)):
+            release_client_slot((kwargs or {}).get('client_id'), job_id)
+    else:
+        release_client_slot((kwargs or {}).get('client_id'), task_id)
+    try:
+        record_job_finished(task_queue_name(task.request), task_id)
+    except Exception as e:
+        logger.warning(f"Task {task_id}: 큐 실행 목록 정리 실패: {e}")
+
+
+@task_postrun.connect
+def export_child_metrics(**kwargs):
+    metrics.write_child_export() # prefork 자식에서만 기록 (그 외 프로세스는 아무것도 하지 않음)
+
+
+def final_status_message(completed_count, total_items):
     final_status_msg = "모든 다운로드 완료!"
-    if not master_completed_files_list and total_items > 0: # master_completed_files_list 사용
+    if completed_count == 0 and total_items > 0:
         final_status_msg = "다운로드된 파일 없음 (오류 발생 가능성)"
-    elif len(master_completed_files_list) < total_items and total_items > 0:
-         final_status_msg = f"일부 항목 다운로드 완료 ({len(master_completed_files_list)}/{total_items})"
+    elif completed_count < total_items and total_items > 0:
+         final_status_msg = f"일부 항목 다운로드 완료 ({completed_count}/{total_items})"
+    return final_status_msg
+
+
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def download_video_task(self, celery_internal_task_id_arg_not_used,
+                        base_url, video_format_id, audio_format_id, audio_only,
+                        playlist_item_ids_or_urls, use_thumbnail_as_cover,
+                        title_override=None, thumbnail_url_override=None, audio_output_mode=None, rate_limit=None,
+                        client_id=None):
+    task_id = self.request.id
+    enter_worker_slot(self, client_id) # 클라이언트 동시 실행 한도를 넘으면 재시도로 양보
+    task_specific_temp_dir = os.path.join(TEMP_DOWNLOAD_BASE_DIR, str(task_id))
+    os.makedirs(task_specific_temp_dir, exist_ok=True)
+    
+    storage_janitor.mark_running(task_id) # 실행 중에는 폴더가 정리되지 않도록 표시
+    
+    initial_log = f"작업 시작됨 (ID: {task_id}). 임시 폴더: {task_specific_temp_dir}"
+    logger.info(f"Task {task_id}: {initial_log}")
+    # 진행 상태/로그는 publisher가 메모리에 보관하고, 백엔드에는 간격을 두고 기록
+    publisher = TaskProgressPublisher(self)
+    publisher.update("작업 초기화 중...", 0, initial_log, force=True)
+
+    # 이 리스트는 작업 전체에서 완료된 파일들을 누적합니다. (publisher.completed_files와 동일 객체)
+    master_completed_files_list = publisher.completed_files
     
+    urls_to_process = resolve_item_urls(base_url, playlist_item_ids_or_urls)
+    total_items = len(urls_to_process)
+
+    # 워커 재시작 등으로 같은 작업이 다시 실행된 경우: 이전 실행의 로그/파일 리스트와 완료 항목을 이어받음
+    publisher.recover_existing_lists()
+    checkpointed_items = {i: file_info for i, file_info in load_item_checkpoints(task_id, task_specific_temp_dir).items()
+                          if i < total_items}
+    if checkpointed_items:
+        master_completed_files_list.extend(checkpointed_items[i] for i in sorted(checkpointed_items))
+        publisher.restore_missing_files([checkpointed_items[i] for i in sorted(checkpointed_items)])
+        recovered_log = f"이전 실행에서 완료된 항목 {len(checkpointed_items)}/{total_items}개를 건너뛰고 이어서 진행합니다."
+        logger.info(f"Task {task_id}: {recovered_log}")
+        metrics.inc('task_recovered_items_total', len(checkpointed_items))
+        publisher.update("이전 실행 이어받는 중...", len(checkpointed_items) * 100 / total_items, recovered_log,
+                         force=True, recovered_items=len(checkpointed_items))
+    flat_entries_by_key = load_flat_entries(base_url, playlist_item_ids_or_urls)
+    item_options = {
+        'video_format_id': video_format_id, 'audio_format_id': audio_format_id, 'audio_only': audio_only,
+        'use_thumbnail_as_cover': use_thumbnail_as_cover, 'title_override': title_override,
+        'audio_output_mode': audio_output_mode, 'rate_limit': rate_limit,
+    }
+
+    flat_entries = [flat_entries_by_key.get(playlist_item_ids_or_urls[i]) if playlist_item_ids_or_urls else None
+                    for i in range(total_items)]
+    cancel_token = CancelToken(task_id) # /cancel 요청 시 진행 hook/항목 사이에서 중단
+    throttle = bandwidth_scheduler.task_throttle(task_id, parse_rate(rate_limit)) # 워커 전체 대역폭 예산에서 이 작업의 몫
+    try:
+        cancel_token.raise_if_cancelled() # 대기열에 있는 동안 취소된 경우
+        if total_items > 1:
+            # 항목 i의 후처리(ffmpeg/태그)와 항목 i+1의 다운로드를 겹쳐서 실행
+            run_item_pipeline(publisher, task_id, task_specific_temp_dir, urls_to_process, item_options, flat_entries,
+                              skip_item_indexes=set(checkpointed_items), cancel_token=cancel_token, throttle=throttle)
+        elif total_items == 1 and 0 not in checkpointed_items:
+            download_single_item(publisher, task_id, task_specific_temp_dir, 0, total_items, urls_to_process[0],
+                                 item_options, flat_entries[0], cancel_token=cancel_token, throttle=throttle)
+    except TaskCancelled:
+        cancel_msg = cleanup_cancelled_task(task_id, task_specific_temp_dir, master_completed_files_list, total_items)
+        publisher.add_log(cancel_msg)
+        publisher.flush_lists() # 완료된 파일 목록은 리스트로 계속 조회 가능
+        self.backend.mark_as_revoked(task_id, cancel_msg)
+        # REVOKED 상태를 SUCCESS/FAILURE로 덮어쓰지 않도록 결과 없이 종료
+        raise Ignore()
+    finally:
+        throttle.close()
+
+    final_status_msg = final_status_message(len(master_completed_files_list), total_items)
     logger.info(f"Task {task_id}: 완료. 최종 상태: {final_status_msg}")
     
-    current_meta_final = self.AsyncResult(task_id).info
-    final_logs = current_meta_final.get('logs', []) if isinstance(current_meta_final, dict) else []
-    final_log_entry = f"[{datetime.now().strftime('%H:%M:%S')}] {final_status_msg}"
-    if not final_logs or final_logs[-1] != final_log_entry : final_logs.append(final_log_entry)
+    # 로그는 백엔드에서 다시 읽지 않고 publisher 메모리에서 가져옴
+    publisher.add_log(final_status_msg)
+    publisher.flush_lists() # SUCCESS 결과 저장 전에 남은 로그/파일을 리스트에 기록
+    final_logs = publisher.recent_logs()
+    publisher_stats = publisher.stats()
+    logger.info(f"Task {task_id}: 진행 상태 기록 통계 - hook 호출 {publisher_stats['hook_calls']}회, "
+                f"백엔드 기록 {publisher_stats['backend_writes']}회")
+    storage_janitor.mark_finished(task_id)
 
     # 최종 SUCCESS 상태에서는 newly_completed_file은 의미 없음 (이미 개별적으로 전달됨)
     return {
         'status': final_status_msg, 'progress': 100,
         'files': master_completed_files_list, # 최종적으로 모든 완료된 파일 목록
         'logs': final_logs[-50:],
-        'newly_completed_file': None # 최종 상태에서는 null
+        'newly_completed_file': None, # 최종 상태에서는 null
+        'progress_stats': publisher_stats,
+        'recovered_items': len(checkpointed_items), # 이전 실행에서 완료되어 건너뛴 항목 수
     }
 
+
+def resolve_fanout_concurrency(requested_concurrency=None):
+    """요청된 동시 처리 수를 1 ~ PLAYLIST_FANOUT_MAX_CONCURRENCY 범위로 제한합니다."""
+    try:
+        concurrency = int(requested_concurrency) if requested_concurrency else PLAYLIST_FANOUT_DEFAULT_CONCURRENCY
+    except (TypeError, ValueError):
+        concurrency = PLAYLIST_FANOUT_DEFAULT_CONCURRENCY
+    return max(1, min(concurrency, PLAYLIST_FANOUT_MAX_CONCURRENCY))
+
+
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def download_playlist_task(self, base_url, video_format_id, audio_format_id, audio_only,
+                           playlist_item_ids_or_urls, use_thumbnail_as_cover,
+                           title_override=None, thumbnail_url_override=None, max_concurrency=None,
+                           audio_output_mode=None, rate_limit=None, client_id=None):
+    """플레이리스트를 항목별 하위 작업으로 나눠 여러 워커에서 병렬로 처리합니다 (fan_out_job).
+
+    이 작업의 ID가 전체 작업(job) ID가 되며, 하위 작업들은 이 ID의 폴더/로그/파일 리스트/meta에 기록합니다.
+    """
+    urls_to_process = resolve_item_urls(base_url, playlist_item_ids_or_urls)
+    flat_entries_by_key = load_flat_entries(base_url, playlist_item_ids_or_urls)
+    item_options = {
+        'video_format_id': video_format_id, 'audio_format_id': audio_format_id, 'audio_only': audio_only,
+        'use_thumbnail_as_cover': use_thumbnail_as_cover, 'title_override': title_override,
+        'audio_output_mode': audio_output_mode, 'rate_limit': rate_limit, # 하위 작업들이 job ID로 한 작업의 몫을 나눠 씀
+    }
+    work_items = []
+    for i, current_url in enumerate(urls_to_process):
+        flat_entry = flat_entries_by_key.get(playlist_item_ids_or_urls[i]) if playlist_item_ids_or_urls else None
+        # 메시지 크기를 줄이기 위해 flat 항목에서는 제목/썸네일만 전달
+        flat_summary = {'title': flat_entry.get('title'),
+                        'thumbnail': flat_entry.get('thumbnail') or ((flat_entry.get('thumbnails') or [{}])[-1]).get('url')} if flat_entry else None
+        work_items.append((current_url, item_options, flat_summary))
+    fan_out_job(self, work_items, max_concurrency, client_id, "병렬 작업")
+
+
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def download_batch_task(self, batch_items, max_concurrency=None, rate_limit=None, client_id=None):
+    """/download/batch로 한 번에 요청된 서로 다른 영상들을 병렬 작업과 같은 방식(항목별 하위 작업)으로 처리합니다.
+
+    batch_items: [{'url': ..., 'item_options': {...}}] (앱에서 정규화/중복 제거됨). 항목마다 포맷 옵션이 다를 수 있고,
+    대역폭 제한(rate_limit)은 batch 전체가 나눠 씁니다. 이 작업의 ID(batch ID)로 전체 진행 상태를 조회합니다.
+    """
+    work_items = [(batch_item['url'], dict(batch_item['item_options'], rate_limit=rate_limit), None) for batch_item in batch_items]
+    fan_out_job(self, work_items, max_concurrency, client_id, "일괄 작업")
+
+
+def fan_out_job(task_instance, work_items, max_concurrency, client_id, job_label):
+    """work_items([(URL, item_options, flat_summary)])를 job(= 이 작업 ID)의 항목별 하위 작업으로 분배합니다.
+
+    동시 처리 수(max_concurrency)만큼 하위 작업 체인(lane)을 만들어 group으로 한 번에 보내고,
+    마지막으로 끝난 하위 작업이 최종 SUCCESS 결과를 저장합니다. 분배 후 Ignore를 발생시켜 결과를 남기지 않습니다.
+    """
+    job_id = task_instance.request.id
+    if get_redis().hexists(task_checkpoint_key(job_id), '_dispatched'):
+        # 분배 직후 ack 전에 워커가 재시작되어 재전달된 경우: 하위 작업은 이미 큐에 있으므로 다시 분배하지 않음
+        logger.info(f"Task {job_id}: 이미 분배된 {job_label}, 재전달 무시")
+        raise Ignore()
+    if is_cancel_requested(job_id): # 대기열에 있는 동안 취소된 경우 분배하지 않음
+        logger.info(f"Task {job_id}: 분배 전에 취소됨")
+        task_instance.backend.mark_as_revoked(job_id, "작업 취소됨")
+        raise Ignore()
+    task_specific_temp_dir = os.path.join(TEMP_DOWNLOAD_BASE_DIR, str(job_id))
+    os.makedirs(task_specific_temp_dir, exist_ok=True)
+    storage_janitor.mark_running(job_id) # 마지막 하위 작업이 끝날 때 해제
+
+    total_items = len(work_items)
+    concurrency = min(resolve_fanout_concurrency(max_concurrency), total_items)
+    parallel_info = {'total_items': total_items, 'max_concurrency': concurrency}
+
+    initial_log = f"{job_label} 시작됨 (ID: {job_id}). 임시 폴더: {task_specific_temp_dir}"
+    logger.info(f"Task {job_id}: {initial_log}")
+    publisher = TaskProgressPublisher(task_instance)
+    publisher.update("작업 초기화 중...", 0, initial_log, force=True, parallel=parallel_info)
+
+    # 항목을 lane에 번갈아 배정 -> lane 하나는 항목을 순서대로 처리하므로 동시에 실행되는 항목 수는 최대 concurrency
+    lanes = [[] for _ in range(concurrency)]
+    for i, (current_url, item_options, flat_summary) in enumerate(work_items):
+        # 하위 작업은 이 작업과 같은 큐(작업 등급)에서 처리
+        lanes[i % concurrency].append(download_playlist_item_task.si(job_id, i, total_items, current_url, item_options, flat_summary,
+                                                                     client_id=client_id).set(queue=task_queue_name(task_instance.request)))
+
+    get_redis().set(task_remaining_key(job_id), total_items, ex=TASK_DATA_TTL_SECONDS)
+    distribute_log = f"{total_items}개 항목을 최대 {concurrency}개씩 병렬로 처리합니다."
+    logger.info(f"Task {job_id}: {distribute_log}")
+    # 하위 작업이 meta를 쓰기 시작하기 전에 분배 로그를 먼저 기록
+    publisher.update("항목 분배 중...", 0, distribute_log, force=True, parallel=parallel_info)
+
+    group(chain(*lane) for lane in lanes if lane).apply_async()
+    get_redis().hset(task_checkpoint_key(job_id), '_dispatched', 1)
+    get_redis().expire(task_checkpoint_key(job_id), TASK_DATA_TTL_SECONDS)
+    # 최종 결과는 마지막 하위 작업이 저장하므로, 이 작업이 끝나도 상태(PROGRESS)를 덮어쓰지 않도록 함
+    raise Ignore()
+
+
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def download_playlist_item_task(self, job_id, item_index, total_items, current_url, item_options, flat_entry=None,
+                                client_id=None):
+    """병렬 작업(job)의 항목 하나를 처리하는 하위 작업. 진행 상태/로그/파일은 job ID 아래에 기록됩니다.
+
+    워커 재시작으로 재전달되면 체크포인트가 있는 항목은 건너뛰고, 남은 항목 카운터는 항목당 한 번만 줄입니다.
+    """
+    enter_worker_slot(self, client_id, slot_id=job_id) # 같은 job의 하위 작업은 클라이언트 슬롯 하나를 함께 사용
+    task_specific_temp_dir = os.path.join(TEMP_DOWNLOAD_BASE_DIR, str(job_id))
+    os.makedirs(task_specific_temp_dir, exist_ok=True)
+    publisher = JobItemProgressPublisher(self, job_id, item_index, total_items)
+    cancel_token = CancelToken(job_id)
+    throttle = bandwidth_scheduler.task_throttle(job_id, parse_rate(item_options.get('rate_limit')))
+    try:
+        checkpointed_file = load_item_checkpoint(job_id, task_specific_temp_dir, item_index)
+        if cancel_token.is_cancelled():
+            pass # 취소된 job의 남은 항목은 다운로드하지 않고 처리 끝으로 계산
+        elif checkpointed_file:
+            publisher.restore_missing_files([checkpointed_file])
+            publisher.add_log("이전 실행에서 완료된 항목 건너뜀", f"({item_index + 1}/{total_items}) ")
+            metrics.inc('task_recovered_items_total')
+        else:
+            download_single_item(publisher, job_id, task_specific_temp_dir, item_index, total_items, current_url,
+                                 item_options, flat_entry, cancel_token=cancel_token, throttle=throttle)
+    except TaskCancelled:
+        publisher.add_log("작업 취소로 항목 처리 중단", f"({item_index + 1}/{total_items}) ")
+    except Exception as e:
+        # 예외가 체인 밖으로 나가면 같은 lane의 다음 항목이 실행되지 않으므로 여기서 처리
+        logger.error(f"Task {job_id}: ({item_index + 1}/{total_items}) 하위 작업 오류: {e}", exc_info=True)
+        publisher.add_log(f"오류: 항목 처리 실패: {e}", f"({item_index + 1}/{total_items}) ")
+    finally:
+        throttle.close()
+        publisher.progress = 100 # 성공/실패와 관계없이 이 항목은 처리 끝
+        publisher.flush()
+        redis_client = get_redis()
+        remaining = None
+        if redis_client.sadd(task_finished_items_key(job_id), item_index):
+            redis_client.expire(task_finished_items_key(job_id), TASK_DATA_TTL_SECONDS)
+            remaining = redis_client.decr(task_remaining_key(job_id))
+    if remaining is not None and remaining <= 0:
+        _finalize_playlist_job(self, job_id, total_items)
+    return {'job_id': job_id, 'item_index': item_index, 'progress_stats': publisher.stats()}
+
+
+def _finalize_playlist_job(task_instance, job_id, total_items):
+    """마지막 하위 작업에서 호출: job의 완료 파일/로그를 모아 최종 SUCCESS 결과를 저장합니다 (취소된 job은 REVOKED)."""
+    redis_client = get_redis()
+    cancelled = is_cancel_requested(job_id, redis_client)
+    if cancelled:
+        _, _, completed_files, _ = read_progress_entries(redis_client, job_id, log_cursor=None, file_cursor=0)
+        final_status_msg = cleanup_cancelled_task(job_id, os.path.join(TEMP_DOWNLOAD_BASE_DIR, str(job_id)),
+                                                  completed_files, total_items)
+    else:
+        completed_count = redis_client.llen(task_files_key(job_id))
+        final_status_msg = final_status_message(completed_count, total_items)
+        logger.info(f"Task {job_id}: 병렬 작업 완료. 최종 상태: {final_status_msg}")
+
+    final_log = f"[{datetime.now().strftime('%H:%M:%S')}] {final_status_msg}"
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.rpush(task_logs_key(job_id), final_log)
+    pipe.expire(task_logs_key(job_id), TASK_DATA_TTL_SECONDS)
+    pipe.delete(task_remaining_key(job_id))
+    pipe.execute()
+    if cancelled:
+        task_instance.backend.mark_as_revoked(job_id, final_status_msg)
+        return
+    storage_janitor.mark_finished(job_id)
+    final_logs, _, completed_files, _ = read_progress_entries(redis_client, job_id, log_cursor=None, file_cursor=0)
+
+    task_instance.backend.store_result(job_id, {
+        'status': final_status_msg, 'progress': 100,
+        'files': completed_files,
+        'logs': final_logs[-50:],
+        'newly_completed_file': None,
+        'parallel': {'total_items': total_items},
+    }, 'SUCCESS')
+
+
+@celery_app.task(bind=True, soft_time_limit=METADATA_TASK_SOFT_TIME_LIMIT_SECONDS,
+                 time_limit=METADATA_TASK_SOFT_TIME_LIMIT_SECONDS + 15)
+def fetch_info_task(self, url, client_id=None):
+    """/fetch_info의 정보 추출을 웹 워커 대신 전용 큐(METADATA_QUEUE)의 워커에서 실행합니다.
+
+    결과(UI 표시용 dict 또는 {"error": ...})는 결과 백엔드를 통해 웹으로 전달됩니다.
+    """
+    try:
+        return build_video_info(url)
+    except yt_dlp.utils.DownloadError as e:
+        logger.error(f"yt-dlp 정보 가져오기 오류: {e}")
+        return {"error": f"정보 가져오기 실패: {str(e)}"}
+    except SoftTimeLimitExceeded:
+        logger.error(f"정보 가져오기 시간 초과 ({METADATA_TASK_SOFT_TIME_LIMIT_SECONDS}초): {url}")
+        return {"error": "정보 가져오기 시간이 초과되었습니다."}
+    except TypeError as te:
+        logger.error(f"fetch_info 중 TypeError 발생: {te}", exc_info=True)
+        return {"error": f"서버 데이터 처리 오류: {str(te)}"}
+    except Exception as e:
+        logger.error(f"fetch_info 중 일반 예외 발생: {e}", exc_info=True)
+        return {"error": f"서버 오류 발생: {str(e)}"}
+    finally:
+        release_metadata_job(self.request.id, client_id) # 대기 목록에서 제거 (다음 요청 수락)
+
+
 @celery_app.task
-def cleanup_old_task_folders():
-    logger.info("오래된 작업 임시 폴더 정리 시작...")
-    now_ts = time.time()
-    max_age_seconds = 6 * 60 * 60
-    if not os.path.exists(TEMP_DOWNLOAD_BASE_DIR):
-        logger.info(f"{TEMP_DOWNLOAD_BASE_DIR} 없음.")
-        return 0
-    deleted_count = 0
-    for task_folder_name in os.listdir(TEMP_DOWNLOAD_BASE_DIR):
-        task_folder_path = os.path.join(TEMP_DOWNLOAD_BASE_DIR, task_folder_name)
-        if os.path.isdir(task_folder_path):
-            try:
-                if (now_ts - os.path.getmtime(task_folder_path)) > max_age_seconds:
-                    shutil.rmtree(task_folder_path)
-                    logger.info(f"오래된 임시 폴더 삭제: {task_folder_path}")
-                    deleted_count += 1
-            except FileNotFoundError: logger.warning(f"임시 폴더 정리 중 찾을 수 없음: {task_folder_path}")
-            except Exception as e: logger.error(f"임시 폴더 삭제 실패 {task_folder_path}: {e}")
-    logger.info(f"오래된 작업 임시 폴더 정리 완료. {deleted_count}개 폴더 삭제.")
-    return deleted_count
+def run_storage_janitor():
+    """작업 폴더 인덱스를 기준으로 오래된 폴더와 (디스크 사용률 초과 시) LRU 폴더를 정리합니다."""
+    return storage_janitor.run()
 
 celery_app.conf.beat_schedule = {
-    'cleanup-temp-folders-every-6-hours': {
-        'task': 'tasks.cleanup_old_task_folders',
-        'schedule': crontab(minute=0, hour='*/6'),
+    'storage-janitor-every-minute': {
+        'task': 'tasks.run_storage_janitor',
+        'schedule': crontab(), # 매분 (인덱스만 조회하므로 가벼움, 기록 시점에도 사용률 초과 시 즉시 정리)
     },
 }
@@ -0,0 +1,271 @@
+import io
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from PIL import Image
+
+import metrics
+from session_pool import http_session
+
+logger = logging.getLogger(__name__)
+
+# 다운로드 캐시와 같이 작업 폴더 볼륨의 점(.) 폴더에 저장 (작업 폴더 LRU 정리 대상에서 제외됨)
+THUMBNAIL_CACHE_DIR = os.environ.get('THUMBNAIL_CACHE_DIR', os.path.join('task_temp_downloads', '.thumbnail_cache'))
+THUMBNAIL_CACHE_MAX_BYTES = int(os.environ.get('THUMBNAIL_CACHE_MAX_BYTES', str(256 * 1024 ** 2))) # 변환된 커버 디스크 캐시 크기 (0: 디스크 캐시 사용 안 함)
+THUMBNAIL_MEMORY_CACHE_ENTRIES = int(os.environ.get('THUMBNAIL_MEMORY_CACHE_ENTRIES', '64')) # 프로세스 메모리에 보관하는 커버 수
+THUMBNAIL_COVER_MAX_PX = int(os.environ.get('THUMBNAIL_COVER_MAX_PX', '600')) # 커버 이미지 긴 변의 최대 픽셀
+THUMBNAIL_JPEG_QUALITY = int(os.environ.get('THUMBNAIL_JPEG_QUALITY', '88'))
+THUMBNAIL_MAX_DOWNLOAD_BYTES = int(os.environ.get('THUMBNAIL_MAX_DOWNLOAD_BYTES', str(10 * 1024 ** 2))) # 썸네일 원본 최대 크기 (초과 시 커버 생략)
+THUMBNAIL_MAX_PIXELS = 40_000_000 # 디코딩 전 검사하는 원본 최대 픽셀 수 (압축 폭탄 방지)
+
+_INDEX_FILENAME = 'index.sqlite3'
+_OBJECTS_DIRNAME = 'objects'
+_DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+
+def _url_key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def fetch_image_bytes(url, max_bytes=THUMBNAIL_MAX_DOWNLOAD_BYTES):
+    """썸네일 원본을 스트리밍으로 받습니다. max_bytes를 넘으면 (Content-Length 또는 받는 도중) ValueError."""
+    with http_session.get(url, stream=True, timeout=15) as response: # 프로세스 공용 연결 풀 (keep-alive)
+        response.raise_for_status()
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise ValueError(f"썸네일이 너무 큽니다 ({content_length} bytes > {max_bytes})")
+        buffer = bytearray()
+        for chunk in response.iter_content(_DOWNLOAD_CHUNK_BYTES):
+            buffer.extend(chunk)
+            if len(buffer) > max_bytes:
+                raise ValueError(f"썸네일이 너무 큽니다 (>{max_bytes} bytes)")
+    return bytes(buffer)
+
+
+def make_cover_jpeg(image_data, max_px=THUMBNAIL_COVER_MAX_PX, quality=THUMBNAIL_JPEG_QUALITY):
+    """이미지(WebP/PNG/JPEG 등)를 한 번 디코딩해 긴 변이 max_px 이하인 RGB JPEG 커버로 변환합니다."""
+    with Image.open(io.BytesIO(image_data)) as img:
+        if img.width * img.height > THUMBNAIL_MAX_PIXELS:
+            raise ValueError(f"썸네일 해상도가 너무 큽니다 ({img.width}x{img.height})")
+        img.draft('RGB', (max_px, max_px)) # JPEG 원본은 디코딩 단계에서 축소 (그 외 형식은 무시됨)
+        img.load()
+        if img.mode in ('RGBA', 'LA', 'P'):
+            # 투명 영역은 흰 배경으로 (JPEG은 알파 채널 없음)
+            rgba = img.convert('RGBA')
+            cover = Image.new('RGB', rgba.size, (255, 255, 255))
+            cover.paste(rgba, mask=rgba.getchannel('A'))
+        else:
+            cover = img.convert('RGB')
+    cover.thumbnail((max_px, max_px), Image.LANCZOS)
+    output = io.BytesIO()
+    cover.save(output, format='JPEG', quality=quality, optimize=True)
+    return output.getvalue()
+
+
+class ThumbnailCache:
+    """앨범 커버용 썸네일 캐시.
+
+    썸네일 URL마다 원본을 한 번만 받아 디코딩/축소한 JPEG 커버를 디스크(objects/<해시 앞 2자리>/<해시>.jpg)에
+    저장하고, 같은 앨범의 다른 트랙/다른 작업에서 재사용합니다. URL은 달라도 원본 내용이 같으면(내용 해시)
+    같은 커버 파일을 가리킵니다. 크기/마지막 사용 시각은 SQLite 인덱스에 기록되며, 총 크기가 max_bytes를 넘으면
+    가장 오래 사용되지 않은 커버부터 삭제합니다. 최근 커버는 프로세스 메모리에도 보관합니다.
+    """
+
+    def __init__(self, cache_dir=THUMBNAIL_CACHE_DIR, max_bytes=THUMBNAIL_CACHE_MAX_BYTES,
+                 memory_entries=THUMBNAIL_MEMORY_CACHE_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict() # URL 키 -> 커버 JPEG bytes
+        self._lock = threading.Lock()
+        self._url_locks = {} # URL 키 -> 같은 URL을 동시에 처리하는 스레드가 한 번만 받도록 하는 잠금
+        self._initialized = False
+
+    # --- 인덱스 ---
+    @contextmanager
+    def _connect(self):
+        """인덱스 연결을 열고, 블록이 끝나면 커밋(예외 시 롤백) 후 닫습니다."""
+        if not self._initialized:
+            os.makedirs(os.path.join(self.cache_dir, _OBJECTS_DIRNAME), exist_ok=True)
+        conn = sqlite3.connect(os.path.join(self.cache_dir, _INDEX_FILENAME), timeout=30)
+        try:
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode=WAL") # 여러 워커 프로세스의 동시 읽기/쓰기
+                conn.execute("CREATE TABLE IF NOT EXISTS covers (content_key TEXT PRIMARY KEY, relpath TEXT NOT NULL, "
+                             "size INTEGER NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS covers_last_access ON covers (last_access)")
+                conn.execute("CREATE TABLE IF NOT EXISTS urls (url_key TEXT PRIMARY KEY, content_key TEXT NOT NULL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS urls_content_key ON urls (content_key)")
+                conn.commit()
+                self._initialized = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _read_cover(self, conn, where_sql, key):
+        row = conn.execute(f"SELECT covers.content_key, covers.relpath FROM {where_sql}", (key,)).fetchone()
+        if row is None:
+            return None
+        content_key, relpath = row
+        try:
+            with open(os.path.join(self.cache_dir, relpath), 'rb') as f:
+                cover = f.read()
+        except FileNotFoundError:
+            # 인덱스와 파일이 어긋난 경우 (수동 삭제 등): 항목 제거 후 미스로 처리
+            conn.execute("DELETE FROM covers WHERE content_key = ?", (content_key,))
+            conn.execute("DELETE FROM urls WHERE content_key = ?", (content_key,))
+            return None
+        conn.execute("UPDATE covers SET last_access = ? WHERE content_key = ?", (time.time(), content_key))
+        return cover
+
+    def _lookup_url(self, url_key):
+        with self._connect() as conn:
+            return self._read_cover(conn, "urls JOIN covers ON covers.content_key = urls.content_key WHERE urls.url_key = ?", url_key)
+
+    def _lookup_content(self, url_key, content_key):
+        """원본 내용이 같은 커버가 있으면 이 URL도 그 커버를 가리키도록 기록하고 반환합니다."""
+        with self._connect() as conn:
+            cover = self._read_cover(conn, "covers WHERE covers.content_key = ?", content_key)
+            if cover is not None:
+                conn.execute("INSERT OR REPLACE INTO urls (url_key, content_key) VALUES (?, ?)", (url_key, content_key))
+            return cover
+
+    def _store(self, url_key, content_key, cover):
+        relpath = os.path.join(_OBJECTS_DIRNAME, content_key[:2], f"{content_key}.jpg")
+        dest_path = os.path.join(self.cache_dir, relpath)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        tmp_path = f"{dest_path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(cover)
+        os.replace(tmp_path, dest_path)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO covers (content_key, relpath, size, created_at, last_access) "
+                         "VALUES (?, ?, ?, ?, ?)", (content_key, relpath, len(cover), now, now))
+            conn.execute("INSERT OR REPLACE INTO urls (url_key, content_key) VALUES (?, ?)", (url_key, content_key))
+        self.evict()
+
+    def usage(self):
+        with self._connect() as conn:
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM covers").fetchone()
+        return {'entries': count, 'bytes': total, 'max_bytes': self.max_bytes, 'memory_entries': len(self._memory)}
+
+    def evict(self):
+        """총 크기가 max_bytes 이하가 될 때까지 가장 오래 사용되지 않은 커버를 삭제합니다."""
+        evicted = 0
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM covers").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            for content_key, relpath, size in conn.execute(
+                    "SELECT content_key, relpath, size FROM covers ORDER BY last_access").fetchall():
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, relpath))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"썸네일 캐시 파일 삭제 실패 ({relpath}): {e}")
+                    continue
+                conn.execute("DELETE FROM covers WHERE content_key = ?", (content_key,))
+                conn.execute("DELETE FROM urls WHERE content_key = ?", (content_key,))
+                total -= size
+                evicted += 1
+        if evicted:
+            metrics.inc('thumbnail_cache_evictions_total', evicted)
+            logger.info(f"썸네일 캐시 LRU 정리: {evicted}개 삭제, 현재 {total} bytes")
+        return evicted
+
+    # --- 메모리 캐시 ---
+    def _memory_get(self, url_key):
+        with self._lock:
+            cover = self._memory.get(url_key)
+            if cover is not None:
+                self._memory.move_to_end(url_key)
+            return cover
+
+    def _memory_put(self, url_key, cover):
+        if self.memory_entries <= 0:
+            return
+        with self._lock:
+            self._memory[url_key] = cover
+            self._memory.move_to_end(url_key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    @contextmanager
+    def _url_lock(self, url_key):
+        with self._lock:
+            entry = self._url_locks.setdefault(url_key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._url_locks.pop(url_key, None)
+
+    def get_cover(self, url):
+        """썸네일 URL의 앨범 커버 JPEG bytes를 반환합니다 (메모리 → 디스크 → 내용 해시 → 다운로드/변환 순).
+
+        다운로드/디코딩 실패 시 예외가 그대로 전달됩니다. 디스크 캐시 오류는 경고만 남기고 직접 처리합니다.
+        """
+        url_key = _url_key(url)
+        cover = self._memory_get(url_key)
+        if cover is not None:
+            metrics.inc('thumbnail_cache_requests_total', result='memory_hit')
+            return cover
+        with self._url_lock(url_key):
+            cover = self._memory_get(url_key) # 같은 URL을 기다리던 스레드는 먼저 처리한 결과 사용
+            if cover is not None:
+                metrics.inc('thumbnail_cache_requests_total', result='memory_hit')
+                return cover
+            use_disk = self.max_bytes > 0
+            if use_disk:
+                try:
+                    cover = self._lookup_url(url_key)
+                except Exception as e:
+                    logger.warning(f"썸네일 캐시 조회 실패 ({url}): {e}")
+                    use_disk = False
+                if cover is not None:
+                    metrics.inc('thumbnail_cache_requests_total', result='disk_hit')
+                    self._memory_put(url_key, cover)
+                    return cover
+
+            image_data = fetch_image_bytes(url)
+            metrics.inc('thumbnail_download_bytes_total', len(image_data))
+            content_key = hashlib.sha256(image_data).hexdigest()
+            if use_disk:
+                try:
+                    cover = self._lookup_content(url_key, content_key)
+                except Exception as e:
+                    logger.warning(f"썸네일 캐시 조회 실패 ({url}): {e}")
+                    use_disk = False
+                if cover is not None:
+                    metrics.inc('thumbnail_cache_requests_total', result='content_hit')
+                    self._memory_put(url_key, cover)
+                    return cover
+
+            metrics.inc('thumbnail_cache_requests_total', result='miss')
+            cover = make_cover_jpeg(image_data)
+            logger.info(f"썸네일 커버 변환: {url} ({len(image_data)} -> {len(cover)} bytes)")
+            if use_disk:
+                try:
+                    self._store(url_key, content_key, cover)
+                except Exception as e:
+                    logger.warning(f"썸네일 캐시 저장 실패 ({url}): {e}")
+            self._memory_put(url_key, cover)
+            return cover
+
+
+thumbnail_cache = ThumbnailCache() # 프로세스 공용 인스턴스